@@ -10,8 +10,13 @@ Date: 2010-08-11W
 
 from math import *
 import re, os, sys, time
+import cPickle, getopt, hashlib, marshal, multiprocessing
 
-from units import Degrees, Units
+# units' sin, cos, tan and exp replace math's: they memoize trig on Degrees
+# objects and also accept numpy arrays.
+from units import Degrees, Maximum, Minimum, NormalizeParams, Sum, Units
+from units import cos, exp, sin, tan
+import units
 
 class Error(Exception): pass
 
@@ -28,20 +33,85 @@ def ordinal(n):
   if last_digit == 2: return "%snd" % int(n)
   if last_digit == 3: return "%srd" % int(n)
 
+class SourceCache(object):
+  """
+  Loads the Python source files this program reads (config, design params,
+  plans text) as dicts of the variables they define.  Each file is compiled
+  and executed once per process; after that it is served from memory for as
+  long as its path, mtime and size are unchanged (or, if those change, its
+  content hash is).
+
+  If cache_file is given, the compiled code and the variables are also saved
+  there by Save(), so later runs on unchanged files skip reading and
+  executing them.  Files defining values that can't be pickled (e.g.
+  PlansText, which imports time for today's date) are executed again from
+  the saved code instead.
+  """
+  def __init__(self, cache_file=None):
+    self.cache_file = cache_file
+    # path -> (mtime, size, content hash, code object, variables or None)
+    self.entries = {}
+    self.executions = 0
+    self.dirty = False
+    if cache_file and os.path.exists(cache_file):
+      try:
+        with open(cache_file, 'rb') as f:
+          saved = cPickle.load(f)
+      except Exception:
+        saved = {}     # unreadable cache (e.g. from another Python version)
+      for path, (mtime, size, digest, code, variables) in saved.items():
+        self.entries[path] = (mtime, size, digest, marshal.loads(code),
+                              variables and cPickle.loads(variables))
+
+  def Load(self, filename):
+    """Returns a dict of the variables defined by the file.  The values may be
+    shared with other callers, so don't modify them."""
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    entry = self.entries.get(path)
+    if entry is None or entry[:2] != (stat.st_mtime, stat.st_size):
+      with open(path) as f:
+        source = f.read()
+      digest = hashlib.sha1(source).hexdigest()
+      if entry is None or entry[2] != digest:
+        entry = (None, None, digest, compile(source, path, 'exec'), None)
+      entry = (stat.st_mtime, stat.st_size) + entry[2:]
+      self.entries[path] = entry
+      self.dirty = True
+    variables = entry[4]
+    if variables is None:
+      variables = {}
+      exec(entry[3], variables)
+      self.executions += 1
+      del variables['__builtins__']
+      self.entries[path] = entry[:4] + (variables,)
+    return dict(variables)
+
+  def Save(self):
+    """Writes the cache to cache_file, if one was given and anything changed."""
+    if not (self.cache_file and self.dirty):
+      return
+    saved = {}
+    for path, (mtime, size, digest, code, variables) in self.entries.items():
+      try:
+        variables = cPickle.dumps(variables, cPickle.HIGHEST_PROTOCOL)
+      except Exception:
+        variables = None
+      saved[path] = (mtime, size, digest, marshal.dumps(code), variables)
+    with open(self.cache_file, 'wb') as f:
+      cPickle.dump(saved, f, cPickle.HIGHEST_PROTOCOL)
+    self.dirty = False
+
+# To keep the cache between runs, set WALL_SOURCE_CACHE to a file name.
+SOURCE_CACHE = SourceCache(os.environ.get('WALL_SOURCE_CACHE'))
+
+
 def LatexHeader(config):
-  with open(MakeAbsPath(config, "PlansTextFile")) as f:
-    contents = f.read()
-    plans_text_dict = {}
-    exec(contents, plans_text_dict)
-    del plans_text_dict['__builtins__']
+  plans_text_dict = SOURCE_CACHE.Load(MakeAbsPath(config, "PlansTextFile"))
   return plans_text_dict['LATEX_HEADER'] % plans_text_dict['LATEX_HEADER_VARS']
 
 def LatexFooter(config):
-  with open(MakeAbsPath(config, "PlansTextFile")) as f:
-    contents = f.read()
-    plans_text_dict = {}
-    exec(contents, plans_text_dict)
-    del plans_text_dict['__builtins__']
+  plans_text_dict = SOURCE_CACHE.Load(MakeAbsPath(config, "PlansTextFile"))
   return plans_text_dict['LATEX_FOOTER'] % plans_text_dict['LATEX_FOOTER_VARS']
 
 
@@ -121,10 +191,297 @@ PARAMS_DESCRIPTIONS_AND_LATEX = {
                     r'\sigma_{allowed}'),
   }
 
+# Coulomb active pressure coefficients, keyed by the angles in radians, each
+# rounded to a multiple of COULOMB_K_QUANTUM.  Sweeps over other parameters
+# keep asking for the same few angles.
+COULOMB_K_CACHE = units.LRUCache(4096)
+COULOMB_K_QUANTUM = 1e-10
+
+def _CoulombK(beta, phi, phi_w, i):
+  """The Coulomb active pressure coefficient: angles in radians, as floats,
+  Duals or numpy arrays."""
+  return (sin(beta - phi) / sin(beta) /
+          (sin(beta + phi_w) ** 0.5 +
+           (sin(phi + phi_w) * sin(phi - i) / sin(beta - i)) ** 0.5)) ** 2
+
+def _Radians(angle):
+  if isinstance(angle, (Degrees, units.DegreesArray)):
+    return angle.radians()
+  return angle
+
+def CoulombK(beta, phi, phi_w, i):
+  """
+  Args:
+    beta - angle of the back face of the wall from horizontal
+    phi - internal friction angle of the soil
+    phi_w - angle of the soil pressure's resultant force from the normal
+    i - slope of the backfill
+    (Each is a Degrees object or a float in radians.)
+  Returns: (float) the Coulomb active pressure coefficient K_a, cached in
+    COULOMB_K_CACHE.  (If any of the angles is an array, see CoulombKArray.
+    If any is a units.Dual, K_a is a Dual too, and isn't cached.)
+  """
+  if units.numpy is not None and [
+      angle for angle in (beta, phi, phi_w, i)
+      if isinstance(angle, (units.numpy.ndarray, units.DegreesArray))]:
+    return CoulombKArray(beta, phi, phi_w, i)
+  angles = [_Radians(angle) for angle in (beta, phi, phi_w, i)]
+  if units.Dual in map(type, angles):
+    return _CoulombK(*angles)
+  key = tuple([int(round(angle / COULOMB_K_QUANTUM)) for angle in angles])
+  k = COULOMB_K_CACHE.Get(key)
+  if k is None:
+    k = COULOMB_K_CACHE.Put(key, _CoulombK(
+        *[n * COULOMB_K_QUANTUM for n in key]))
+  return k
+
+def CoulombKArray(beta, phi, phi_w, i):
+  """Like CoulombK, for arrays of angles (DegreesArrays, or numpy arrays in
+  radians; scalars are broadcast).  Returns a numpy array; not cached."""
+  return _CoulombK(*[units.numpy.asarray(_Radians(angle), dtype=float)
+                     for angle in (beta, phi, phi_w, i)])
+
+def CoulombKStats():
+  """Returns the hit/miss statistics of COULOMB_K_CACHE."""
+  return COULOMB_K_CACHE.Stats()
+
+
+# Parameters derived from the input parameters, in the order they are computed.
+# Each entry is (name, formula) or (name, formula, ndigits).  A formula takes
+# the params (including the derived parameters listed before it) and must use
+# nothing but arithmetic and math functions on them, so that it computes the
+# same thing on Units objects as on plain floats (see FloatParams).  If ndigits
+# is given, the result is displayed as a Units object with that many digits.
+DERIVED_DATA_FORMULAS = [
+  ('ordinal_geogrid_levels_str',
+   lambda p: ', '.join([ordinal(i) for i in p.geogrid_levels])),
+
+  # X_batt = battering offset, i.e. horizontal distance from toe of wall
+  # to top of wall
+  ('X_batt', lambda p: p.H / tan(p.beta)),
+
+  # Total horiz. depth of reinforced soil mass (soil depth + block depth)
+  ('L_t', lambda p: p.L_g + p.L_s),
+
+  ## # K_0 = at-rest pressure coefficient, calculated for both retained and
+  ## #  infill soils
+  ## ('K_0r', lambda p: 1 - sin(p.phi_r)),
+  ## ('K_0i', lambda p: 1 - sin(p.phi_i)),
+
+  # phi_w = direction of resultant force of soil pressure, calculated for
+  #  both infill and retained soil.  Since the infill soil is compacted,
+  #  phi_wi is significantly less than phi_i.
+  ('phi_wi', lambda p: 0.66 * p.phi_i),
+  ('phi_wr', lambda p: 0.66 * p.phi_r),
+
+  # phi_f and gamma_f (foundation soil) assumed equal to phi_r and gamma_r
+  ('phi_f', lambda p: p.phi_r),
+  ('gamma_f', lambda p: p.gamma_r),
+
+  # K_a = active pressure coefficient, calculated for both retained and
+  #  infill soils
+  ('csc_beta', lambda p: 1.0 / sin(p.beta)),
+  ('K_ar', lambda p: CoulombK(p.beta, p.phi_r, p.phi_wr, p.i), 4),
+  ('K_ai', lambda p: CoulombK(p.beta, p.phi_i, p.phi_wi, p.i), 4),
+
+  # Magnitude of net force of active pressure
+  ('F_a', lambda p: 0.5 * p.gamma_r * p.K_ar * (p.H ** 2), 1),
+
+  # Horizontal and vertical components of the active pressure force
+  ('F_ah', lambda p: p.F_a * cos(p.phi_wr)),
+  ('F_av', lambda p: p.F_a * sin(p.phi_wr)),
+
+  # Distances from toe of wall where {resultant horizontal and vertical
+  # components of the active earth pressure force} appear to act.  Earth
+  # pressure is linear with depth, so drawing the magnitude of the force
+  # at each depth creates a triangle of force, so the resultant is at the
+  # triangle's center of mass.  (A triangle's center of mass is 1/3 of the
+  # way up.)  It acts along the back edge of the retained soil mass.
+  ('x_F_active', lambda p: p.L_t + p.X_batt / 3.0),
+  ('y_F_active', lambda p: p.H / 3.0),
+
+  # Horizontal and vertical components of the resultant surcharge pressure
+  # per unit length of wall.
+  # (Assuming surcharge pressure is constant with depth, the resultant
+  # force is vertically centered along the wall.)
+  ('F_qh', lambda p: p.q * p.K_ai * p.H * cos(p.phi_wi)),
+  ('F_qv', lambda p: p.q * p.K_ai * p.H * sin(p.phi_wi)),
+
+  # Distances from toe of wall where {resultant horizontal and vertical
+  # components of the surcharge} appear to act.  Like the resultant active
+  # earth pressure force, the resultant surcharge also acts along the back
+  # edge of the retained soil mass.
+  ('x_F_surcharge', lambda p: p.L_g + p.X_batt / 2.0),
+  ('y_F_surcharge', lambda p: p.H / 2.0),
+
+  # Distances from toe of wall where { resultant horizontal and vertical
+  # components of the total force (active pressure + surcharge)} appear to act
+  ('x_F_total', lambda p: (p.x_F_active * p.F_ah +
+                           p.x_F_surcharge * p.F_qh) / (p.F_ah + p.F_qh)),
+  ('y_F_total', lambda p: (p.y_F_active * p.F_av +
+                           p.y_F_surcharge * p.F_qv) / (p.F_av + p.F_qv)),
+
+  ## # Volume of a segmental block
+  ## ('block_volume', lambda p: p.block_length * p.block_depth *
+  ##                            p.block_height),
+
+  # Weight of a unit length of the wall face
+  ('W_f', lambda p: p.gamma_wall * p.H * p.block_depth),
+
+  # Coefficient of friction for infill and retained soil
+  ('C_fi', lambda p: tan(p.phi_i), 4),
+  ('C_fr', lambda p: tan(p.phi_r), 4),
+
+  # Weight of a unit length of the reinforced soil mass
+  ('W_s', lambda p: p.gamma_i * p.H * (p.L_g - p.block_depth + p.L_s)),
+
+  # Horizontal distance from toe of wall where resultant weight acts
+  # Approximately equal to the center of mass of the parallelogram of soil
+  #  and wall, if the difference in density between wall and soil is
+  #  negligible.
+  ('CM_x', lambda p: Sum([
+                       p.W_s * ( p.X_batt/2 + p.block_depth + (
+                       p.L_g + p.L_s - p.block_depth) / 2 ),
+                       p.W_f * ( p.X_batt/2 + p.block_depth/2) ]) / (
+                       p.W_s + p.W_f)),
+
+  # Total weight of a unit length of wall and its soil mass
+  ('W_w', lambda p: p.W_f + p.W_s),
+
+  # Total vertical force exerted on underlying soil
+  ('V_t', lambda p: Sum([p.W_w, p.F_av, p.F_qv])),
+  ]
+
+
+class _FormulaScope(object):
+  """Attribute access to params, overlaid with the formula results so far."""
+  def __init__(self, params):
+    self._params = params
+
+  def __getattr__(self, name):
+    return getattr(self._params, name)
+
+
+class _TracingScope(_FormulaScope):
+  """A _FormulaScope that adds the name of each value read to self._reads."""
+  def __getattribute__(self, name):
+    if name[0] != '_':
+      object.__getattribute__(self, '_reads').add(name)
+    return object.__getattribute__(self, name)
+
+
+def EvaluateFormulas(formulas, params, dependencies=None, known=None):
+  """
+  Args:
+    formulas (list) - (name, formula[, ndigits]) tuples, as described for
+      DERIVED_DATA_FORMULAS
+    params (InputParams or FloatParams) - values the formulas are computed from
+    dependencies (dict) - if given, each formula's name is mapped to the set
+      of names the formula read
+    known (dict) - values of some of the formulas, already computed
+      elsewhere; these formulas are not evaluated again
+  Returns: dict mapping each formula's name to its value
+  """
+  if dependencies is None:
+    scope = _FormulaScope(params)
+  else:
+    scope = _TracingScope(params)
+  if known:
+    scope.__dict__.update(known)
+    formulas = [formula for formula in formulas if formula[0] not in known]
+  for formula in formulas:
+    if dependencies is not None:
+      scope._reads = dependencies[formula[0]] = set()
+    value = formula[1](scope)
+    if len(formula) == 3 and params.as_units:
+      value = Units(value, ndigits=formula[2])
+    setattr(scope, formula[0], value)
+  del scope._params
+  scope.__dict__.pop('_reads', None)
+  return scope.__dict__
+
+
+class FormulaGraph(object):
+  """
+  The dependencies between the formulas of a table like DERIVED_DATA_FORMULAS,
+  found by recording which params each formula reads the first time it is
+  evaluated.  (Formulas have no branches, so they always read the same
+  params.)  Used to recompute only the formulas affected by a change.
+  """
+  def __init__(self, formulas):
+    self.formulas = formulas
+    self.formulas_by_name = dict([(formula[0], formula)
+                                  for formula in formulas])
+    self.dependencies = {}      # formula name -> set of names it reads
+
+  def Evaluate(self, params, known=None):
+    """Returns the values of all the formulas, as EvaluateFormulas does.
+    The values in known are only used once every formula's dependencies have
+    been recorded."""
+    if len(self.dependencies) < len(self.formulas):
+      return EvaluateFormulas(self.formulas, params, self.dependencies)
+    return EvaluateFormulas(self.formulas, params, known=known)
+
+  def EvaluateFormula(self, name, params):
+    """Returns the value of the named formula.  Params must provide the
+    values it depends on, e.g. by computing them on demand (see
+    InputParams.__getattr__)."""
+    formula = self.formulas_by_name[name]
+    if name in self.dependencies:
+      value = formula[1](params)
+    else:
+      scope = _TracingScope(params)
+      scope._reads = set()
+      value = formula[1](scope)
+      self.dependencies[name] = scope._reads
+    if len(formula) == 3 and params.as_units:
+      value = Units(value, ndigits=formula[2])
+    return value
+
+  def Downstream(self, names):
+    """
+    Args: names (iterable) - names of changed params
+    Returns: the formulas that depend, directly or indirectly, on any of the
+      names, in table order.  Formulas named in names are left out: a value
+      that was set explicitly is not recomputed.  So are formulas that have
+      never been evaluated, since nothing can have been computed from them.
+    """
+    changed = set(names)
+    stale = set(changed)
+    downstream = []
+    for formula in self.formulas:
+      if (formula[0] not in changed and
+          stale.intersection(self.dependencies.get(formula[0], ()))):
+        stale.add(formula[0])
+        downstream.append(formula)
+    return downstream
+
+  def Recompute(self, params, names):
+    """
+    Args:
+      params (InputParams or ParamsOverlay) - holds the current values of
+        all the params and formulas
+      names (iterable) - names of the params that have changed
+    Returns: (list of the names of the formulas recomputed, in order; dict
+      of their new values)
+    """
+    formulas = self.Downstream(names)
+    return ([formula[0] for formula in formulas],
+            EvaluateFormulas(formulas, params))
+
+
+DERIVED_DATA_GRAPH = FormulaGraph(DERIVED_DATA_FORMULAS)
+
+
 class InputParams(object):
+  as_units = True   # parameter values are Units objects (see FloatParams)
+  _overlaid = False # set once a ParamsOverlay wraps these params
+
   def __init__(self, datadict):
     errors = []
-    self.__dict__.update(datadict)
+    # Metric (or other non-canonical) inputs are converted to ft and lb here,
+    # so that quantities given in different units can be combined.
+    self.__dict__.update(NormalizeParams(datadict))
     for category, params_list in PARAMS_BY_CATEGORY:
       for pname in params_list:
         if not hasattr(self, pname):
@@ -133,16 +490,41 @@ class InputParams(object):
       raise Error('Missing parameters from input dictionary:\n%s' %
                   '\n'.join(errors))
     self.ParamsSanityCheck()
-    self.update(self.DerivedData())
+
+  def __getattr__(self, name):
+    """Computes the derived param name on first access (the formulas are in
+    DERIVED_DATA_FORMULAS), and saves it for later."""
+    if name not in DERIVED_DATA_GRAPH.formulas_by_name:
+      raise AttributeError(name)
+    value = self.__dict__[name] = DERIVED_DATA_GRAPH.EvaluateFormula(name, self)
+    return value
+
+  def __getitem__(self, name):
+    """Lets "%(name)s" % params templates use derived params too."""
+    try:
+      return getattr(self, name)
+    except AttributeError:
+      raise KeyError(name)
+
+  def __setattr__(self, name, value):
+    """Once analyses share these params (through a ParamsOverlay), they can
+    only be changed by update(), which discards the derived params that
+    depend on the change."""
+    if self._overlaid:
+      raise Error('Params shared by analyses are read-only; use update() to '
+                  'change "%s"' % name)
+    object.__setattr__(self, name, value)
 
   def ParamsSanityCheck(self):
     errors = []
     n_courses = int(0.5 + self.H / self.block_height)
     discrepency = n_courses * self.block_height - self.H
-    if abs(discrepency.magnitude) > 1e-5:
+    if isinstance(discrepency, Units):
+      discrepency = discrepency.magnitude
+    if abs(discrepency) > 1e-5:
       errors.append(' * wall height (%s) not an integer multiple of '
                     'block height (%s)' % (self.H, self.block_height))
-    self.update({'n_courses': n_courses})
+    self.__dict__['n_courses'] = n_courses
     bad_geogrid_levels = [ i for i in self.geogrid_levels if i > n_courses ]
     if bad_geogrid_levels:
       errors.append(' * some geogrid levels (%s) outside all courses '
@@ -167,7 +549,7 @@ class InputParams(object):
       retval += r'\end{array} \)'
 
       if category in LATEX_ADDENDA_BY_PARAM_CATEGORY:
-        retval += LATEX_ADDENDA_BY_PARAM_CATEGORY[category] % self.__dict__
+        retval += LATEX_ADDENDA_BY_PARAM_CATEGORY[category] % self
 
     retval += r"""
 
@@ -317,12 +699,45 @@ Total vertical force exerted on underlying soil:
 V_t = W_w + F_{av} + F_{qv} \quad = ~ %(W_w)s + %(F_av)s + F_{qv}
    \quad = ~ %(V_t)s
 \end{eqnarray*}
-""" % self.__dict__
+""" % self
     return retval
         
   def update(self, newdict):
-    """Add the new or updated params given in newdict to this instance."""
+    """
+    Add the new or updated params given in newdict to this instance, and
+    discard the derived params that depend on them, to be recomputed when
+    next used.  Returns the names of the derived params affected, in the
+    order they are computed: only those this instance had computed, so the
+    result doesn't depend on what other InputParams have been used for.
+
+    Analyses of these params don't see the changes until they are told which
+    names changed (both those in newdict and those recomputed); see
+    FailureAnalysis.Recompute.  If the new params fail ParamsSanityCheck,
+    the Error is raised and this instance is left unchanged.
+    """
+    previous = dict([(name, self.__dict__[name]) for name in newdict
+                     if name in self.__dict__])
     self.__dict__.update(newdict)
+    changed = set(newdict)
+    recomputed = []
+    if changed.difference(DERIVED_DATA_GRAPH.dependencies or ()):
+      n_courses = self.n_courses
+      try:
+        self.ParamsSanityCheck()
+      except Error:
+        for name in newdict:
+          del self.__dict__[name]
+        self.__dict__.update(previous)
+        self.__dict__['n_courses'] = n_courses
+        raise
+      if self.n_courses != n_courses:
+        changed.add('n_courses')
+        recomputed.append('n_courses')
+    for formula in DERIVED_DATA_GRAPH.Downstream(changed):
+      if formula[0] in self.__dict__:
+        del self.__dict__[formula[0]]
+        recomputed.append(formula[0])
+    return recomputed
     
   @staticmethod
   def FromFile(filename):
@@ -331,140 +746,146 @@ V_t = W_w + F_{av} + F_{qv} \quad = ~ %(W_w)s + %(F_av)s + F_{qv}
     business, you joker), containing a dictionary variable named "params"
     containing everything you'd pass to the constructor.  Comments etc. are
     allowed, of course."""
-    with open(filename) as f:
-      contents = f.read()
-      context = {}
-      exec(contents, context)
-
+    context = SOURCE_CACHE.Load(filename)
     if 'params' not in context:
       raise Error("'params' variable not defined in file %s" % filename)
     return InputParams(context['params'])
 
   def DerivedData(self):
-    d = {}
+    return DERIVED_DATA_GRAPH.Evaluate(self)
 
-    d['ordinal_geogrid_levels_str'] = ', '.join(
-      [ordinal(i) for i in self.geogrid_levels])
+  def Assumptions(self):
+    return """
+    Coefficient of friction is equal to tan(\phi).
+"""
 
-    # X_batt = battering offset, i.e. horizontal distance from toe of wall
-    # to top of wall
-    d['X_batt'] = self.H / tan(self.beta)
+  def AsDict(self):
+    """Returns a dict of all params, computing any derived params not yet
+    used."""
+    for formula in DERIVED_DATA_FORMULAS:
+      getattr(self, formula[0])
+    d = self.__dict__.copy()
+    d.pop('_overlaid', None)
+    return d
 
-    # Total horiz. depth of reinforced soil mass (soil depth + block depth)
-    d['L_t'] = self.L_g + self.L_s
+  def Show(self):
+    return '\n'.join(["%s = %s" % (k,v) for k,v in sorted(self.AsDict().items())])
 
-    ## # K_0 = at-rest pressure coefficient, calculated for both retained and
-    ## #  infill soils
-    ## d['K_0r'] = 1 - sin(self.phi_r)
-    ## d['K_0i'] = 1 - sin(self.phi_i)
 
-    # phi_w = direction of resultant force of soil pressure, calculated for
-    #  both infill and retained soil.  Since the infill soil is compacted,
-    #  phi_wi is significantly less than phi_i.
-    d['phi_wi'] = 0.66 * self.phi_i
-    d['phi_wr'] = 0.66 * self.phi_r
+class FloatParams(InputParams):
+  """
+  InputParams with each Units value replaced by its bare magnitude, and each
+  Degrees value by the angle in radians, so that the derived parameters and
+  the failure analyses are computed on plain floats.  The results are only
+  meaningful if the same formulas have been checked with Units objects of the
+  same dimensions -- see FastAnalyzer.
+  """
+  as_units = False
 
-    # phi_f and gamma_f (foundation soil) assumed equal to phi_r and gamma_r
-    d['phi_f'] = self.phi_r
-    d['gamma_f'] = self.gamma_r
-    
-    # K_a = active pressure coefficient, calculated for both retained and
-    #  infill soils
-    d['csc_beta'] = 1.0 / sin(self.beta)
-    d['K_ar'] = Units( (
-      (d['csc_beta'] * sin(self.beta - self.phi_r)) /
-      ( (sqrt(sin(self.beta + d['phi_wr']))) + sqrt(
-            sin(self.phi_r + d['phi_wr']) * sin(self.phi_r - self.i) /
-            sin(self.beta - self.i) )
-        ) )**2, ndigits=4)
-    d['K_ai'] = Units( (
-      (d['csc_beta'] * sin(self.beta - self.phi_i)) /
-      ( (sqrt(sin(self.beta + d['phi_wi']))) + sqrt(
-            sin(self.phi_i + d['phi_wi']) * sin(self.phi_i - self.i) /
-            sin(self.beta - self.i) )
-        ) )**2, ndigits=4)
-
-    # Magnitude of net force of active pressure
-    d['F_a'] = Units(0.5 * self.gamma_r * d['K_ar'] * (self.H ** 2), ndigits=1)
-    
-    # Horizontal and vertical components of the active pressure force
-    d['F_ah'] = d['F_a'] * cos(d['phi_wr'])
-    d['F_av'] = d['F_a'] * sin(d['phi_wr'])
-
-    # Distances from toe of wall where {resultant horizontal and vertical
-    # components of the active earth pressure force} appear to act.  Earth
-    # pressure is linear with depth, so drawing the magnitude of the force
-    # at each depth creates a triangle of force, so the resultant is at the
-    # triangle's center of mass.  (A triangle's center of mass is 1/3 of the
-    # way up.)  It acts along the back edge of the retained soil mass.
-    d['x_F_active'] = (d['L_t'] + d['X_batt'] / 3.0)
-    d['y_F_active'] = self.H / 3.0
-    
-    # Horizontal and vertical components of the resultant surcharge pressure
-    # per unit length of wall.
-    # (Assuming surcharge pressure is constant with depth, the resultant
-    # force is vertically centered along the wall.)
-    d['F_qh'] = self.q * d['K_ai'] * self.H * cos(d['phi_wi'])
-    d['F_qv'] = self.q * d['K_ai'] * self.H * sin(d['phi_wi'])
-
-    # Distances from toe of wall where {resultant horizontal and vertical
-    # components of the surcharge} appear to act.  Like the resultant active
-    # earth pressure force, the resultant surcharge also acts along the back
-    # edge of the retained soil mass.
-    d['x_F_surcharge'] = (self.L_g + d['X_batt'] / 2.0)
-    d['y_F_surcharge'] = self.H / 2.0
-
-    # Distances from toe of wall where { resultant horizontal and vertical
-    # components of the total force (active pressure + surcharge)} appear to act
-    d['x_F_total'] = (d['x_F_active'] * d['F_ah'] +
-                      d['x_F_surcharge'] * d['F_qh']) / (d['F_ah'] + d['F_qh'])
-    d['y_F_total'] = (d['y_F_active'] * d['F_av'] +
-                      d['y_F_surcharge'] * d['F_qv']) / (d['F_av'] + d['F_qv'])
-    
-    ## # Volume of a segmental block
-    ## d['block_volume'] = (self.block_length * self.block_depth *
-    ##                       self.block_height)
-
-    # Weight of a unit length of the wall face
-    d['W_f'] = self.gamma_wall * self.H * self.block_depth
-
-    # Coefficient of friction for infill and retained soil
-    d['C_fi'] = Units(tan(self.phi_i), ndigits=4)
-    d['C_fr'] = Units(tan(self.phi_r), ndigits=4)
-
-    # Weight of a unit length of the reinforced soil mass
-    d['W_s'] = self.gamma_i * self.H * (self.L_g - self.block_depth + self.L_s)
-
-    # Horizontal distance from toe of wall where resultant weight acts
-    # Approximately equal to the center of mass of the parallelogram of soil
-    #  and wall, if the difference in density between wall and soil is
-    #  negligible.
-    d['CM_x'] = ( d['W_s'] * ( d['X_batt']/2 + self.block_depth + (
-                  self.L_g + self.L_s - self.block_depth) / 2 ) +
-                  d['W_f'] * ( d['X_batt']/2 + self.block_depth/2) ) / (
-                  d['W_s'] + d['W_f'])
-    
-    # Total weight of a unit length of wall and its soil mass
-    d['W_w'] = d['W_f'] + d['W_s']
+  def __init__(self, datadict):
+    InputParams.__init__(self, StripUnits(NormalizeParams(datadict)))
+
+
+def StripUnits(datadict):
+  """Returns a copy of datadict with Degrees values converted to radians and
+  other Units values replaced by their magnitudes."""
+  stripped = {}
+  for name, value in datadict.items():
+    if isinstance(value, Degrees):
+      value = value.radians()
+    elif isinstance(value, Units):
+      value = value.magnitude
+    stripped[name] = value
+  return stripped
+
+
+def UnitsSignature(datadict):
+  """Returns a hashable summary of the units (or types) of the values in
+  datadict.  Two designs with the same signature go through exactly the same
+  dimensional arithmetic."""
+  signature = []
+  for name, value in sorted(datadict.items()):
+    if isinstance(value, Degrees):
+      signature.append((name, 'degrees'))
+    elif isinstance(value, Units):
+      signature.append((name, value.dim))
+    else:
+      signature.append((name, value.__class__.__name__))
+  return tuple(signature)
 
-    # Total vertical force exerted on underlying soil
-    d['V_t'] = d['W_w'] + d['F_av'] + d['F_qv']
-    
-    return d
 
-  def Assumptions(self):
-    return """
-    Coefficient of friction is equal to tan(\phi).
-"""
+class ParamsOverlay(object):
+  """
+  Copy-on-write view of an InputParams object (or of another ParamsOverlay).
+  Reads fall through to the underlying params; writes (by update(), or by
+  item or attribute assignment) go to the overlay only.  So all the analyses
+  of a design share one InputParams, whose derived data is computed once, and
+  none of them copy it.  An overlay can be used directly as the mapping in
+  "%(name)s" % overlay templates.
+
+  Wrapping an InputParams makes it read-only, except by InputParams.update,
+  which discards the derived params that depend on what changed; the
+  overlays' analyses are then brought up to date by FailureAnalysis.Recompute.
+
+  If _reads is set to a set, the names read from the base are added to it.
+  """
+  _reads = None
+
+  def __init__(self, base):
+    self._base = base
+    if isinstance(base, InputParams):
+      base.__dict__['_overlaid'] = True
+
+  def __getattr__(self, name):
+    if name == '_base':
+      raise AttributeError(name)
+    if self._reads is not None:
+      self._reads.add(name)
+    return getattr(self._base, name)
+
+  def __getitem__(self, name):
+    try:
+      return getattr(self, name)
+    except AttributeError:
+      raise KeyError(name)
+
+  def __setitem__(self, name, value):
+    setattr(self, name, value)
+
+  def update(self, newdict):
+    """Add the new or updated params given in newdict to this overlay."""
+    self.__dict__.update(newdict)
+
+  def AsDict(self):
+    """Returns a dict of all params, including those of the base."""
+    d = self._base.AsDict()
+    d.update(self.__dict__)
+    del d['_base']
+    return d
 
   def Show(self):
-    return '\n'.join(["%s = %s" % (k,v) for k,v in sorted(self.__dict__.items())])
+    return '\n'.join(["%s = %s" % (k,v) for k,v in sorted(self.AsDict().items())])
 
 
 class FailureAnalysis(object):
-  def __init__(self, params):
+  # (name, formula) tuples for this analysis's derived parameters, in the
+  # order they are computed; see DERIVED_DATA_FORMULAS.
+  FORMULAS = []
+  # Set for each subclass on first use: the FormulaGraph of its FORMULAS, and
+  # the names of all the params its analysis reads.
+  _graph = None
+  _inputs = None
+
+  def __init__(self, params, latex=True, shared=None):
     """
-    params: object of type InputParams
+    params: object of type InputParams (or FloatParams).  It is shared, not
+      copied: this analysis's own values go into self.params, a ParamsOverlay
+      on top of it.
+    latex: if false, skip preparing the latex output (e.g. fos_box), and
+      just compute the numbers
+    shared: dict of the values of some of this analysis's FORMULAS, already
+      computed on the same params by another analysis with the same formulas
+      (see AnalysisScheduler)
 
     Note that self.name will be set to the class name (with spaces inserted
       before capital letters), and the desired factor of safety will be
@@ -475,16 +896,60 @@ class FailureAnalysis(object):
       forces resisting failure over forces causing failure; the *desired*
       FOS is presumably > 1.0.)
     """
-    self.params = InputParams(params.__dict__.copy())
-    self.ExtractVariablesFromClassName()
-    self.params.update(self.DerivedParams())
+    self.params = ParamsOverlay(params)
+    self.latex = latex
+    self.Recompute(shared=shared)
+
+  @classmethod
+  def Graph(cls):
+    """Returns the FormulaGraph of cls.FORMULAS."""
+    if '_graph' not in cls.__dict__:
+      cls._graph = FormulaGraph(cls.FORMULAS)
+    return cls._graph
+
+  def Recompute(self, changed=None, shared=None):
+    """
+    (Re)computes this analysis's derived params and factor of safety.
+
+    Args:
+      changed (iterable) - names of the underlying params that have changed
+        since this analysis was computed: the names given to
+        InputParams.update, plus the names it returned.  If None, everything
+        is computed.
+      shared (dict) - values of formulas already computed, as for __init__;
+        only used when everything is computed, and not the first time this
+        class is analyzed (when its dependencies are being traced)
+    Returns: names of the values recomputed, in order (empty if the analysis
+      doesn't depend on anything that changed)
+    """
+    cls = self.__class__
+    tracing = '_inputs' not in cls.__dict__
+    if changed is None:
+      if tracing:
+        self.params._reads = set()
+      self.ExtractVariablesFromClassName()
+      values = cls.Graph().Evaluate(self.params,
+                                    known=not tracing and shared or None)
+      names = [formula[0] for formula in self.FORMULAS]
+    elif cls._inputs.intersection(changed):
+      self.ExtractVariablesFromClassName()
+      names, values = cls.Graph().Recompute(self.params, changed)
+    else:
+      return []
+    self.params.update(values)
     self.params.update({
         'actual_fos' : self.ActualFactorOfSafety(),
         'desired_fos' : self.desired_fos,
         })
+    if tracing and changed is None:
+      cls._inputs = self.params._reads
+      del self.params._reads
+    if not self.latex:
+      return names + ['actual_fos', 'desired_fos']
     self.params.update({
         'fos_box' : self.FOSLatexBox(),
         })
+    return names + ['actual_fos', 'desired_fos', 'fos_box']
 
   def ExtractVariablesFromClassName(self):
     classname = self.__class__.__name__
@@ -493,7 +958,7 @@ class FailureAnalysis(object):
     self.desired_fos = getattr(self.params, 'FOS_%s' % firstword)
     
   def DerivedParams(self):
-    return {}
+    return self.Graph().Evaluate(self.params)
 
   def SafetyCheck(self):
     """
@@ -516,13 +981,13 @@ class FailureAnalysis(object):
 \textcolor{green}{\fbox{
 %(actual_fos)s $\geq$ %(desired_fos)s \checkmark
 }}
-\end{center}""" % self.params.__dict__
+\end{center}""" % self.params
     else:
       return r"""\begin{center}
 \textcolor{red}{\fbox{
 %(actual_fos)s $<$ %(desired_fos)s
 }}
-\end{center}""" % self.params.__dict__
+\end{center}""" % self.params
     
   def ForcesCausingFailure(self):
     raise Error("Must be implemented in subclass")
@@ -541,19 +1006,15 @@ class SlidingAnalysis(FailureAnalysis):
   Reference: http://www.allanblock.com/Literature/PDF/EngManual.pdf
   """
 
-  def DerivedParams(self):
-    d = {}
-    params = self.params
-
+  FORMULAS = [
     # Sliding force: horizontal active pressure + horizontal surcharge
-    d['F_s'] = self.params.F_ah + self.params.F_qh
+    ('F_s', lambda p: p.F_ah + p.F_qh),
 
     # Resisting force: Total vertical force times coeffient of friction
     #   (live load surcharges can't help resist failure -- dead load value
     #    would be C_fi * F_qv)
-    d["F_r"] = (params.W_w + params.F_av) * params.C_fi
-
-    return d 
+    ('F_r', lambda p: (p.W_w + p.F_av) * p.C_fi),
+    ]
 
   def ForcesCausingFailure(self):
     return self.params.F_s
@@ -584,7 +1045,7 @@ soil mass:
 Factor of safety (FOS) = %(F_r)s $\div$ %(F_s)s = %(actual_fos)s \\
 Design specification FOS = %(desired_fos)s
 %(fos_box)s
-""" % self.params.__dict__
+""" % self.params
   
 
 class OverturningAnalysis(FailureAnalysis):
@@ -593,10 +1054,7 @@ class OverturningAnalysis(FailureAnalysis):
   Reference: http://www.allanblock.com/Literature/PDF/EngManual.pdf
   """
 
-  def DerivedParams(self):
-    d = {}
-    params = self.params
-
+  FORMULAS = [
     # sum of moments resisting overturning, given as force * moment-arm
     #  * weight of wall face:
     #      W_f * (block midpoint + 0.5*X_batt)
@@ -606,23 +1064,22 @@ class OverturningAnalysis(FailureAnalysis):
     #      F_av * (distance to back of soil mass + 1/3 * X_batt)
     #  * vertical component of surcharge force:
     #      F_qv * (distance to back of soil mass + 1/2 * X_batt)
-    d["sumM_r"] = (
-      params.W_f * 0.5 * (params.block_depth + params.X_batt)
-      + params.W_s * (0.5 * (params.L_t - params.block_depth)
-                      + params.block_depth + 0.5 * params.X_batt)
-      + params.F_av * (params.L_t + params.X_batt/3.0)
-      + params.F_qv * (params.L_t + 0.5 * params.X_batt)
-      )
+    ('sumM_r', lambda p: Sum([
+      p.W_f * 0.5 * (p.block_depth + p.X_batt),
+      p.W_s * Sum([0.5 * (p.L_t - p.block_depth),
+                   p.block_depth, 0.5 * p.X_batt]),
+      p.F_av * (p.L_t + p.X_batt/3.0),
+      p.F_qv * (p.L_t + 0.5 * p.X_batt),
+      ])),
 
     # sum of moments causing overturning
     #  * horizontal component of active force:
     #      F_ah * y_F_active
     #  * horizontal component of surcharge force:
     #      F_qh * y_F_surcharge
-    d["sumM_o"] = (params.F_ah * params.y_F_active +
-                   params.F_qh * params.y_F_surcharge)
-    
-    return d
+    ('sumM_o', lambda p: (p.F_ah * p.y_F_active +
+                          p.F_qh * p.y_F_surcharge)),
+    ]
 
   def ForcesCausingFailure(self):
     return self.params.sumM_o
@@ -675,7 +1132,7 @@ resisting overturning is thus:
 Factor of safety (FOS) = %(sumM_r)s $\div$ %(sumM_o)s = %(actual_fos)s \\
 Design specification FOS = %(desired_fos)s
 %(fos_box)s
-""" % self.params.__dict__
+""" % self.params
   
 
 class BearingPressureAnalysis(FailureAnalysis):
@@ -684,10 +1141,7 @@ class BearingPressureAnalysis(FailureAnalysis):
   Reference: http://www.allanblock.com/Literature/PDF/EngManual.pdf
   """
 
-  def DerivedParams(self):
-    d = {}
-    params = self.params
-
+  FORMULAS = [
     # Distance from toe of wall to point of application of resultant force due
     # to bearing pressure.  Calculated by setting sum of moments around the
     # toe of the wall to zero.  Defining positive moments to be those which
@@ -706,28 +1160,27 @@ class BearingPressureAnalysis(FailureAnalysis):
     #         - F_av * x_F_active + (W_w + F_av) * X_bearing
     #     (W_w * CM_x - F_ah * y_F_active - F_qh * y_F_surcharge
     #         + F_av * x_F_active) / (W_w + F_av) = X_bearing
-    d['X_bearing'] = (params.W_w * params.CM_x - params.F_ah * params.y_F_active
-       - params.F_qh * params.y_F_surcharge + params.F_av * params.x_F_active
-                      ) / (params.W_w + params.F_av)
+    ('X_bearing', lambda p: (p.W_w * p.CM_x - p.F_ah * p.y_F_active
+       - p.F_qh * p.y_F_surcharge + p.F_av * p.x_F_active
+                             ) / (p.W_w + p.F_av)),
     # Eccentricity, or distance from center of soil mass to X_bearing
     # Note that e is set to zero if e<0, because we don't design to resist
     # moments causing the wall to tilt backward.
-    d['e'] = max(0.0 * params.L_t, 0.5 * params.L_t - d['X_bearing'])
+    ('e', lambda p: Maximum(0.0 * p.L_t, 0.5 * p.L_t - p.X_bearing)),
 
     # Average bearing pressure per unit length: weight of wall face and soil
     # plus vertical active earth pressure plus surcharge, divided by horizontal
     # depth of wall and soil mass
-    d['sigma_avg'] = params.V_t / params.L_t
+    ('sigma_avg', lambda p: p.V_t / p.L_t),
 
     # Bearing pressure due to moment about midpoint of soil mass
-    d['M_B'] = params.V_t * d['e']  # magnitude of moment
-    d['S'] = 1.0 * (params.L_t ** 2) / 6.0   # section modulus
-    d['sigma_mom'] = d['M_B'] / d['S']
+    ('M_B', lambda p: p.V_t * p.e),  # magnitude of moment
+    ('S', lambda p: 1.0 * (p.L_t ** 2) / 6.0),   # section modulus
+    ('sigma_mom', lambda p: p.M_B / p.S),
 
-    d['sigma_min'] = d['sigma_avg'] - d['sigma_mom']
-    d['sigma_max'] = d['sigma_avg'] + d['sigma_mom']
-    
-    return d
+    ('sigma_min', lambda p: p.sigma_avg - p.sigma_mom),
+    ('sigma_max', lambda p: p.sigma_avg + p.sigma_mom),
+    ]
 
   def ForcesCausingFailure(self):
     return self.params.sigma_max
@@ -832,7 +1285,7 @@ Bearing capacity of soil = %(sigma_allowed)s \\
 Factor of safety (FOS) = %(sigma_allowed)s $\div$ %(sigma_max)s = %(actual_fos)s \\
 Design specification FOS = %(desired_fos)s
 %(fos_box)s
-""" % self.params.__dict__
+""" % self.params
 
 class UltimateBearingCapacityAnalysis(BearingPressureAnalysis):
   """
@@ -840,25 +1293,21 @@ class UltimateBearingCapacityAnalysis(BearingPressureAnalysis):
   Reference: http://www.allanblock.com/Literature/PDF/EngManual.pdf
   """
 
-  def DerivedParams(self):
-    # Inherit calculations for sigma_max
-    d = BearingPressureAnalysis.DerivedParams(self)
-    params = self.params
-
+  # Inherit calculations for sigma_max
+  FORMULAS = BearingPressureAnalysis.FORMULAS + [
     # Ultimate bearing capacity q_f is equal to
     #   0.5*gamma_f*B_b*N_gamma + c*N_c + gamma_f*D*N_q
     # (Terghazi equation for ultimate bearing capacity, as cited in
     #    {Craig, "Soil Mechanics", p.303}, as cited in Allan Block manual)
 
-    d['N_q'] = exp(pi*tan(params.phi_f)) * (tan(Degrees(45) + params.phi_f/2) ** 2)
-    d['N_c'] = (d['N_q'] - 1) / tan(params.phi_f)
-    d['N_gamma'] = (d['N_q'] - 1) * tan(1.4 * params.phi_f)
-
-    d['q_f'] = (0.5 * params.gamma_f * params.B_b * d['N_gamma'] +
-                params.cohesion_f * d['N_c'] +
-                params.gamma_f * params.D * d['N_q'])
+    ('N_q', lambda p: exp(pi*tan(p.phi_f)) * (tan(Degrees(45) + p.phi_f/2) ** 2)),
+    ('N_c', lambda p: (p.N_q - 1) / tan(p.phi_f)),
+    ('N_gamma', lambda p: (p.N_q - 1) * tan(1.4 * p.phi_f)),
 
-    return d
+    ('q_f', lambda p: Sum([0.5 * p.gamma_f * p.B_b * p.N_gamma,
+                           p.cohesion_f * p.N_c,
+                           p.gamma_f * p.D * p.N_q])),
+    ]
 
   def ForcesCausingFailure(self):
     return self.params.sigma_max
@@ -907,7 +1356,7 @@ Ultimate bearing capacity = %(q_f)s \\
 Factor of safety (FOS) = %(q_f)s $\div$ %(sigma_max)s = %(actual_fos)s \\
 Design specification FOS = %(desired_fos)s
 %(fos_box)s
-""" % self.params.__dict__
+""" % self.params
 
 
 class GridAnalysis(FailureAnalysis):
@@ -915,6 +1364,17 @@ class GridAnalysis(FailureAnalysis):
   Reference: Allan Block Engineering Manual, starting at page 28 of pdf.
   Reference: http://www.allanblock.com/Literature/PDF/EngManual.pdf
   """
+  # The (load, values) pair from LayerValues for each layer, computed on
+  # first use after each Recompute; see LayerRecords.
+  _layers = None
+
+  def Recompute(self, changed=None, shared=None):
+    layers, self._layers = self._layers, None
+    names = FailureAnalysis.Recompute(self, changed, shared)
+    if not names:
+      self._layers = layers       # nothing this analysis uses has changed
+    return names
+
   def ParamsForLayer(self, i):
     d = self.HorizontalLoadOnLayer(i)
     
@@ -922,6 +1382,12 @@ class GridAnalysis(FailureAnalysis):
     """Returns the horizontal load on layer i of geogrid, and, as an extra
     bonus, the latex string describing the calculation. Returned as a
     tuple (F, texstr)."""
+    d = self.LayerRecords()[i][0]
+    return d['F_g'], self.LoadTex(d)
+
+  def LoadOnLayer(self, i):
+    """Returns a dict of the quantities in the calculation of the horizontal
+    load on layer i of geogrid, including the load itself, F_g."""
     params = self.params
     layers = params.geogrid_levels
   
@@ -966,7 +1432,13 @@ class GridAnalysis(FailureAnalysis):
     # Force on the geogrid
     d['h'] = d['d_bottom'] - d['d_top']
     d['F_g'] = d['P_avg'] * d['h']
-    self.params.update(d)
+    return d
+
+  def LoadTex(self, d):
+    """Returns the latex describing the load calculation d (as returned by
+    LoadOnLayer)."""
+    params = ParamsOverlay(self.params)
+    params.update(d)
 
     tex = r"""
 {\bf Max load on geogrid:}
@@ -982,9 +1454,9 @@ P_{avg} &=& \frac{P_{top} + P_{bottom}}{2} \quad = ~
   \frac{%(P_top)s + %(P_bottom)s}{2} \quad = ~ %(P_avg)s \\
 F_g  &=& %(P_avg)s \cdot %(h)s \quad = ~ %(F_g)s
 \end{eqnarray*}
-""" % self.params.__dict__
+""" % params
         
-    return d['F_g'], tex
+    return tex
 
   def LoadCalculationExplanation(self):
     return r"""
@@ -1008,9 +1480,26 @@ the active earth pressure.  The former is given by $K_{ai} \cos \phi_{wi}
  \[ P_d = K_{ai} \cdot \cos \phi_{wi} \cdot (q + \gamma_i d) \]
 """
     
+  def LayerValues(self, i):
+    """Returns (load, values): the dict from LoadOnLayer(i), and a dict of
+    the other quantities computed for layer i, including its factor of
+    safety, actual_fos.  Computes numbers only, no latex."""
+    raise Error("Must be implemented in subclass")
+
+  def LayerRecords(self):
+    """Returns the (load, values) pair from LayerValues for each layer,
+    computing them only once."""
+    if self._layers is None:
+      self._layers = [self.LayerValues(i)
+                      for i in range(len(self.params.geogrid_levels))]
+    return self._layers
+
+  def ActualFactorOfSafetyForLayer(self, i):
+    return self.LayerRecords()[i][1]['actual_fos']
+
   def ActualFactorOfSafety(self):
-    return min([ self.ActualFactorOfSafetyForLayer(i)
-                 for i in range(len(self.params.geogrid_levels)) ])
+    return reduce(Minimum, [ self.ActualFactorOfSafetyForLayer(i)
+                             for i in range(len(self.params.geogrid_levels)) ])
 
   def SafetyCheck(self):
     """Check each layer of the grid."""
@@ -1030,7 +1519,7 @@ the active earth pressure.  The former is given by $K_{ai} \cos \phi_{wi}
 
   
   def __str__(self):
-    d = self.params.__dict__.copy()    
+    d = ParamsOverlay(self.params)
     d['name'] = self.name
     d['header'] = self.TexHeader()
     d['calc_explanation'] = self.CalculationExplanation()
@@ -1070,13 +1559,21 @@ Design specification FOS = %(desired_fos)s \\
 class RuptureAnalysis(GridAnalysis):
   """Will any layer of geogrid rupture at the active/passive line?"""
 
+  def LayerValues(self, i):
+    load = self.LoadOnLayer(i)
+    d = {}
+    d['F_g'] = load['F_g']
+    d['F_R'] = self.params.LTADS
+    d['actual_fos'] = d['F_R'] / d['F_g']
+    return load, d
+
   def ActualFactorOfSafetyForLayerAndTex(self, i):
+      load, values = self.LayerRecords()[i]
       # Use a dictionary to make the format string more readable
-      d = {}
-      d['F_g'], d['loadTex'] = self.HorizontalLoadOnLayer(i)
-      d['F_R'] = self.params.LTADS
+      d = dict(values)
+      d['loadTex'] = self.LoadTex(load)
       d['grid_i'] = i+1   # "layer 0" -> "layer 1" in the human-readable output
-      d['FOS'] = d['F_R'] / d['F_g']
+      d['FOS'] = d['actual_fos']
       d['block_course_ordinal'] = ordinal(self.params.geogrid_levels[i])
       tex = r"""%(loadTex)s
 
@@ -1090,10 +1587,6 @@ FOS_{rupture,%(grid_i)d} &=& F_R / F_g \quad = ~ %(F_R)s \div %(F_g)s \quad = ~
 """ % d
       return d['FOS'], tex
 
-  def ActualFactorOfSafetyForLayer(self, i):
-    fos, _ = self.ActualFactorOfSafetyForLayerAndTex(i)
-    return fos
-
   def TexHeader(self):
     return """In this section, we analyze the forces that are acting to rip the
 geogrid at each layer.  To do so, we compute the load on the layer,
@@ -1115,17 +1608,13 @@ class PulloutOfBlockAnalysis(GridAnalysis):
   Reference: http://www.allanblock.com/Literature/PDF/EngManual.pdf
   """
 
-  def ActualFactorOfSafetyForLayerAndTex(self, i):
-    """Do the math and also return the tex"""
+  def LayerValues(self, i):
     params = self.params
-    d = params.__dict__.copy()
-
-    # Use a dictionary to make the format string more readable
-    d['grid_i'] = i+1   # "layer 0" -> "layer 1" in the human-readable output
-    d['block_course_ordinal'] = ordinal(self.params.geogrid_levels[i])
+    load = self.LoadOnLayer(i)
+    d = {}
 
     # Force on the geogrid at the back face of the wall
-    d['F_g'], d['loadTex'] = self.HorizontalLoadOnLayer(i)
+    d['F_g'] = load['F_g']
 
     # Force at the back of the wall is about 2/3 of the max force on the geogrid
     # (Allan Block manual citing McKittrick 1979)
@@ -1142,6 +1631,18 @@ class PulloutOfBlockAnalysis(GridAnalysis):
     # in which case the grid would rupture before pulling out of the blocks.  However,
     # that mode of failure is covered by the rupture analysis, so this should be fine.
     d['actual_fos'] = d['F_CS'] / d['F_W']
+    return load, d
+
+  def ActualFactorOfSafetyForLayerAndTex(self, i):
+    """Do the math and also return the tex"""
+    load, values = self.LayerRecords()[i]
+    d = ParamsOverlay(self.params)
+    d.update(values)
+
+    # Use a dictionary to make the format string more readable
+    d['grid_i'] = i+1   # "layer 0" -> "layer 1" in the human-readable output
+    d['block_course_ordinal'] = ordinal(self.params.geogrid_levels[i])
+    d['loadTex'] = self.LoadTex(load)
     
     tex = r"""\noindent 
 {\bf Analysis for geogrid above %(block_course_ordinal)s course of blocks from
@@ -1166,10 +1667,6 @@ FOS_{pullout,%(grid_i)d} &=& F_{CS} / F_W \quad = ~ %(F_CS)s \div %(F_W)s \quad
     
     return d['actual_fos'], tex
 
-  def ActualFactorOfSafetyForLayer(self, i):
-    fos, _ = self.ActualFactorOfSafetyForLayerAndTex(i)
-    return fos
-
   def TexHeader(self):
     return """In this section, we analyze the forces that are acting to pull the
 geogrid out from the blocks at each layer.  To do so, we compute the
@@ -1217,17 +1714,17 @@ class PulloutOfSoilAnalysis(GridAnalysis):
   Reference: http://www.allanblock.com/Literature/PDF/EngManual.pdf
   """
 
-  def ActualFactorOfSafetyForLayerAndTex(self, i):
+  def LayerValues(self, i):
     params = self.params
-    d = params.__dict__.copy()
+    load = self.LoadOnLayer(i)
+    d = {}
 
-    d['grid_i'] = i+1   # "layer 0" -> "layer 1" in the human-readable output
     d['layer_depth'] = params.H - params.geogrid_levels[i] * params.block_height
-    d['F_g'], d['loadTex'] = self.HorizontalLoadOnLayer(i)
+    d['F_g'] = load['F_g']
 
     # Length of geogrid in active zone --  see comment on page 33 of the
     # Allan Block eng manual
-    d['L_a'] = min(
+    d['L_a'] = Minimum(
       0.3 * params.H,
       (params.H - d['layer_depth'])  * (tan(Degrees(45) - params.phi_i/2) -
                                         tan(Degrees(90) - params.beta)))
@@ -1237,12 +1734,20 @@ class PulloutOfSoilAnalysis(GridAnalysis):
 
     # Restraining force on the grid
     # TODO: adjust for surcharge
-    d['F_gr'] = min(2 * d['layer_depth'] * params.gamma_i * d['L_e']
-                 * params.C_i * tan(params.phi_i),
-                 self.params.LTADS)
+    d['F_gr'] = Minimum(2 * d['layer_depth'] * params.gamma_i * d['L_e']
+                        * params.C_i * tan(params.phi_i),
+                        self.params.LTADS)
     d['actual_fos'] = d['F_gr'] / d['F_g']
+    return load, d
 
-    d['block_course_ordinal'] = ordinal(params.geogrid_levels[i])
+  def ActualFactorOfSafetyForLayerAndTex(self, i):
+    load, values = self.LayerRecords()[i]
+    d = ParamsOverlay(self.params)
+    d.update(values)
+
+    d['grid_i'] = i+1   # "layer 0" -> "layer 1" in the human-readable output
+    d['loadTex'] = self.LoadTex(load)
+    d['block_course_ordinal'] = ordinal(self.params.geogrid_levels[i])
     tex = r"""\noindent 
 {\bf Analysis for geogrid above %(block_course_ordinal)s course of blocks from
    the bottom}
@@ -1273,10 +1778,6 @@ FOS_{pullout,%(grid_i)d}  &=& F_{gr} / F_g \quad = ~ %(F_gr)s \div %(F_g)s
 %%(fos_box)s
 """ % d
     return d['actual_fos'], tex
-
-  def ActualFactorOfSafetyForLayer(self, i):
-    fos, _ = self.ActualFactorOfSafetyForLayerAndTex(i)
-    return fos
   
   def TexHeader(self):
     return """
@@ -1321,21 +1822,276 @@ FOS_{pullout,i}  &=& F_{gr} / F_g
 """
 
 ############## Main code below ################################################
-  
-def RunAllAnalyses(config):
+
+ALL_ANALYSES = (
+  SlidingAnalysis, OverturningAnalysis, BearingPressureAnalysis,
+  UltimateBearingCapacityAnalysis, RuptureAnalysis, PulloutOfBlockAnalysis,
+  PulloutOfSoilAnalysis,
+  )
+
+class AnalysisScheduler(object):
+  """
+  Runs a set of analyses on a design, computing the intermediate values they
+  have in common only once.  An analysis whose FORMULAS begin with the same
+  formulas as an earlier analysis's -- as UltimateBearingCapacityAnalysis's
+  begin with BearingPressureAnalysis's, for X_bearing through sigma_max --
+  consumes the values the earlier one produced instead of recomputing them.
+  (Only a common prefix is shared, so that each shared formula sees the
+  same earlier formulas in both analyses.)
+  """
+  def __init__(self, analysis_classes=ALL_ANALYSES):
+    self.analysis_classes = analysis_classes
+    # analysis class -> (earlier analysis class, number of formulas shared)
+    self.sources = {}
+    for i, analysis_class in enumerate(analysis_classes):
+      for earlier in analysis_classes[:i]:
+        n = 0
+        for mine, theirs in zip(analysis_class.FORMULAS, earlier.FORMULAS):
+          if mine is not theirs:
+            break
+          n += 1
+        if n > self.sources.get(analysis_class, (None, 0))[1]:
+          self.sources[analysis_class] = (earlier, n)
+
+  def Run(self, params, latex=True):
+    """Returns an analysis of params by each of the analysis classes, in
+    order (see FailureAnalysis.__init__)."""
+    analyses = {}
+    for analysis_class in self.analysis_classes:
+      shared = None
+      if analysis_class in self.sources:
+        source, n = self.sources[analysis_class]
+        values = analyses[source].params.__dict__
+        shared = dict([(formula[0], values[formula[0]])
+                       for formula in analysis_class.FORMULAS[:n]])
+      analyses[analysis_class] = analysis_class(params, latex, shared)
+    return [analyses[analysis_class]
+            for analysis_class in self.analysis_classes]
+
+ANALYSIS_SCHEDULER = AnalysisScheduler(ALL_ANALYSES)
+
+# Set WALL_CHECK_UNITS=1 in the environment to make FastAnalyzer check the
+# units of every design, not just the first of each kind.  (Slow, but useful
+# when debugging changes to the formulas.)
+CHECK_UNITS = os.environ.get('WALL_CHECK_UNITS', '0') not in ('', '0')
+
+class FastAnalyzer(object):
+  """
+  Computes the factors of safety of many designs, checking units only once.
+
+  The first design with a given UnitsSignature is analyzed with Units objects,
+  which checks the dimensions of every formula along the way, and then again
+  with FloatParams, to make sure the plain-float computation agrees.  Later
+  designs with the same signature are only analyzed with FloatParams.
+  """
+  def __init__(self, analysis_classes=ALL_ANALYSES, check_units=None):
+    """
+    analysis_classes: FailureAnalysis subclasses to run on each design
+    check_units: if true, analyze every design with Units objects
+      (default: CHECK_UNITS)
+    """
+    if check_units is None:
+      check_units = CHECK_UNITS
+    self.analysis_classes = analysis_classes
+    self.scheduler = AnalysisScheduler(analysis_classes)
+    self.check_units = check_units
+    self.checked_signatures = set()
+
+  def Analyze(self, datadict):
+    """
+    Args: datadict (dict) - input parameters, as for InputParams
+    Returns: list of (analysis name, actual FOS, desired FOS) tuples, one per
+      analysis class, with the factors of safety as floats
+    """
+    if self.check_units:
+      return self.AnalyzeParams(InputParams(datadict))
+    signature = UnitsSignature(datadict)
+    if signature in self.checked_signatures:
+      try:
+        params = FloatParams(datadict)
+      except Error:
+        InputParams(datadict)   # raises the same error, but showing units
+        raise
+      return self.AnalyzeParams(params)
+
+    checked = self.AnalyzeParams(InputParams(datadict))
+    for (name, expected, _), (_, actual, _) in zip(
+      checked, self.AnalyzeParams(FloatParams(datadict))):
+      if abs(actual - expected) > 1e-9 * max(1.0, abs(expected)):
+        raise Error('%s: FOS computed on plain floats (%s) differs from FOS '
+                    'computed with units (%s)' % (name, actual, expected))
+    self.checked_signatures.add(signature)
+    return checked
+
+  def AnalyzeParams(self, params):
+    results = []
+    for analysis in self.scheduler.Run(params, latex=False):
+      results.append((analysis.name, float(analysis.params.actual_fos),
+                      analysis.desired_fos))
+    return results
+
+
+# Errors that mean a design can't be analyzed: besides bad params, formulas
+# that fail numerically, e.g. with a backfill slope i steeper than phi.
+DESIGN_ERRORS = (Error, units.Error, ValueError, ArithmeticError)
+
+def ErrorMessage(e):
+  """Returns the message for one of DESIGN_ERRORS."""
+  if isinstance(e, (Error, units.Error)):
+    return str(e)
+  return '%s: %s' % (e.__class__.__name__, e)
+
+
+# AnalyzeDesignsInParallel spreads batches of at least this many designs over
+# a pool of worker processes, when there is more than one CPU.
+PARALLEL_MIN_DESIGNS = 500
+
+# State of each AnalyzeDesignsInParallel worker process, set by _InitWorker.
+_worker = {}
+
+def _InitWorker(analysis_classes):
+  _worker['analyzer'] = FastAnalyzer(analysis_classes)
+
+def _AnalyzeDesign(design, analyzer=None):
+  """Returns (results of FastAnalyzer.Analyze, None), or (None, error
+  message) if the design can't be analyzed."""
+  try:
+    return (analyzer or _worker['analyzer']).Analyze(design), None
+  except DESIGN_ERRORS, e:
+    return None, ErrorMessage(e)
+
+def AnalyzeDesignsInParallel(designs, analysis_classes=ALL_ANALYSES,
+                             processes=None):
+  """
+  Args:
+    designs (list) - datadicts, as for InputParams
+    analysis_classes - FailureAnalysis subclasses to run on each design
+    processes (int) - number of worker processes (default: one per CPU)
+  Returns: (results, errors) where results is a list of the results of
+    FastAnalyzer.Analyze for each design, in order, or None for a design
+    that can't be analyzed, and errors maps the index of each such design
+    to its error message.  Unless there is only one process or there are
+    fewer than PARALLEL_MIN_DESIGNS designs, they are analyzed in parallel,
+    in chunks, each worker checking units once per UnitsSignature.
+  """
+  if processes is None:
+    processes = multiprocessing.cpu_count()
+  if processes == 1 or len(designs) < PARALLEL_MIN_DESIGNS:
+    analyzer = FastAnalyzer(analysis_classes)
+    analyzed = [_AnalyzeDesign(design, analyzer) for design in designs]
+  else:
+    pool = multiprocessing.Pool(processes, _InitWorker, (analysis_classes,))
+    try:
+      analyzed = pool.map(_AnalyzeDesign, designs,
+                          max(1, len(designs) // (4 * processes)))
+    finally:
+      pool.close()
+      pool.join()
+  errors = dict([(index, error) for index, (_, error) in enumerate(analyzed)
+                 if error is not None])
+  return [results for results, _ in analyzed], errors
+
+
+class Screener(object):
+  """
+  Decides whether each of many designs passes all the analyses, as cheaply
+  as possible: the analyses are run one at a time, stopping at the first
+  that fails, and the analysis that rejected each design is recorded.
+
+  The analyses are run in order of their measured cost divided by their
+  observed failure rate, so those most likely to reject a design for the
+  least work go first; the order is updated as designs are screened.  Units
+  are checked as by FastAnalyzer, by a full analysis of the first design of
+  each UnitsSignature.
+  """
+  # The rejection recorded for a design that fails ParamsSanityCheck, or can't
+  # be analyzed at all (one of DESIGN_ERRORS)
+  INVALID_DESIGN = 'Param sanity check'
+
+  def __init__(self, analysis_classes=ALL_ANALYSES):
+    self.checker = FastAnalyzer(analysis_classes)
+    self.order = list(analysis_classes)
+    # analysis class -> [designs analyzed, designs failed, total seconds]
+    self.stats = dict([(cls, [0, 0, 0.0]) for cls in analysis_classes])
+    # rejection (analysis name, or INVALID_DESIGN) -> number of designs
+    self.rejections = {}
+
+  def Priority(self, analysis_class):
+    """Returns the expected cost of analysis_class per design it rejects.
+    An analysis not yet run costs nothing, so each is tried early on."""
+    runs, failures, seconds = self.stats[analysis_class]
+    return (seconds / (runs + 1)) / ((failures + 1.0) / (runs + 2))
+
+  def Screen(self, datadict):
+    """
+    Args: datadict (dict) - input parameters, as for InputParams
+    Returns: the name of the analysis that rejected the design (or
+      INVALID_DESIGN), or None if it passes them all
+    """
+    if UnitsSignature(datadict) not in self.checker.checked_signatures:
+      try:
+        results = self.checker.Analyze(datadict)
+      except DESIGN_ERRORS:
+        return self.Reject(self.INVALID_DESIGN)
+      failures = [name for name, actual, desired in results
+                  if not actual >= desired]     # NaN fails
+      return failures and self.Reject(failures[0]) or None
+
+    try:
+      params = FloatParams(datadict)
+    except DESIGN_ERRORS:
+      return self.Reject(self.INVALID_DESIGN)
+    rejection = None
+    for analysis_class in self.order:
+      start = time.time()
+      try:
+        analysis = analysis_class(params, latex=False)
+      except DESIGN_ERRORS:
+        rejection = self.Reject(self.INVALID_DESIGN)
+        break
+      failed = not analysis.params.actual_fos >= analysis.desired_fos
+      stats = self.stats[analysis_class]
+      stats[0] += 1
+      stats[1] += failed
+      stats[2] += time.time() - start
+      if failed:
+        rejection = self.Reject(analysis.name)
+        break
+    self.order.sort(key=self.Priority)
+    return rejection
+
+  def Reject(self, rejection):
+    self.rejections[rejection] = self.rejections.get(rejection, 0) + 1
+    return rejection
+
+  def ScreenDesigns(self, designs):
+    """Returns the result of Screen for each of designs, in order."""
+    return [self.Screen(design) for design in designs]
+
+
+def RunAllAnalyses(config, latex=True):
+  """
+  Runs all the analyses on the design named in config, printing a summary
+  line for each, and writes the LaTeX report unless SaveLatexToFile is false.
+
+  Args:
+    config (dict) - as from ReadConfig
+    latex (bool) - if false, only compute the factors of safety: don't read
+      the PlansTextFile or build any LaTeX (and so don't save it either)
+  Returns: (latex source, or None if latex is false; list of the analyses)
+  """
   params = InputParams.FromFile(MakeAbsPath(config, 'DesignParamsFile'))
   all_analyses = []
-  latex_src = LatexHeader(config)
-  latex_src += str(params)
+  if latex:
+    latex_src = LatexHeader(config)
+    latex_src += str(params)
+  else:
+    latex_src = None
   
-  for analysis_class in (
-    SlidingAnalysis, OverturningAnalysis, BearingPressureAnalysis,
-    UltimateBearingCapacityAnalysis, RuptureAnalysis, PulloutOfBlockAnalysis,
-    PulloutOfSoilAnalysis,
-    ):
-    analysis = analysis_class(params)
+  for analysis in ANALYSIS_SCHEDULER.Run(params, latex):
     passed, msg = analysis.SafetyCheck()
-    latex_src += "\n%s" % analysis
+    if latex:
+      latex_src += "\n%s" % analysis
     if passed:
       print "%35s:  OK  (FOS: actual = %.2f, design = %s)" % (
         analysis.name, analysis.params.actual_fos, analysis.desired_fos)
@@ -1343,10 +2099,12 @@ def RunAllAnalyses(config):
       print "%35s: FAIL (FOS: actual = %.2f, design = %s)" % (
         analysis.name, analysis.params.actual_fos, analysis.desired_fos)
     #print "%s: %s\nMsg: %s\n" % (analysis.name, passed, msg)
-    if analysis_class in ():
+    if analysis.__class__ in ():
       print "Derived vars: %s" % analysis.params.Show()
     all_analyses.append(analysis)
 
+  if not latex:
+    return latex_src, all_analyses
   latex_src += LatexFooter(config)
   if config.get("SaveLatexToFile", True):
     if 'OutputLatexFile' not in config:
@@ -1380,6 +2138,7 @@ def MakeAbsPath(config, file_param_name):
 def Usage():
   return """
 Usage: %s config-file
+   or: %s --analysis-only config-file...
 
 config-file should be in standard Python syntax and should define the following
 variables:
@@ -1388,28 +2147,74 @@ variables:
    OutputLatexFile
 See the "sample-design" directory, included with this distribution, for
 details on syntax and individual parameters within those files.
-""" % sys.argv[1]
+
+With --analysis-only, only the factors of safety are computed, for each of
+the config files: no LaTeX is generated, and only DesignParamsFile is needed.
+The exit status is 1 if any design fails any analysis.
+
+To analyze many variations on a design, see "%s sweep --help".  To find the
+shortest geogrid (and smallest footing) that passes, see
+"%s optimize --help".  To estimate the probability of failure given uncertain
+soil parameters, see "%s reliability --help".  To see which parameters each
+factor of safety is most sensitive to, see "%s sensitivity --help".
+""" % ((sys.argv[0],) * 6)
 
 
 def ParseCommandLine():
-  if len(sys.argv) != 2 or not os.path.isfile(sys.argv[1]):
+  """Returns (true iff --analysis-only was given, list of configs)."""
+  try:
+    opts, args = getopt.getopt(sys.argv[1:], '', ['analysis-only'])
+  except getopt.GetoptError:
+    args = []
+  analysis_only = bool(args) and ('--analysis-only', '') in opts
+  if (not args or (len(args) > 1 and not analysis_only) or
+      [arg for arg in args if not os.path.isfile(arg)]):
     print Usage()
     sys.exit(1)
 
-  config_filename = sys.argv[1]
-  with open(config_filename) as f:
-    contents = f.read()
-    context = {}
-    exec(contents, context)
-    context['ConfigDir'] = os.path.dirname(config_filename)
-    del context['__builtins__']
-  for required_param in ('DesignParamsFile', 'PlansTextFile',
-                         'OutputLatexFile'):
+  if analysis_only:
+    return True, [ReadConfig(arg, ANALYSIS_ONLY_CONFIG_PARAMS)
+                  for arg in args]
+  return False, [ReadConfig(args[0])]
+
+
+# Variables which must be defined in a config file, to generate the LaTeX
+# output, and to run the analyses only.
+CONFIG_PARAMS = ('DesignParamsFile', 'PlansTextFile', 'OutputLatexFile')
+ANALYSIS_ONLY_CONFIG_PARAMS = ('DesignParamsFile',)
+
+def ReadConfig(config_filename, required_params=CONFIG_PARAMS):
+  """Returns the dictionary of variables defined in the given config file,
+  checking that it defines required_params."""
+  context = SOURCE_CACHE.Load(config_filename)
+  context['ConfigDir'] = os.path.dirname(config_filename)
+  for required_param in required_params:
     if required_param not in context:
       raise Error("Required parameter '%s' not supplied in %s" %
                   (required_param, config_filename))
   return context
 
 if __name__ == '__main__':
-  config = ParseCommandLine()
-  RunAllAnalyses(config)
+  if len(sys.argv) > 1 and sys.argv[1] == 'sweep':
+    import sweep
+    sys.exit(sweep.Main(sys.argv[1:]))
+  if len(sys.argv) > 1 and sys.argv[1] == 'optimize':
+    import optimize
+    sys.exit(optimize.Main(sys.argv[1:]))
+  if len(sys.argv) > 1 and sys.argv[1] == 'reliability':
+    import reliability
+    sys.exit(reliability.Main(sys.argv[1:]))
+  if len(sys.argv) > 1 and sys.argv[1] == 'sensitivity':
+    import sensitivity
+    sys.exit(sensitivity.Main(sys.argv[1:]))
+  analysis_only, configs = ParseCommandLine()
+  failed = False
+  for config in configs:
+    if len(configs) > 1:
+      print '%s:' % config['DesignParamsFile']
+    _, analyses = RunAllAnalyses(config, latex=not analysis_only)
+    for analysis in analyses:
+      failed = failed or not analysis.SafetyCheck()[0]
+  SOURCE_CACHE.Save()
+  if analysis_only and failed:
+    sys.exit(1)
@@ -0,0 +1,342 @@
+#!/usr/bin/python
+
+import math, os, shutil, sys, tempfile, unittest
+from cStringIO import StringIO
+import units, Wall
+from units import Degrees, Units
+
+SAMPLE_PARAMS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'sample-design', 'DesignParams-AllanBlock')
+
+def SampleParams():
+  context = {}
+  execfile(SAMPLE_PARAMS_FILE, context)
+  return context['params']
+
+
+class FastAnalyzerTest(unittest.TestCase):
+  def testMatchesFullUnitsAnalysis(self):
+    datadict = SampleParams()
+    params = Wall.InputParams(datadict)
+    expected = [float(cls(params).params.actual_fos)
+                for cls in Wall.ALL_ANALYSES]
+
+    analyzer = Wall.FastAnalyzer()
+    for i in range(2):     # first checked with units, then plain floats
+      results = analyzer.Analyze(datadict)
+      self.assertEqual(len(analyzer.checked_signatures), 1)
+      for (name, actual, desired), fos in zip(results, expected):
+        self.assertAlmostEqual(actual, fos)
+    self.assertEqual(results[0][0], 'Sliding Analysis')
+    self.assertEqual(results[0][2], 1.5)
+
+  def testNewUnitsAreChecked(self):
+    analyzer = Wall.FastAnalyzer()
+    datadict = SampleParams()
+    analyzer.Analyze(datadict)
+    datadict['q'] = Units('250 lb/ft')    # wrong dimensions for a pressure
+    self.assertRaises(units.Error, analyzer.Analyze, datadict)
+
+
+class AnalysisSchedulerTest(unittest.TestCase):
+  def testSharedIntermediates(self):
+    scheduler = Wall.AnalysisScheduler()
+    self.assertEqual(
+      scheduler.sources,
+      {Wall.UltimateBearingCapacityAnalysis: (
+          Wall.BearingPressureAnalysis,
+          len(Wall.BearingPressureAnalysis.FORMULAS))})
+    params = Wall.InputParams(SampleParams())
+    analyses = scheduler.Run(params)
+    bearing, ultimate = analyses[2:4]
+    self.assertTrue(ultimate.params.sigma_max is bearing.params.sigma_max)
+    fresh = Wall.InputParams(SampleParams())
+    for analysis, cls in zip(analyses, Wall.ALL_ANALYSES):
+      self.assertTrue(isinstance(analysis, cls))
+      self.assertEqual(str(analysis), str(cls(fresh)))
+
+  def testAnalyzeDesignsInParallel(self):
+    designs = []
+    for L_g in (5.0, 6.0, 7.0):
+      design = SampleParams()
+      design['L_g'] = Units('%f ft' % L_g)
+      designs.append(design)
+    expected = [Wall.FastAnalyzer().Analyze(design) for design in designs]
+    invalid = SampleParams()
+    invalid['i'] = Degrees(35.0)     # steeper than phi
+    designs.insert(1, invalid)
+    expected.insert(1, None)
+    results, errors = Wall.AnalyzeDesignsInParallel(designs)
+    self.assertEqual(results, expected)
+    self.assertEqual(errors.keys(), [1])
+    self.assertTrue(errors[1].startswith('ValueError: '))
+    min_designs, Wall.PARALLEL_MIN_DESIGNS = Wall.PARALLEL_MIN_DESIGNS, 2
+    try:
+      self.assertEqual(Wall.AnalyzeDesignsInParallel(designs, processes=2),
+                       (results, errors))
+    finally:
+      Wall.PARALLEL_MIN_DESIGNS = min_designs
+
+
+class ScreenerTest(unittest.TestCase):
+  def testAgreesWithFastAnalyzer(self):
+    designs = []
+    for L_g in (4.0, 5.0, 6.0, 7.0):
+      for q in (0.0, 250.0, 500.0):
+        design = SampleParams()
+        design['L_g'] = Units('%f ft' % L_g)
+        design['q'] = Units('%f lb/ft^2' % q)
+        designs.append(design)
+    invalid = SampleParams()
+    invalid['H'] = Units('9 ft')
+    designs.append(invalid)
+
+    screener = Wall.Screener()
+    rejections = screener.ScreenDesigns(designs + designs)
+    self.assertEqual(rejections[-1], Wall.Screener.INVALID_DESIGN)
+    analyzer = Wall.FastAnalyzer()
+    for design, rejection in zip(designs + designs, rejections):
+      if rejection == Wall.Screener.INVALID_DESIGN:
+        continue
+      failures = [name for name, actual, desired in analyzer.Analyze(design)
+                  if actual < desired]
+      if rejection is None:
+        self.assertEqual(failures, [])
+      else:
+        self.assertTrue(rejection in failures)
+    self.assertTrue(None in rejections)
+    self.assertEqual(sum(screener.rejections.values()),
+                     len(rejections) - rejections.count(None))
+    self.assertEqual(sorted(screener.order), sorted(Wall.ALL_ANALYSES))
+
+  def testNumericalFailureIsInvalid(self):
+    bad = SampleParams()
+    bad['i'] = Degrees(35.0)     # steeper than phi
+    screener = Wall.Screener()
+    self.assertEqual(screener.ScreenDesigns([bad, SampleParams(), bad]),
+                     [Wall.Screener.INVALID_DESIGN, None,
+                      Wall.Screener.INVALID_DESIGN])
+
+
+class ParamsOverlayTest(unittest.TestCase):
+  def testAnalysesShareParams(self):
+    params = Wall.InputParams(SampleParams())
+    names = set(params.AsDict())
+    analyses = [cls(params) for cls in Wall.ALL_ANALYSES]
+    for analysis in analyses:
+      str(analysis)
+      self.assertTrue(analysis.params._base is params)
+    self.assertEqual(set(params.AsDict()), names)   # base left unchanged
+    self.assertNotEqual(analyses[0].params.actual_fos,
+                        analyses[1].params.actual_fos)
+
+  def testOverlay(self):
+    params = Wall.InputParams(SampleParams())
+    overlay = Wall.ParamsOverlay(params)
+    overlay['H'] = Units('1 ft')
+    overlay.update({'extra': 1})
+    self.assertEqual('%(H)s %(D)s %(extra)s' % overlay,
+                     '%s %s 1' % (Units('1 ft'), params.D))
+    self.assertNotEqual(params.H.magnitude, 1.0)
+    self.assertEqual(overlay.AsDict()['extra'], 1)
+    self.assertRaises(KeyError, lambda: '%(nonesuch)s' % overlay)
+
+  def testOverlaidBaseIsReadOnly(self):
+    params = Wall.InputParams(SampleParams())
+    params.extra = 1
+    Wall.ParamsOverlay(params)
+    self.assertRaises(Wall.Error, setattr, params, 'q', Units('1 lb/ft^2'))
+    params.update({'q': Units('1 lb/ft^2')})
+    self.assertEqual(params.q.magnitude, 1.0)
+    self.assertFalse('_overlaid' in params.AsDict())
+
+
+class IncrementalRecomputeTest(unittest.TestCase):
+  def testUpdateRecomputesDownstreamOnly(self):
+    params = Wall.InputParams(SampleParams())
+    analyses = [cls(params) for cls in Wall.ALL_ANALYSES]
+    str(params)       # uses all the derived params
+    q = Units('400 lb/ft^2', ndigits=0)
+    recomputed = params.update({'q': q})
+    # (x_F_total and y_F_total depend on q too, but nothing uses them, so
+    # they have never been computed.)
+    self.assertEqual(recomputed, ['F_qh', 'F_qv', 'V_t'])
+    for analysis in analyses:
+      self.assertTrue(analysis.Recompute(['q'] + recomputed))
+
+    datadict = SampleParams()
+    datadict['q'] = q
+    fresh = Wall.InputParams(datadict)
+    self.assertEqual(str(params), str(fresh))
+    for analysis, cls in zip(analyses, Wall.ALL_ANALYSES):
+      self.assertEqual(str(analysis), str(cls(fresh)))
+
+  def testUpdateIgnoresOtherInstances(self):
+    # Another InputParams computes every derived param (so the graph knows
+    # all their dependencies); this one has only computed a few.
+    str(Wall.InputParams(SampleParams()))
+    params = Wall.InputParams(SampleParams())
+    params.F_qh
+    self.assertEqual(params.update({'q': Units('400 lb/ft^2')}), ['F_qh'])
+    self.assertEqual(params.update({'q': Units('300 lb/ft^2')}), [])
+
+  def testFailedUpdateLeavesParamsUnchanged(self):
+    params = Wall.InputParams(SampleParams())
+    before = str(params)
+    H, n_courses = params.H, params.n_courses
+    self.assertRaises(Wall.Error, params.update,
+                      {'H': Units('9.6 ft'), 'extra': 1})
+    self.assertTrue(params.H is H)
+    self.assertEqual(params.n_courses, n_courses)
+    self.assertFalse('extra' in params.__dict__)
+    self.assertEqual(str(params), before)
+
+  def testUnaffectedAnalysesAreSkipped(self):
+    params = Wall.InputParams(SampleParams())
+    sliding = Wall.SlidingAnalysis(params)
+    rupture = Wall.RuptureAnalysis(params)
+    self.assertEqual(params.update({'FOS_sliding': 2.0}), [])
+    self.assertEqual(rupture.Recompute(['FOS_sliding']), [])
+    self.assertEqual(sliding.Recompute(['FOS_sliding']),
+                     ['actual_fos', 'desired_fos', 'fos_box'])
+    self.assertEqual(sliding.desired_fos, 2.0)
+
+  def testSanityCheckIsRerun(self):
+    params = Wall.InputParams(SampleParams())
+    params.X_batt, params.L_t
+    self.assertRaises(Wall.Error, params.update, {'H': Units('3 ft')})
+    recomputed = params.update({'H': 14 * params.block_height})
+    self.assertEqual(recomputed[0], 'n_courses')
+    self.assertEqual(params.n_courses, 14)
+    self.assertTrue('X_batt' in recomputed and 'L_t' not in recomputed)
+
+
+class GridLayerCacheTest(unittest.TestCase):
+  def testLayersComputedOnce(self):
+    params = Wall.InputParams(SampleParams())
+    analysis = Wall.PulloutOfSoilAnalysis(params)
+    calls = []
+    def LayerValues(i):
+      calls.append(i)
+      return Wall.PulloutOfSoilAnalysis.LayerValues(analysis, i)
+    analysis.LayerValues = LayerValues
+    analysis.SafetyCheck()
+    tex = str(analysis)
+    self.assertEqual(calls, [])
+    self.assertFalse('P_avg' in analysis.params.__dict__)    # not mutated
+
+    params.update({'L_g': Units('7 ft')})
+    analysis.Recompute(['L_g'])
+    self.assertEqual(calls, range(len(params.geogrid_levels)))
+    self.assertNotEqual(str(analysis), tex)
+    self.assertEqual(len(calls), len(params.geogrid_levels))
+
+
+class LazyDerivedParamsTest(unittest.TestCase):
+  def testDerivedParamsComputedOnDemand(self):
+    params = Wall.InputParams(SampleParams())
+    self.assertFalse('W_w' in params.__dict__)
+    Wall.SlidingAnalysis(params)
+    self.assertTrue('W_w' in params.__dict__)
+    self.assertFalse('V_t' in params.__dict__)
+    self.assertFalse('x_F_total' in params.__dict__)
+    self.assertFalse('ordinal_geogrid_levels_str' in params.__dict__)
+
+    eager = params.DerivedData()
+    self.assertEqual(str(params['x_F_total']), str(eager['x_F_total']))
+    self.assertEqual('%(ordinal_geogrid_levels_str)s' % params,
+                     '1st, 3rd, 5th, 7th, 9th, 11th, 13th')
+    self.assertRaises(AttributeError, getattr, params, 'nonesuch')
+
+
+class CoulombKTest(unittest.TestCase):
+  def testCachedAndVectorized(self):
+    Wall.COULOMB_K_CACHE.Clear()
+    beta, phi = Degrees(78.0), Degrees(27.0)
+    k = Wall.CoulombK(beta, phi, 0.66 * phi, Degrees(0.0))
+    self.assertAlmostEqual(k, 0.2563, 4)    # K_ar in the sample design
+    radians = [math.radians(a) for a in (78.0, 27.0, 0.66 * 27.0, 0.0)]
+    self.assertAlmostEqual(Wall.CoulombK(*radians), k, 12)
+    self.assertEqual(Wall.CoulombKStats()['hits'], 1)
+    self.assertEqual(Wall.CoulombKStats()['misses'], 1)
+
+    if units.numpy is not None:
+      ks = Wall.CoulombKArray(units.DegreesArray([78.0, 90.0]),
+                              radians[1], radians[2], 0.0)
+      self.assertAlmostEqual(ks[0], k, 9)     # unquantized
+      self.assertAlmostEqual(ks[1], Wall.CoulombK(Degrees(90.0), phi,
+                                                  0.66 * phi, Degrees(0.0)))
+
+
+class SourceCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.source = os.path.join(self.tempdir, 'params')
+    self.cache_file = os.path.join(self.tempdir, 'cache')
+    self.Write("from units import Units\nparams = {'H': Units('9 ft')}\n")
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def Write(self, contents):
+    with open(self.source, 'w') as f:
+      f.write(contents)
+
+  def testLoadedOncePerProcess(self):
+    cache = Wall.SourceCache()
+    self.assertEqual(str(cache.Load(self.source)['params']['H']),
+                     str(Units('9 ft')))
+    cache.Load(self.source)
+    self.assertEqual(cache.executions, 1)
+    self.Write("x = 1\n")
+    self.assertEqual(cache.Load(self.source), {'x': 1})
+    self.assertEqual(cache.executions, 2)
+
+  def testPersistence(self):
+    cache = Wall.SourceCache(self.cache_file)
+    cache.Load(self.source)
+    cache.Save()
+    cache = Wall.SourceCache(self.cache_file)
+    params = cache.Load(self.source)['params']
+    self.assertEqual(cache.executions, 0)
+    self.assertTrue(params['H'].dim is Units('1 ft').dim)
+
+    # a module can't be pickled, so this is run again from the saved code
+    self.Write("import time\nx = 1\n")
+    cache.Load(self.source)
+    cache.Save()
+    cache = Wall.SourceCache(self.cache_file)
+    self.assertEqual(cache.Load(self.source)['x'], 1)
+    self.assertEqual(cache.executions, 1)
+
+
+class AnalysisOnlyTest(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.mkdtemp()
+    self.config_file = os.path.join(self.tempdir, 'config')
+    with open(self.config_file, 'w') as f:
+      f.write('DesignParamsFile = %r\n' % SAMPLE_PARAMS_FILE)
+
+  def tearDown(self):
+    shutil.rmtree(self.tempdir)
+
+  def testNoLatex(self):
+    self.assertRaises(Wall.Error, Wall.ReadConfig, self.config_file)
+    config = Wall.ReadConfig(self.config_file,
+                             Wall.ANALYSIS_ONLY_CONFIG_PARAMS)
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+      latex_src, analyses = Wall.RunAllAnalyses(config, latex=False)
+    finally:
+      sys.stdout = stdout
+    self.assertEqual(latex_src, None)
+    self.assertEqual(os.listdir(self.tempdir), ['config'])
+    params = Wall.InputParams(SampleParams())
+    for analysis, cls in zip(analyses, Wall.ALL_ANALYSES):
+      self.assertFalse('fos_box' in analysis.params.__dict__)
+      self.assertEqual(str(analysis.params.actual_fos),
+                       str(cls(params).params.actual_fos))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+
+"""
+Vectorized analysis of many designs at once.  A batch of N designs is stored
+as columns: each parameter is either a single number (if it is the same for
+every design) or a numpy array with one value per design.  The derived
+parameters and failure analyses in Wall.py are then computed as array
+expressions, by the same formulas that compute them for a single design.
+
+Like FloatParams, a batch holds bare magnitudes (in canonical units, with
+angles in radians), so units are checked separately, on one design per
+UnitsSignature; see AnalyzeDesigns.
+"""
+
+import units, Wall
+from units import NormalizeParams, numpy
+
+
+class BatchParams(Wall.FloatParams):
+  """
+  FloatParams for a batch of designs, stored as columns (see above).  All the
+  designs in a batch must have the same geogrid_levels.
+  """
+  def __init__(self, columns, n_designs):
+    """
+    columns (dict) - parameter name -> number, or array of n_designs numbers
+    n_designs (int) - the number of designs in the batch
+    """
+    if numpy is None:
+      raise Wall.Error("BatchParams requires numpy")
+    self.n_designs = n_designs
+    Wall.InputParams.__init__(self, columns)
+
+  def ParamsSanityCheck(self):
+    errors = []
+    courses = numpy.asarray(0.5 + self.H / self.block_height)
+    n_courses = numpy.floor(courses).astype(int)
+    discrepency = abs(n_courses * self.block_height - self.H)
+    bad_designs = numpy.flatnonzero(
+      numpy.broadcast_to(discrepency > 1e-5, (self.n_designs,)))
+    if len(bad_designs) and self.n_designs == 1:
+      errors.append(' * wall height not an integer multiple of block height')
+    elif len(bad_designs):
+      errors.append(' * wall height not an integer multiple of block height '
+                    'in designs %s' % list(bad_designs[:10]))
+    self.__dict__['n_courses'] = n_courses
+    if max(self.geogrid_levels) > n_courses.min():
+      errors.append(' * some geogrid levels (%s) outside all courses '
+                    ' of blocks (%s)' % (self.geogrid_levels, n_courses.min()))
+    if errors:
+      raise Wall.Error('Param sanity check failed:\n%s' % '\n'.join(errors))
+
+  @staticmethod
+  def FromDesigns(designs):
+    """Returns a BatchParams for a list of datadicts, as for InputParams."""
+    stripped = [Wall.StripUnits(NormalizeParams(d)) for d in designs]
+    columns = {}
+    for name in stripped[0]:
+      values = [d[name] for d in stripped]
+      first = values[0]
+      if [v for v in values if v != first]:
+        if not isinstance(first, (int, long, float)):
+          raise Wall.Error('Designs in a batch must have the same %s' % name)
+        columns[name] = numpy.array(values, dtype=float)
+      else:
+        columns[name] = first
+    return BatchParams(columns, len(designs))
+
+  @staticmethod
+  def FromColumns(datadict, columns):
+    """
+    Args:
+      datadict (dict) - a base design, as for InputParams
+      columns (dict) - parameter name -> UnitsArray or DegreesArray (or numpy
+        array of bare magnitudes in canonical units and radians), overriding
+        the base design's values
+    Returns: a BatchParams of the base design with each set of values from
+      columns
+    """
+    base = Wall.StripUnits(NormalizeParams(datadict))
+    n_designs = None
+    for name, column in columns.items():
+      if isinstance(column, units.DegreesArray):
+        column = column.radians()
+      elif isinstance(column, units.UnitsArray):
+        column = units.Normalize(column)
+        expected = units.Normalize(datadict[name])
+        if column.dim is not expected.dim:
+          raise units.Error('Column %s has different units from the base '
+                            'design (%s)' % (name, expected))
+        column = column.magnitude
+      else:
+        column = numpy.asarray(column, dtype=float)
+      if n_designs not in (None, len(column)):
+        raise Wall.Error('Columns must all have the same length')
+      n_designs = len(column)
+      base[name] = column
+    return BatchParams(base, n_designs)
+
+
+def Analyze(params, analysis_classes=Wall.ALL_ANALYSES):
+  """
+  Args:
+    params (BatchParams) - the batch of designs
+    analysis_classes - FailureAnalysis subclasses to run
+  Returns: list of (analysis name, array of actual FOS, desired FOS) tuples,
+    one per analysis class; the FOS arrays have one value per design
+  """
+  results = []
+  for analysis in Wall.AnalysisScheduler(analysis_classes).Run(params,
+                                                               latex=False):
+    actual = numpy.zeros(params.n_designs) + analysis.params.actual_fos
+    results.append((analysis.name, actual, analysis.desired_fos))
+  return results
+
+
+def AnalyzeDesigns(designs, analysis_classes=Wall.ALL_ANALYSES):
+  """
+  Vectorized equivalent of FastAnalyzer.Analyze on each of designs.  The
+  designs are grouped into batches by geogrid_levels, and the units of one
+  design of each UnitsSignature are checked with a FastAnalyzer.  A design
+  that can't be analyzed (bad units, a failed sanity check, or parameters
+  that can't share a batch) doesn't stop the others: it is analyzed on its
+  own, and if that fails, its error is reported and its FOS are NaN.  A
+  design with any FOS that isn't finite is reported too.
+  Args:
+    designs (list) - datadicts, as for InputParams
+    analysis_classes - FailureAnalysis subclasses to run
+  Returns: (results, errors) where results is a list of (analysis name, array
+    of actual FOS, array of desired FOS) tuples, one per analysis class, with
+    one value per design, in order (empty if no design could be analyzed),
+    and errors maps the index of each design that couldn't be analyzed, or
+    has a FOS that isn't finite, to its error message
+  """
+  checker = Wall.FastAnalyzer(analysis_classes)
+  groups = {}
+  errors = {}
+  for index, design in enumerate(designs):
+    signature = Wall.UnitsSignature(design)
+    try:
+      if signature not in checker.checked_signatures:
+        checker.Analyze(design)
+    except Wall.DESIGN_ERRORS, e:
+      errors[index] = Wall.ErrorMessage(e)
+      continue
+    groups.setdefault(tuple(design['geogrid_levels']), []).append(index)
+
+  def AnalyzeBatch(indices):
+    # Numerical failures come out as NaN, and are reported below
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+      return Analyze(BatchParams.FromDesigns([designs[i] for i in indices]),
+                     analysis_classes)
+
+  batches = []
+  for indices in groups.values():
+    try:
+      batches.append((indices, AnalyzeBatch(indices)))
+    except Wall.DESIGN_ERRORS:
+      for index in indices:
+        try:
+          batches.append(([index], AnalyzeBatch([index])))
+        except Wall.DESIGN_ERRORS, e:
+          errors[index] = Wall.ErrorMessage(e)
+
+  results = []
+  if batches:
+    results = [(name, numpy.empty(len(designs)), numpy.empty(len(designs)))
+               for name, _, _ in batches[0][1]]
+    for _, actual, desired in results:
+      actual[errors.keys()] = desired[errors.keys()] = numpy.nan
+  for indices, batch_results in batches:
+    for (_, actual, desired), (_, batch_actual, batch_desired) in zip(
+        results, batch_results):
+      actual[indices] = batch_actual
+      desired[indices] = batch_desired
+  for name, actual, _ in results:
+    for index in numpy.flatnonzero(~numpy.isfinite(actual)):
+      errors.setdefault(int(index), '%s: FOS is %s' % (name, actual[index]))
+  return results, errors
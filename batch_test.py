@@ -0,0 +1,91 @@
+#!/usr/bin/python
+
+import unittest
+import units, Wall
+from units import Degrees, Units
+from Wall_test import SampleParams
+
+if units.numpy is not None:
+  import batch
+  from units import numpy
+  from bench import SyntheticDesigns
+
+
+@unittest.skipIf(units.numpy is None, 'numpy not installed')
+class BatchTest(unittest.TestCase):
+  def assertMatchesScalar(self, designs, results):
+    analyzer = Wall.FastAnalyzer()
+    for i, design in enumerate(designs):
+      for (name, actual, desired), (_, expected, _) in zip(
+          results, analyzer.Analyze(design)):
+        self.assertAlmostEqual(actual[i] / expected, 1.0, 8)
+
+  def testMatchesScalarAnalyses(self):
+    designs = SyntheticDesigns(20)
+    for design in designs[::3]:
+      design['geogrid_levels'] = [1, 4, 7, 10, 13]
+    results, errors = batch.AnalyzeDesigns(designs)
+    self.assertEqual(errors, {})
+    self.assertEqual([r[0] for r in results],
+                     [cls(Wall.InputParams(designs[0])).name
+                      for cls in Wall.ALL_ANALYSES])
+    self.assertMatchesScalar(designs, results)
+
+  def testPerDesignDesiredAndErrors(self):
+    designs = SyntheticDesigns(6)
+    for design in designs:
+      design['geogrid_levels'] = [1, 4, 7, 10, 13]
+    designs[1]['FOS_sliding'] = 2.0
+    designs[2]['H'] = Units('9 ft')
+    designs[4]['L_g'] = Units('3 lb')
+    results, errors = batch.AnalyzeDesigns(designs)
+    self.assertEqual(sorted(errors), [2, 4])
+    self.assertTrue('integer multiple' in errors[2])
+    self.assertEqual(list(results[0][2][[0, 1, 3]]), [1.5, 2.0, 1.5])
+    for _, actual, desired in results:
+      self.assertTrue(numpy.isnan(actual[2]) and numpy.isnan(desired[4]))
+    good = [0, 1, 3, 5]
+    self.assertMatchesScalar([designs[i] for i in good],
+                             [(name, actual[good], desired[good])
+                              for name, actual, desired in results])
+
+  def testNumericalFailuresAreReported(self):
+    # A backfill slope steeper than phi fails whichever design comes first
+    ok, bad = SampleParams(), SampleParams()
+    bad['i'] = Degrees(35.0)
+    for designs, index in (([ok, bad], 1), ([bad, ok], 0)):
+      results, errors = batch.AnalyzeDesigns(designs)
+      self.assertEqual(errors.keys(), [index])
+      for _, actual, _ in results:
+        self.assertTrue(numpy.isfinite(actual[1 - index]))
+
+  def testErrorNamesNoBatchIndex(self):
+    bad = SampleParams()
+    bad['H'] = Units('9 ft')
+    results, errors = batch.AnalyzeDesigns([SampleParams(), bad])
+    self.assertTrue(errors[1].endswith('multiple of block height'), errors)
+
+  def testFromColumns(self):
+    L_g = units.UnitsArray([1.5, 2.0, 2.5], 'm')
+    beta = units.DegreesArray([78.0, 80.0, 90.0])
+    params = batch.BatchParams.FromColumns(SampleParams(),
+                                           {'L_g': L_g, 'beta': beta})
+    results = batch.Analyze(params)
+    designs = []
+    for i in range(3):
+      design = SampleParams()
+      design['L_g'], design['beta'] = L_g[i], beta[i]
+      designs.append(design)
+    self.assertMatchesScalar(designs, results)
+
+    self.assertRaises(units.Error, batch.BatchParams.FromColumns,
+                      SampleParams(), {'L_g': units.UnitsArray([1.0], 'lb')})
+
+  def testSanityCheck(self):
+    H = units.UnitsArray([9.525, 9.0], 'ft')
+    self.assertRaises(Wall.Error, batch.BatchParams.FromColumns,
+                      SampleParams(), {'H': H})
+
+
+if __name__ == '__main__':
+  unittest.main()
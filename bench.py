@@ -0,0 +1,248 @@
+#!/usr/bin/python
+
+"""
+Benchmark suite for units.py and Wall.py.  Times Units parsing, arithmetic and
+formatting, loading a design file and computing its derived parameters, each
+failure analysis, a full RunAllAnalyses on sample-design, its sensitivity
+analysis, and a sweep of synthetic designs, through FastAnalyzer and (if
+numpy is installed) the vectorized batch engine.
+
+Results (microseconds per operation) are compared against a stored baseline,
+and any benchmark slower than the baseline by more than the threshold is
+reported as a regression.  Timings depend on the machine, so re-save the
+baseline (--save) when moving to a new one.
+
+Usage: bench.py [--save] [--baseline=FILE] [--threshold=PERCENT]
+                [--designs=N] [--filter=REGEX]
+"""
+
+import getopt, json, os, platform, random, re, sys, timeit
+from cStringIO import StringIO
+
+import batch, sensitivity, units, Wall
+from units import Degrees, Units
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_CONFIG_FILE = os.path.join(BENCH_DIR, 'sample-design', 'config')
+DEFAULT_BASELINE_FILE = os.path.join(BENCH_DIR, 'bench_baseline.json')
+DEFAULT_THRESHOLD = 20.0        # percent
+DEFAULT_SWEEP_DESIGNS = 10000
+MIN_SECONDS = 0.2               # run each benchmark at least this long
+
+
+def SampleConfig():
+  config = Wall.ReadConfig(SAMPLE_CONFIG_FILE)
+  config['SaveLatexToFile'] = False
+  return config
+
+def SampleParamsFile():
+  return Wall.MakeAbsPath(SampleConfig(), 'DesignParamsFile')
+
+def SampleParams():
+  context = {}
+  execfile(SampleParamsFile(), context)
+  return context['params']
+
+def SyntheticDesigns(n, seed=0):
+  """Returns n variations on the sample design, with randomly chosen geogrid
+  length, surcharge, and retained soil properties."""
+  rng = random.Random(seed)
+  sample = SampleParams()
+  designs = []
+  for i in range(n):
+    design = dict(sample)
+    design['L_g'] = Units('%f ft' % rng.uniform(4.0, 10.0))
+    design['q'] = Units('%f lb/ft^2' % rng.uniform(0.0, 500.0))
+    design['gamma_r'] = Units('%f lb/ft^3' % rng.uniform(100.0, 130.0))
+    design['phi_r'] = Degrees(rng.uniform(24.0, 34.0))
+    designs.append(design)
+  return designs
+
+
+# Each benchmark setup function returns (function to time, number of
+# operations per call); setup itself is not timed.
+
+def ParseBenchmark():
+  def Parse():
+    units.PARSE_CACHE.Clear()
+    Units('120.0 lb / ft^3')
+  return Parse, 1
+
+def ArithmeticBenchmark():
+  W_s, L_t, X_batt = Units('6330 lb/ft'), Units('6.13 ft'), Units('2.02 ft')
+  return lambda: W_s * (0.5 * (L_t - X_batt) + X_batt) / L_t, 1
+
+def FormatBenchmark():
+  u = Units('1.5 lb/ft^2', ndigits=2)
+  def Format():
+    u.magnitude += 1.0      # defeat the rendering cache
+    str(u)
+  return Format, 1
+
+def LoadBenchmark():
+  filename = SampleParamsFile()
+  return lambda: Wall.InputParams.FromFile(filename), 1
+
+def DerivedDataBenchmark():
+  params = Wall.InputParams(SampleParams())
+  return params.DerivedData, 1
+
+def AnalysisBenchmark(analysis_class):
+  def Setup():
+    params = Wall.InputParams(SampleParams())
+    def Analyze():
+      analysis = analysis_class(params)
+      analysis.SafetyCheck()
+      str(analysis)
+    return Analyze, 1
+  return Setup
+
+def RunAllAnalysesBenchmark():
+  config = SampleConfig()
+  def RunAll():
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+      Wall.RunAllAnalyses(config)
+    finally:
+      sys.stdout = stdout
+  return RunAll, 1
+
+def AnalysisOnlyBenchmark():
+  config = SampleConfig()
+  def RunAll():
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+      Wall.RunAllAnalyses(config, latex=False)
+    finally:
+      sys.stdout = stdout
+  return RunAll, 1
+
+def SensitivityBenchmark():
+  params = SampleParams()
+  return lambda: sensitivity.Sensitivities(params), 1
+
+def SweepBenchmark(n_designs):
+  def Setup():
+    designs = SyntheticDesigns(n_designs)
+    def Sweep():
+      analyzer = Wall.FastAnalyzer()
+      for design in designs:
+        analyzer.Analyze(design)
+    return Sweep, n_designs
+  return Setup
+
+def BatchSweepBenchmark(n_designs):
+  def Setup():
+    designs = SyntheticDesigns(n_designs)
+    return lambda: batch.AnalyzeDesigns(designs), n_designs
+  return Setup
+
+def Benchmarks(n_designs=DEFAULT_SWEEP_DESIGNS):
+  """Returns a list of (name, setup function)."""
+  benchmarks = ([('units.parse', ParseBenchmark),
+                 ('units.arithmetic', ArithmeticBenchmark),
+                 ('units.format', FormatBenchmark),
+                 ('params.FromFile', LoadBenchmark),
+                 ('params.DerivedData', DerivedDataBenchmark)] +
+                [('analysis.%s' % cls.__name__, AnalysisBenchmark(cls))
+                 for cls in Wall.ALL_ANALYSES] +
+                [('RunAllAnalyses', RunAllAnalysesBenchmark),
+                 ('RunAllAnalyses.analysis_only', AnalysisOnlyBenchmark),
+                 ('sensitivity', SensitivityBenchmark),
+                 ('sweep.FastAnalyzer', SweepBenchmark(n_designs))])
+  if units.numpy is not None:
+    benchmarks.append(('sweep.batch', BatchSweepBenchmark(n_designs)))
+  return benchmarks
+
+
+def TimeFunction(func, ops):
+  """Returns the microseconds per operation for func, taking the best of
+  three runs, each long enough to last at least MIN_SECONDS."""
+  number = 1
+  while True:
+    seconds = timeit.timeit(func, number=number)
+    if seconds >= MIN_SECONDS:
+      break
+    number *= 2
+  seconds = min([seconds] + timeit.repeat(func, number=number, repeat=2))
+  return 1e6 * seconds / (number * ops)
+
+def RunBenchmarks(benchmarks, name_filter=None):
+  """Returns a dict mapping benchmark name to microseconds per operation."""
+  results = {}
+  for name, setup in benchmarks:
+    if name_filter and not re.search(name_filter, name):
+      continue
+    func, ops = setup()
+    results[name] = TimeFunction(func, ops)
+  return results
+
+
+def LoadBaseline(filename):
+  if not os.path.exists(filename):
+    return {}
+  with open(filename) as f:
+    return json.load(f)['results']
+
+def SaveBaseline(filename, results):
+  with open(filename, 'w') as f:
+    json.dump({'python': platform.python_version(),
+               'machine': platform.machine(),
+               'results': results}, f, indent=2, sort_keys=True)
+    f.write('\n')
+
+def Compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+  """
+  Args:
+    results, baseline (dict) - benchmark name -> microseconds per operation
+    threshold (float) - percent slowdown beyond which to flag a regression
+  Returns: a list of (name, usec, baseline usec or None, percent change or
+    None, is_regression), sorted by name
+  """
+  report = []
+  for name in sorted(results):
+    usec, base = results[name], baseline.get(name)
+    if base:
+      change = 100.0 * (usec - base) / base
+      report.append((name, usec, base, change, change > threshold))
+    else:
+      report.append((name, usec, None, None, False))
+  return report
+
+def FormatReport(report):
+  lines = ['%-40s %12s %12s %9s' % ('benchmark', 'usec/op', 'baseline',
+                                      'change')]
+  for name, usec, base, change, regression in report:
+    if base is None:
+      lines.append('%-40s %12.2f %12s %9s' % (name, usec, '-', 'new'))
+    else:
+      lines.append('%-40s %12.2f %12.2f %+8.1f%%%s' % (
+        name, usec, base, change, regression and '  REGRESSION' or ''))
+  return '\n'.join(lines)
+
+
+def Main(argv):
+  opts, args = getopt.getopt(argv[1:], '', ['save', 'baseline=', 'threshold=',
+                                            'designs=', 'filter='])
+  opts = dict(opts)
+  baseline_file = opts.get('--baseline', DEFAULT_BASELINE_FILE)
+  threshold = float(opts.get('--threshold', DEFAULT_THRESHOLD))
+  n_designs = int(opts.get('--designs', DEFAULT_SWEEP_DESIGNS))
+
+  results = RunBenchmarks(Benchmarks(n_designs), opts.get('--filter'))
+  report = Compare(results, LoadBaseline(baseline_file), threshold)
+  print FormatReport(report)
+  if '--save' in opts:
+    SaveBaseline(baseline_file, results)
+    print 'Baseline saved to %s' % baseline_file
+    return 0
+  regressions = [r[0] for r in report if r[4]]
+  if regressions:
+    print '\n%d regression(s) beyond %g%%: %s' % (
+      len(regressions), threshold, ', '.join(regressions))
+    return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(Main(sys.argv))
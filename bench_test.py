@@ -0,0 +1,30 @@
+#!/usr/bin/python
+
+import unittest
+import bench
+
+
+class CompareTest(unittest.TestCase):
+  def testRegressionsAreFlagged(self):
+    baseline = {'fast': 10.0, 'slow': 10.0, 'removed': 5.0}
+    results = {'fast': 9.0, 'slow': 13.0, 'added': 1.0}
+    report = bench.Compare(results, baseline, threshold=20.0)
+    self.assertEqual([r[0] for r in report], ['added', 'fast', 'slow'])
+    self.assertEqual(report[0], ('added', 1.0, None, None, False))
+    self.assertFalse(report[1][4])
+    self.assertAlmostEqual(report[2][3], 30.0)
+    self.assertTrue(report[2][4])
+    self.assertTrue('REGRESSION' in bench.FormatReport(report).split('\n')[3])
+
+  def testSyntheticDesignsAnalyze(self):
+    designs = bench.SyntheticDesigns(3)
+    self.assertEqual(len(designs), 3)
+    self.assertNotEqual(designs[0]['L_g'].magnitude,
+                        designs[1]['L_g'].magnitude)
+    analyzer = bench.Wall.FastAnalyzer()
+    for design in designs:
+      self.assertEqual(len(analyzer.Analyze(design)), 7)
+
+
+if __name__ == '__main__':
+  unittest.main()
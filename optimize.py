@@ -0,0 +1,455 @@
+#!/usr/bin/python
+
+"""
+Design optimizer: finds the smallest value of a design dimension -- by default
+the geogrid length L_g, then the footing width B_b and the embedment depth D
+-- for which a design passes every failure analysis.
+
+The factors of safety that depend on these dimensions never decrease as they
+grow, so the minimum passing value can be found by bisection, in about
+log2((hi - lo) / step) analyses instead of one per step.  Only the analyses
+that depend on the dimension are rerun at each step; the others are checked
+once, since no value of the dimension can change their outcome.
+
+Usage: optimize.py [--step=X] design-params-file [name[=lo:hi]]...
+       optimize.py --layout design-params-file
+       optimize.py [--step=X] --combinations design-params-file
+   or: Wall.py optimize [options] ...
+
+Each name is a parameter to minimize, in turn, holding the others at their
+best values so far.  lo and hi optionally bound the search; by default it
+starts at one step (or the param's smallest allowed value, e.g. 2 ft for the
+footing width B_b), and goes up from the base design's value until the design
+passes.  Values are in the units the base design uses for that parameter, and
+are found to the nearest multiple of step (default 0.01).
+
+With --layout, finds the geogrid layout with the fewest layers that passes
+the grid analyses instead (see LayoutSearch).
+
+With --combinations, finds the shortest geogrid length L_g for each
+combination of the blocks and geogrids declared in the design file, and
+lists the combinations lightest first.  Each is a dict of the params it
+overrides, e.g.
+
+  blocks = {
+    'AB Stones' : {'block_depth': Units('0.97 ft'), 'gamma_wall': ...},
+    'AB Rocks'  : {...},
+    }
+  grids = {
+    'grid 1' : {'LTADS': Units('1322 lb / ft'), 'geogrid_X': ...,
+                'weight': Units('0.05 lb / ft^2')},
+    'grid 2' : {...},
+    }
+
+A combination's weight, per foot of wall, is that of its blocks (gamma_wall *
+block_depth * H) plus that of its geogrid, if the grid gives its "weight"
+per unit area (L_g * number of layers * weight); equally heavy combinations
+are ordered by geogrid area.
+"""
+
+import getopt, math, sys
+
+import sweep, units, Wall
+from units import Units
+
+DEFAULT_PARAMS = ('L_g', 'B_b', 'D')
+DEFAULT_STEP = 0.01
+MAX_DOUBLINGS = 10      # when searching upwards for a passing value
+
+# Smallest allowed values, below which the analyses' assumptions don't hold
+# (see the notes in sample-design), used as the default lower bounds.
+MINIMUM_VALUES = {
+  'B_b' : Units('2.0 ft'),
+  'd_b' : Units('0.5 ft'),
+  }
+
+# Params set by InputParams.ParamsSanityCheck rather than by a formula, and
+# the input params they are computed from.
+SANITY_CHECK_DEPENDENCIES = {'n_courses': ('H', 'block_height')}
+
+
+def DependsOn(analysis_class, datadict, name):
+  """Returns true iff the factor of safety computed by analysis_class depends,
+  directly or through derived params, on the input param name."""
+  if '_inputs' not in analysis_class.__dict__:
+    analysis_class(Wall.InputParams(datadict), latex=False)
+  pending, seen = set(analysis_class._inputs), set()
+  while pending:
+    read = pending.pop()
+    if read == name:
+      return True
+    seen.add(read)
+    pending.update(set(Wall.DERIVED_DATA_GRAPH.dependencies.get(read, ())) |
+                   set(SANITY_CHECK_DEPENDENCIES.get(read, ())))
+    pending.difference_update(seen)
+  return False
+
+
+def Magnitude(value):
+  """Returns a param's value as a plain number, in its own units."""
+  if isinstance(value, Units):
+    return value.magnitude
+  return value
+
+
+def Failures(results):
+  """
+  Args: results - list of (analysis name, actual FOS, desired FOS), as from
+    FastAnalyzer.Analyze
+  Returns: the failing analyses' names, worst first (i.e. by ascending ratio
+    of actual to desired FOS)
+  """
+  failures = [(actual / desired, name) for name, actual, desired in results
+              if actual < desired]
+  return [name for ratio, name in sorted(failures)]
+
+
+def Minimize(datadict, name, lo=None, hi=None, step=DEFAULT_STEP):
+  """
+  Finds the smallest multiple of step, between lo and hi, that the param name
+  can be set to with the design still passing every failure analysis.
+
+  Args:
+    datadict (dict) - the base design's input parameters
+    name (str) - the param to minimize
+    lo, hi (float) - bounds on the search, in the units of the base design's
+      value.  By default, lo is MINIMUM_VALUES[name] if set, else step, and
+      hi is the base design's value, doubled as often as needed to pass.
+    step (float) - resolution of the result
+  Returns: (minimum value, name of the governing analysis -- the one that
+    fails at the next step down -- or None if lo passes, number of designs
+    analyzed)
+  """
+  if name not in datadict:
+    raise Wall.Error('Unknown parameter "%s"' % name)
+  dependent = [cls for cls in Wall.ALL_ANALYSES
+               if DependsOn(cls, datadict, name)]
+  independent = Failures(Wall.FastAnalyzer(
+    [cls for cls in Wall.ALL_ANALYSES if cls not in dependent]).Analyze(
+      datadict))
+  if independent:
+    raise Wall.Error('%s fails whatever the value of %s' %
+                     (', '.join(independent), name))
+
+  if lo is None and name in MINIMUM_VALUES:
+    lo = Magnitude(datadict[name]) * float(MINIMUM_VALUES[name] /
+                                           datadict[name])
+  if lo is not None and hi is not None and lo > hi:
+    raise Wall.Error('Bad bounds for %s: lower bound %g is above upper bound '
+                     '%g' % (name, lo, hi))
+  analyzer = Wall.FastAnalyzer(dependent)
+  analyzed = []
+  def FailuresAt(k):
+    analyzed.append(k)
+    design = dict(datadict)
+    design[name] = sweep.AxisValue(datadict[name], round(k * step, 10))
+    try:
+      return Failures(analyzer.Analyze(design))
+    except (Wall.Error, units.Error), e:
+      return ['invalid design (%s)' % str(e).replace('\n', ' ')]
+
+  k_lo = max(1, int(math.ceil((lo or step) / step - 1e-9)))
+  if hi is None:
+    k_hi = max(k_lo, int(math.ceil(Magnitude(datadict[name]) / step - 1e-9)))
+    for doubling in range(MAX_DOUBLINGS):
+      if not FailuresAt(k_hi):
+        break
+      k_lo, k_hi = k_hi, 2 * k_hi
+    else:
+      raise Wall.Error('No value of %s up to %g passes' %
+                       (name, k_hi * step))
+  else:
+    k_hi = int(math.floor(hi / step + 1e-9))
+    if k_hi < k_lo:
+      raise Wall.Error('No multiple of %g between %g and %g' % (step, lo, hi))
+    if FailuresAt(k_hi):
+      raise Wall.Error('%s = %g does not pass' % (name, k_hi * step))
+
+  failures = k_lo < k_hi and FailuresAt(k_lo)
+  if not failures:
+    return round(k_lo * step, 10), None, len(analyzed)
+  while k_hi - k_lo > 1:
+    k_mid = (k_lo + k_hi) // 2
+    mid_failures = FailuresAt(k_mid)
+    if mid_failures:
+      k_lo, failures = k_mid, mid_failures
+    else:
+      k_hi = k_mid
+  return round(k_hi * step, 10), failures[0], len(analyzed)
+
+
+def Optimize(datadict, names=DEFAULT_PARAMS, bounds=None, step=DEFAULT_STEP):
+  """
+  Minimizes each of the named params in turn, holding the others at their
+  best values so far.
+  Args:
+    datadict (dict) - the base design's input parameters
+    names (list) - the params to minimize, in order
+    bounds (dict) - param name -> (lo, hi), either of which may be None
+    step (float) - resolution of the results
+  Returns: (the optimized design, list of (name, value, governing analysis,
+    number of designs analyzed), as from Minimize, one per name)
+  """
+  design = dict(datadict)
+  results = []
+  for name in names:
+    lo, hi = (bounds or {}).get(name, (None, None))
+    value, governing, analyzed = Minimize(design, name, lo, hi, step)
+    design[name] = sweep.AxisValue(design[name], value)
+    results.append((name, value, governing, analyzed))
+  return design, results
+
+
+class LayoutSearch(object):
+  """
+  Branch-and-bound search for the geogrid layout (geogrid_levels) with the
+  fewest layers -- and so, since every layer is L_g long, the least total
+  grid area -- that passes the grid analyses.
+
+  The load on a layer depends only on its own level and its neighbours' (its
+  section of soil runs halfway to each), so whether a layer passes is worked
+  out once for each (lower neighbour, level, upper neighbour) triple.  And a
+  layer's factors of safety only decrease as its neighbours move away, which
+  gives:
+   * the highest upper neighbour each layer can have, by bisection;
+   * a bound on the spacing of any two layers, and so on the number of
+     layers still needed above a partial layout, used to prune it against
+     the best layout found so far.
+  Partial layouts ending in the same two layers are also pruned if they have
+  no fewer layers than one already tried.
+  """
+  ANALYSES = (Wall.RuptureAnalysis, Wall.PulloutOfBlockAnalysis,
+              Wall.PulloutOfSoilAnalysis)
+
+  def __init__(self, datadict):
+    """datadict (dict) - the design's input parameters; its own
+    geogrid_levels are ignored, apart from being checked."""
+    Wall.FastAnalyzer(self.ANALYSES).Analyze(datadict)    # checks units
+    params = Wall.FloatParams(datadict)
+    self.n_courses = params.n_courses
+    self.analyses = [cls(params, latex=False) for cls in self.ANALYSES]
+    self.passes = {}    # (lower, level, upper) -> true iff that layer passes
+
+  def LayerPasses(self, lower, level, upper):
+    """Returns true iff a layer at level passes every grid analysis, given
+    the levels of the layers below and above it (None for the bottom or top
+    of the wall)."""
+    key = (lower, level, upper)
+    if key not in self.passes:
+      levels = [l for l in key if l is not None]
+      i = levels.index(level)
+      passed = True
+      for analysis in self.analyses:
+        analysis.params['geogrid_levels'] = levels
+        if analysis.LayerValues(i)[1]['actual_fos'] < analysis.desired_fos:
+          passed = False
+          break
+      self.passes[key] = passed
+    return self.passes[key]
+
+  def UpperLimit(self, lower, level):
+    """Returns the highest level the next layer above a layer at level can
+    be at (level itself if none will do)."""
+    lo, hi = level, self.n_courses
+    if self.LayerPasses(lower, level, hi):
+      return hi
+    while hi - lo > 1:
+      mid = (lo + hi) // 2
+      if self.LayerPasses(lower, level, mid):
+        lo = mid
+      else:
+        hi = mid
+    return lo
+
+  def MaxSpacing(self):
+    """Returns an upper bound on the spacing, in courses, between any two
+    neighbouring layers, or twice the distance of the top layer from the
+    top of the wall (its section of soil reaches to the top).  A layer's
+    most favourable lower neighbour is the course just below it."""
+    spacing = 0
+    for level in range(1, self.n_courses + 1):
+      if self.LayerPasses(level - 1, level, None):
+        spacing = max(spacing, 2 * (self.n_courses - level))
+      else:
+        spacing = max(spacing, self.UpperLimit(level - 1, level) - level)
+    return spacing
+
+  def LayersNeeded(self, level):
+    """Returns a lower bound on the number of layers needed above a layer
+    at level."""
+    remaining = self.n_courses - 0.5 * self.spacing - level
+    return max(0, int(math.ceil(remaining / self.spacing - 1e-9)))
+
+  def Search(self):
+    """Returns the geogrid_levels of a passing layout with the fewest layers,
+    or None if no layout passes."""
+    self.spacing = self.MaxSpacing()
+    self.best = None
+    self.shortest = {}      # (lower, level) -> fewest layers reaching it
+    if self.spacing:
+      for level in range(self.n_courses, 0, -1):
+        self.Extend(None, level, [level])
+    return self.best
+
+  def Extend(self, lower, level, layout):
+    """Searches the layouts that start with layout, which ends with layers
+    at lower and level; records the best in self.best."""
+    if (self.best is not None and
+        len(layout) + self.LayersNeeded(level) >= len(self.best)):
+      return
+    if self.shortest.get((lower, level), sys.maxint) <= len(layout):
+      return
+    self.shortest[(lower, level)] = len(layout)
+    if self.LayerPasses(lower, level, None):
+      self.best = layout
+      return
+    for upper in range(self.UpperLimit(lower, level), level, -1):
+      self.Extend(level, upper, layout + [upper])
+
+
+def WallWeight(design):
+  """Returns the weight of a design's blocks per foot of wall, in lb/ft."""
+  return float(design['gamma_wall'] * design['block_depth'] * design['H'] /
+               Units('1 lb / ft'))
+
+def GridArea(design):
+  """Returns the area of a design's geogrid per foot of wall, in ft^2/ft."""
+  return float(design['L_g'] * len(design['geogrid_levels']) / Units('1 ft'))
+
+
+def Combinations(datadict, blocks, grids, step=DEFAULT_STEP):
+  """
+  Minimizes L_g for each combination of blocks and grids.
+  Args:
+    datadict (dict) - the base design's input parameters
+    blocks, grids (dict) - name -> dict of the params that block or geogrid
+      overrides; a grid's "weight" per unit area, if given, isn't a param,
+      but counts towards the combination's weight
+    step (float) - resolution of L_g
+  Returns: list of (block name, grid name, weight in lb/ft, grid area in
+    ft^2/ft, L_g, governing analysis, number of designs analyzed), lightest
+    first, for each combination that passes with some L_g; then (block name,
+    grid name, None, None, None, error message, number of designs analyzed)
+    for each that doesn't
+  """
+  passing, failing = [], []
+  for block_name, block in sorted(blocks.items()):
+    for grid_name, grid in sorted(grids.items()):
+      design = dict(datadict)
+      design.update(block)
+      design.update(grid)
+      grid_weight = design.pop('weight', None)
+      try:
+        value, governing, analyzed = Minimize(design, 'L_g', step=step)
+      except (Wall.Error, units.Error), e:
+        failing.append((block_name, grid_name, None, None, None,
+                        str(e).replace('\n', ' '), 0))
+        continue
+      design['L_g'] = sweep.AxisValue(design['L_g'], value)
+      weight = WallWeight(design)
+      if grid_weight is not None:
+        weight += GridArea(design) * float(grid_weight / Units('1 lb / ft^2'))
+      passing.append((block_name, grid_name, weight, GridArea(design), value,
+                      governing, analyzed))
+  passing.sort(key=lambda row: (row[2], row[3]))
+  return passing + failing
+
+
+def ParseParam(spec):
+  """
+  Args: spec (str) - a param to minimize, e.g. 'L_g' or 'L_g=3:12'
+  Returns: (param name, (lo, hi)); lo and hi are None unless given
+  """
+  if '=' not in spec:
+    return spec, (None, None)
+  name, bounds = spec.split('=', 1)
+  try:
+    lo, hi = [b and float(b) or None for b in bounds.split(':')]
+  except ValueError:
+    raise Wall.Error('Bad bounds "%s": expected name=lo:hi' % spec)
+  if lo is not None and hi is not None and lo > hi:
+    raise Wall.Error('Bad bounds "%s": lo is above hi' % spec)
+  return name, (lo, hi)
+
+
+def Plural(n, noun):
+  """Returns e.g. '1 design' or '2 designs'."""
+  return '%d %s%s' % (n, noun, n != 1 and 's' or '')
+
+
+def FormatResults(datadict, results):
+  lines = []
+  for name, value, governing, analyzed in results:
+    value = sweep.AxisValue(datadict[name], value)
+    if isinstance(value, Units):
+      value = value.Render(as_latex=False)
+    lines.append('%10s = %-10s %-50s (%s analyzed)' % (
+      name, value, governing and 'governed by %s' % governing or
+      'at lower bound', Plural(analyzed, 'design')))
+  return '\n'.join(lines)
+
+def FormatCombinations(rows):
+  lines = ['%-16s %-16s %10s %10s %8s  %s' % (
+    'block', 'grid', 'lb/ft', 'ft^2/ft', 'L_g', 'governed by')]
+  for block, grid, weight, area, L_g, governing, analyzed in rows:
+    if weight is None:
+      lines.append('%-16s %-16s FAIL (%s)' % (block, grid, governing))
+    else:
+      lines.append('%-16s %-16s %10.1f %10.2f %8g  %s' % (
+        block, grid, weight, area, L_g, governing or 'lower bound'))
+  lines.append('(%s analyzed)' % Plural(sum([row[-1] for row in rows]),
+                                        'design'))
+  return '\n'.join(lines)
+
+
+def Usage():
+  return __doc__
+
+
+def Main(argv):
+  try:
+    opts, args = getopt.getopt(argv[1:], '', ['step=', 'layout',
+                                              'combinations', 'help'])
+  except getopt.GetoptError, e:
+    print '%s\n%s' % (e, Usage())
+    return 1
+  if not args or ('--help', '') in opts:
+    print Usage()
+    return 1
+  opts = dict(opts)
+  step = float(opts.get('--step', DEFAULT_STEP))
+
+  context = Wall.SOURCE_CACHE.Load(args[0])
+  datadict = context['params']
+  if '--combinations' in opts:
+    for name in ('blocks', 'grids'):
+      if not context.get(name):
+        raise Wall.Error("'%s' variable not defined in file %s" %
+                         (name, args[0]))
+    print FormatCombinations(Combinations(datadict, context['blocks'],
+                                          context['grids'], step))
+    return 0
+  if '--layout' in opts:
+    search = LayoutSearch(datadict)
+    layout = search.Search()
+    if layout is None:
+      print 'No geogrid layout passes'
+      return 1
+    print 'geogrid_levels = %s  (%s; %s)' % (
+      layout, Plural(len(layout), 'layer'),
+      Plural(len(search.passes), 'layer check'))
+    return 0
+  try:
+    specs = [ParseParam(spec) for spec in args[1:]] or [
+      (name, (None, None)) for name in DEFAULT_PARAMS]
+  except Wall.Error, e:
+    print '%s\n%s' % (e, Usage())
+    return 1
+  design, results = Optimize(datadict, [name for name, _ in specs],
+                             dict(specs), step)
+  print FormatResults(datadict, results)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(Main(sys.argv))
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+import itertools, unittest
+import optimize, sweep, Wall
+from units import Units
+from Wall_test import SampleParams
+
+
+class OptimizeTest(unittest.TestCase):
+  def testDependsOn(self):
+    base = SampleParams()
+    self.assertTrue(optimize.DependsOn(Wall.SlidingAnalysis, base, 'L_g'))
+    self.assertTrue(optimize.DependsOn(Wall.PulloutOfSoilAnalysis, base, 'H'))
+    self.assertFalse(optimize.DependsOn(Wall.RuptureAnalysis, base, 'L_g'))
+    self.assertFalse(optimize.DependsOn(Wall.SlidingAnalysis, base, 'B_b'))
+
+  def testMinimizeMatchesGridSearch(self):
+    base = SampleParams()
+    value, governing, analyzed = optimize.Minimize(base, 'L_g', 4.0, 8.0,
+                                                   step=0.05)
+    analyzer = Wall.FastAnalyzer()
+    passing = [k * 0.05 for k in range(80, 161) if not optimize.Failures(
+      analyzer.Analyze(sweep.Design(base, ['L_g'], [k * 0.05])))]
+    self.assertAlmostEqual(value, passing[0])
+    self.assertEqual(governing, 'Pullout Of Soil Analysis')
+    self.assertTrue(analyzed < 10)
+
+  def testOptimize(self):
+    design, results = optimize.Optimize(SampleParams(), step=0.1)
+    self.assertEqual([r[0] for r in results], ['L_g', 'B_b', 'D'])
+    self.assertEqual(results[1][1:3], (2.0, None))
+    self.assertFalse(optimize.Failures(Wall.FastAnalyzer().Analyze(design)))
+    for name, value, governing, analyzed in results:
+      self.assertEqual(design[name].magnitude, value)
+    self.assertRaises(Wall.Error, optimize.Minimize, SampleParams(), 'nonesuch')
+
+  def testLayoutSearch(self):
+    base = SampleParams()
+    base['H'] = Units('5.08 ft')        # 8 courses
+    base['geogrid_levels'] = [1, 3, 5]
+    search = optimize.LayoutSearch(base)
+    layout = search.Search()
+
+    # Brute force: the smallest subsets of the courses passing every analysis
+    analyzer = Wall.FastAnalyzer()
+    for n_layers in range(1, 9):
+      passing = []
+      for levels in itertools.combinations(range(1, 9), n_layers):
+        design = dict(base, geogrid_levels=list(levels))
+        if not optimize.Failures(analyzer.Analyze(design)):
+          passing.append(list(levels))
+      if passing:
+        break
+    self.assertTrue(layout in passing)
+    self.assertTrue(len(search.passes) < 2 ** 8)
+
+    base['L_g'] = Units('2.0 ft')
+    self.assertEqual(optimize.LayoutSearch(base).Search(), None)
+
+  def testCombinations(self):
+    base = SampleParams()
+    blocks = {'heavy': {'gamma_wall': Units('140 lb / ft^3')},
+              'light': {'gamma_wall': Units('110 lb / ft^3')},
+              'bad': {'block_height': Units('0.5 ft')}}
+    grids = {'strong': {'LTADS': Units('2000 lb / ft'),
+                        'weight': Units('0.1 lb / ft^2')},
+             'weak': {'LTADS': Units('100 lb / ft')}}
+    rows = optimize.Combinations(base, blocks, grids, step=0.1)
+    self.assertEqual([row[:2] for row in rows[:2]],
+                     [('light', 'strong'), ('heavy', 'strong')])
+    self.assertEqual(sorted([row[:2] for row in rows[2:]]),
+                     [('bad', 'strong'), ('bad', 'weak'), ('heavy', 'weak'),
+                      ('light', 'weak')])
+    self.assertTrue([row[2] for row in rows[2:]] == [None] * 4)
+
+    block, grid, weight, area, L_g, governing, analyzed = rows[0]
+    design = dict(base, gamma_wall=blocks['light']['gamma_wall'],
+                  LTADS=grids['strong']['LTADS'])
+    self.assertEqual((L_g, governing, analyzed),
+                     optimize.Minimize(design, 'L_g', step=0.1))
+    self.assertAlmostEqual(area, 7 * L_g)
+    self.assertAlmostEqual(weight, 110 * 0.97 * 9.525 + 0.1 * area)
+    table = optimize.FormatCombinations(rows).split('\n')
+    self.assertTrue(table[1].startswith('light'))
+    self.assertTrue('FAIL' in table[-2])
+
+  def testFormatResultsSingular(self):
+    lines = optimize.FormatResults(SampleParams(), [('D', 2.0, None, 1),
+                                                    ('B_b', 2.0, None, 2)])
+    self.assertTrue(lines.split('\n')[0].endswith('(1 design analyzed)'))
+    self.assertTrue(lines.split('\n')[1].endswith('(2 designs analyzed)'))
+
+  def testParseParam(self):
+    self.assertEqual(optimize.ParseParam('D'), ('D', (None, None)))
+    self.assertEqual(optimize.ParseParam('L_g=3:'), ('L_g', (3.0, None)))
+    self.assertRaises(Wall.Error, optimize.ParseParam, 'L_g=x:y')
+    self.assertRaises(Wall.Error, optimize.ParseParam, 'L_g=10:5')
+
+  def testBadBounds(self):
+    base = SampleParams()
+    self.assertRaises(Wall.Error, optimize.Minimize, base, 'L_g', 10.0, 5.0)
+    self.assertRaises(Wall.Error, optimize.Minimize, base, 'B_b', None, 1.5)
+    self.assertRaises(Wall.Error, optimize.Minimize, base, 'L_g', 5.001,
+                      5.005)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,601 @@
+#!/usr/bin/python
+
+"""
+Reliability analysis: estimates the probability that a design fails, given
+uncertainty in its soil parameters, by Monte Carlo simulation.
+
+A design file declares the uncertain parameters in a "distributions" dict
+alongside "params", with the distributions' parameters in units like the
+params' own, e.g.
+
+  from reliability import LogNormal, Normal, Triangular, Uniform
+  distributions = {
+    'phi_r'         : Normal(Degrees(30), Degrees(2)),
+    'gamma_r'       : Uniform(Units('110 lb/ft^3'), Units('130 lb/ft^3')),
+    'cohesion_f'    : LogNormal(Units('50 lb/ft^2'), Units('15 lb/ft^2')),
+    'sigma_allowed' : Triangular(Units('2000 lb/ft^2'),
+                                 Units('2500 lb/ft^2'), Units('3000 lb/ft^2')),
+    }
+
+The samples are analyzed a chunk at a time, as a vectorized batch (see
+batch.py), and only the failure counts are kept, so memory use doesn't grow
+with the number of samples.  After each chunk, the running estimate of the
+probability of failure by each mode, and of the system (by any mode), is
+reported with a confidence interval.
+
+Plain Monte Carlo needs on the order of 100/P samples to estimate a
+probability of failure P, which is too many for a well-designed wall.  Two
+variance-reduced sampling methods are available (--method):
+
+  latin-hypercube - stratifies each uncertain param's samples, so that each
+    of n equally likely slices of its range gets exactly one sample per
+    chunk.  The estimate is unbiased, and its error is no larger than plain
+    Monte Carlo's (the interval reported is the conservative binomial one).
+  importance - first finds each failure mode's design point, its most
+    probable failure point, by a FORM search (HL-RF iteration) in standard
+    normal space, and reports its reliability index beta and the FORM
+    approximation P = Phi(-beta).  It then samples from normal densities
+    centred on the design points, and weights each sample by the ratio of
+    the true density to the sampling density.  A fraction of the samples
+    (DEFENSIVE_FRACTION) still comes from the true density, so that modes
+    without a design point are also estimated without bias.
+
+A mode fails for a sample if its factor of safety is below 1, i.e. the
+forces causing failure exceed those resisting it -- or, with --design-fos,
+if it is below the design FOS.
+
+Usage: reliability.py [--samples=N] [--chunk=N] [--seed=N]
+                      [--confidence=C] [--design-fos]
+                      [--method=monte-carlo|latin-hypercube|importance]
+                      design-params-file
+   or: Wall.py reliability [options] design-params-file
+"""
+
+import getopt, math, sys
+
+import batch, units, Wall
+from units import Degrees, Units, numpy
+
+DEFAULT_SAMPLES = 100000
+DEFAULT_CHUNK_SIZE = 20000
+DEFAULT_CONFIDENCE = 0.95
+
+MONTE_CARLO = 'monte-carlo'
+LATIN_HYPERCUBE = 'latin-hypercube'
+IMPORTANCE = 'importance'
+SAMPLING_METHODS = (MONTE_CARLO, LATIN_HYPERCUBE, IMPORTANCE)
+
+# Fraction of importance samples drawn from the true density, rather than
+# around the design points
+DEFENSIVE_FRACTION = 0.1
+
+# FORM search: standard normal step for the finite difference gradient,
+# convergence tolerance (on the step, and on the log FOS ratio), and limit
+DESIGN_POINT_STEP = 1e-4
+DESIGN_POINT_TOLERANCE = 1e-4
+MAX_DESIGN_POINT_ITERATIONS = 50
+
+# Coefficients of Acklam's rational approximation to the normal quantile
+QUANTILE_A = (-3.969683028665376e+01, 2.209460984245205e+02,
+              -2.759285104469687e+02, 1.383577518672690e+02,
+              -3.066479806614716e+01, 2.506628277459239e+00)
+QUANTILE_B = (-5.447609879822406e+01, 1.615858368580409e+02,
+              -1.556989798598866e+02, 6.680131188771972e+01,
+              -1.328068155288572e+01, 1.0)
+QUANTILE_C = (-7.784894002430293e-03, -3.223964580411365e-01,
+              -2.400758277161838e+00, -2.549732539343734e+00,
+              4.374664141464968e+00, 2.938163982698783e+00)
+QUANTILE_D = (7.784695709041462e-03, 3.224671290700398e-01,
+              2.445134137142996e+00, 3.754408661907416e+00, 1.0)
+QUANTILE_TAIL = 0.02425
+
+# Two-sided standard normal quantiles for the supported confidence levels
+Z_SCORES = {0.90: 1.6449, 0.95: 1.9600, 0.99: 2.5758, 0.999: 3.2905}
+
+
+def Magnitude(value):
+  """Returns value as a bare magnitude, as in FloatParams: in canonical
+  units, with angles in radians."""
+  if isinstance(value, Degrees):
+    return value.radians()
+  if isinstance(value, Units):
+    return units.Normalize(value).magnitude
+  return float(value)
+
+def Value(base, magnitude):
+  """The inverse of Magnitude: returns magnitude as a value like base (in
+  base's units, with its ndigits)."""
+  if isinstance(base, Degrees):
+    return Degrees(math.degrees(magnitude), ndigits=base.ndigits)
+  if isinstance(base, Units):
+    value = Units(units.Normalize(base))
+    value.magnitude = float(magnitude)
+    return value.to(base.dim)
+  return float(magnitude)
+
+
+def Polynomial(coefficients, x):
+  result = 0.0
+  for coefficient in coefficients:
+    result = result * x + coefficient
+  return result
+
+def NormalCDF(u):
+  """Returns the standard normal CDF of u, a number or numpy array."""
+  if not numpy.shape(u):
+    return 0.5 * math.erfc(-u / math.sqrt(2.0))
+  erfc = numpy.frompyfunc(math.erfc, 1, 1)
+  return 0.5 * erfc(-numpy.asarray(u) / math.sqrt(2.0)).astype(float)
+
+def NormalQuantile(p):
+  """Returns the standard normal quantile (inverse CDF) of each of the numpy
+  array p of probabilities, by Acklam's approximation and a Newton step."""
+  p = numpy.clip(numpy.asarray(p, dtype=float), 1e-300, 1.0 - 1e-16)
+  u = numpy.empty(p.shape)
+  low, high = p < QUANTILE_TAIL, p > 1.0 - QUANTILE_TAIL
+  middle = ~(low | high)
+  q = numpy.sqrt(-2.0 * numpy.log(p[low]))
+  u[low] = Polynomial(QUANTILE_C, q) / Polynomial(QUANTILE_D, q)
+  q = numpy.sqrt(-2.0 * numpy.log(1.0 - p[high]))
+  u[high] = -Polynomial(QUANTILE_C, q) / Polynomial(QUANTILE_D, q)
+  q = p[middle] - 0.5
+  r = q * q
+  u[middle] = q * Polynomial(QUANTILE_A, r) / Polynomial(QUANTILE_B, r)
+  error = (NormalCDF(u) - p) * math.sqrt(2 * math.pi) * numpy.exp(0.5 * u * u)
+  return u - error / (1.0 + 0.5 * u * error)
+
+
+class Distribution(object):
+  """
+  The distribution of an uncertain param.  Its parameters (e.g. mean and
+  standard deviation) are Units or Degrees values, or plain numbers, like
+  the param's own value.  Subclasses define Draw and InverseCDF.
+  """
+  def __init__(self, *values):
+    self.values = values
+
+  def Check(self, name, base):
+    """Raises units.Error unless the distribution's parameters have the
+    same units as base, the param's value in the base design."""
+    for value in self.values:
+      if isinstance(base, Degrees) or isinstance(value, Degrees):
+        same = isinstance(base, Degrees) and isinstance(value, Degrees)
+      elif isinstance(base, Units) or isinstance(value, Units):
+        same = (isinstance(base, Units) and isinstance(value, Units) and
+                units.Normalize(value).dim is units.Normalize(base).dim)
+      else:
+        same = True
+      if not same:
+        raise units.Error('Distribution of %s has different units (%s) from '
+                          'the base design (%s)' % (name, value, base))
+
+  def Sample(self, rng, n):
+    """Returns a numpy array of n samples, as bare magnitudes (see
+    Magnitude), drawn using rng (a numpy.random.RandomState)."""
+    return self.Draw(rng, n, *self.Magnitudes())
+
+  def Quantile(self, p):
+    """Returns the values, as bare magnitudes, below which the param lies
+    with probabilities p (a numpy array)."""
+    return self.InverseCDF(p, *self.Magnitudes())
+
+  def FromStandardNormal(self, u):
+    """Maps a numpy array of standard normal values u to values of the
+    param, as bare magnitudes, with the same CDF."""
+    return self.Quantile(NormalCDF(u))
+
+  def Magnitudes(self):
+    return [Magnitude(value) for value in self.values]
+
+  def Draw(self, rng, n, *params):
+    raise Wall.Error("Must be implemented in subclass")
+
+  def InverseCDF(self, p, *params):
+    raise Wall.Error("Must be implemented in subclass")
+
+
+class Normal(Distribution):
+  def __init__(self, mean, sd):
+    Distribution.__init__(self, mean, sd)
+
+  def Draw(self, rng, n, mean, sd):
+    return rng.normal(mean, sd, n)
+
+  def InverseCDF(self, p, mean, sd):
+    return mean + sd * NormalQuantile(p)
+
+  def FromStandardNormal(self, u):
+    mean, sd = self.Magnitudes()
+    return mean + sd * u
+
+
+class LogNormal(Distribution):
+  """Log-normal distribution with the given mean and standard deviation (of
+  the param itself, not of its logarithm)."""
+  def __init__(self, mean, sd):
+    Distribution.__init__(self, mean, sd)
+
+  @staticmethod
+  def LogParams(mean, sd):
+    """Returns the mean and standard deviation of the param's logarithm."""
+    variance = math.log(1.0 + (sd / mean) ** 2)
+    return math.log(mean) - 0.5 * variance, math.sqrt(variance)
+
+  def Draw(self, rng, n, mean, sd):
+    return rng.lognormal(*(self.LogParams(mean, sd) + (n,)))
+
+  def InverseCDF(self, p, mean, sd):
+    return self.FromStandardNormal(NormalQuantile(p))
+
+  def FromStandardNormal(self, u):
+    log_mean, log_sd = self.LogParams(*self.Magnitudes())
+    return numpy.exp(log_mean + log_sd * u)
+
+
+class Uniform(Distribution):
+  def __init__(self, low, high):
+    Distribution.__init__(self, low, high)
+
+  def Draw(self, rng, n, low, high):
+    return rng.uniform(low, high, n)
+
+  def InverseCDF(self, p, low, high):
+    return low + (high - low) * p
+
+
+class Triangular(Distribution):
+  def __init__(self, low, mode, high):
+    Distribution.__init__(self, low, mode, high)
+
+  def Draw(self, rng, n, low, mode, high):
+    return rng.triangular(low, mode, high, n)
+
+  def InverseCDF(self, p, low, mode, high):
+    p = numpy.asarray(p)
+    return numpy.where(p * (high - low) < mode - low,
+                       low + numpy.sqrt(p * (high - low) * (mode - low)),
+                       high - numpy.sqrt((1 - p) * (high - low) * (high - mode)))
+
+
+def ZScore(confidence):
+  if confidence not in Z_SCORES:
+    raise Wall.Error('Confidence must be one of %s' % sorted(Z_SCORES))
+  return Z_SCORES[confidence]
+
+def WilsonInterval(failures, samples, confidence=DEFAULT_CONFIDENCE):
+  """Returns the Wilson score interval (low, high) for a probability
+  estimated as failures / samples.  Unlike the normal approximation, it
+  stays meaningful when there are no failures at all."""
+  z = ZScore(confidence)
+  if not samples:
+    return 0.0, 1.0
+  p = float(failures) / samples
+  scale = 1.0 + z * z / samples
+  center = (p + z * z / (2.0 * samples)) / scale
+  half = z * math.sqrt(p * (1 - p) / samples +
+                       z * z / (4.0 * samples * samples)) / scale
+  return max(0.0, center - half), min(1.0, center + half)
+
+
+class Tally(object):
+  """Running counts of failures by each failure mode, and of the system (a
+  sample fails if any mode does)."""
+  SYSTEM = 'System'
+
+  def __init__(self, use_design_fos=False):
+    self.use_design_fos = use_design_fos
+    self.samples = 0
+    self.modes = []           # failure mode names, in order
+    self.failures = {}        # mode name (or SYSTEM) -> number of failures
+
+  def Failed(self, results):
+    """Returns a list of (mode name, boolean array, true where the sample
+    failed by that mode) for results, as from batch.Analyze, followed by
+    (SYSTEM, boolean array of samples that failed by any mode)."""
+    failed_by_mode = []
+    system = None
+    for name, actual, desired in results:
+      limit = self.use_design_fos and desired or 1.0
+      failed = ~(actual >= limit)       # NaN (e.g. an impossible angle) fails
+      failed_by_mode.append((name, failed))
+      if system is None:
+        system = failed
+      else:
+        system = system | failed
+    return failed_by_mode + [(self.SYSTEM, system)]
+
+  def Add(self, results):
+    """Counts the failures in results, as from batch.Analyze."""
+    for name, failed in self.Failed(results):
+      self.Count(name, failed)
+    self.samples += len(failed)     # the last is the system's
+
+  def Count(self, name, failed):
+    if name not in self.failures and name != self.SYSTEM:
+      self.modes.append(name)
+    self.failures[name] = self.failures.get(name, 0) + int(failed.sum())
+
+  def Estimate(self, name=SYSTEM, confidence=DEFAULT_CONFIDENCE):
+    """Returns (estimated probability of failure, low, high) for the named
+    mode, or for the system, with the confidence interval (low, high)."""
+    failures = self.failures.get(name, 0)
+    low, high = WilsonInterval(failures, self.samples, confidence)
+    return float(failures) / max(1, self.samples), low, high
+
+
+class WeightedTally(Tally):
+  """A Tally of importance samples: each failure counts its weight, the
+  ratio of the true density to the sampling density at the sample."""
+  def __init__(self, use_design_fos=False):
+    Tally.__init__(self, use_design_fos)
+    self.sums = {}            # mode name (or SYSTEM) -> sum of failure weights
+    self.squares = {}         # ... and of their squares
+
+  def Add(self, results, weights):
+    """Counts the failures in results, as from batch.Analyze, with their
+    weights (a numpy array, one per sample)."""
+    for name, failed in self.Failed(results):
+      self.Count(name, failed)
+      weighted = weights[failed]
+      self.sums[name] = self.sums.get(name, 0.0) + weighted.sum()
+      self.squares[name] = (self.squares.get(name, 0.0) +
+                            (weighted * weighted).sum())
+    self.samples += len(weights)
+
+  def Estimate(self, name=Tally.SYSTEM, confidence=DEFAULT_CONFIDENCE):
+    """As Tally.Estimate, but with the normal approximation interval of the
+    weighted mean.  With no failures, that interval is empty, so the
+    binomial one is returned instead."""
+    if not self.failures.get(name):
+      return Tally.Estimate(self, name, confidence)
+    p = self.sums[name] / self.samples
+    variance = max(0.0, self.squares[name] / self.samples - p * p)
+    half = ZScore(confidence) * math.sqrt(variance / self.samples)
+    return p, max(0.0, p - half), min(1.0, p + half)
+
+
+def LatinHypercube(rng, n):
+  """Returns n probabilities, one in each of the intervals [i/n, (i+1)/n),
+  in random order."""
+  return (rng.permutation(n) + rng.uniform(size=n)) / n
+
+def StandardNormalColumns(distributions, u):
+  """
+  Args:
+    distributions (dict) - param name -> Distribution
+    u (numpy array) - points in standard normal space, one column per point,
+      with a row for each param, in sorted order of name
+  Returns: columns for BatchParams.FromColumns, with the params' values
+  """
+  return dict([(name, distribution.FromStandardNormal(u[i]))
+               for i, (name, distribution)
+               in enumerate(sorted(distributions.items()))])
+
+
+def FindDesignPoints(datadict, distributions, use_design_fos=False,
+                     analysis_classes=Wall.ALL_ANALYSES):
+  """
+  Finds each failure mode's design point -- the most probable failure point,
+  nearest the origin in the standard normal space of the uncertain params --
+  by the HL-RF iteration on the limit state g = log(FOS / limiting FOS).  Each
+  gradient is by forward differences, with the point and its neighbours
+  analyzed as one batch.
+  Args: as for Simulate
+  Returns: (list of (mode name, design point or None, reliability index beta
+    or None), number of designs analyzed); each design point is a numpy
+    array, as for StandardNormalColumns, and is None if the search failed
+    (e.g. the mode's FOS doesn't depend on the uncertain params)
+  """
+  k = len(distributions)
+  offsets = numpy.hstack([numpy.zeros((k, 1)),
+                          DESIGN_POINT_STEP * numpy.eye(k)])
+  design_points = []
+  evaluations = 0
+  for analysis_class in analysis_classes:
+    u = numpy.zeros(k)
+    point = beta = None
+    for iteration in range(MAX_DESIGN_POINT_ITERATIONS):
+      params = batch.BatchParams.FromColumns(
+        datadict, StandardNormalColumns(distributions, u[:, None] + offsets))
+      with numpy.errstate(invalid='ignore'):
+        [(name, actual, desired)] = batch.Analyze(params, [analysis_class])
+      evaluations += k + 1
+      g = numpy.log(actual / (use_design_fos and desired or 1.0))
+      gradient = (g[1:] - g[0]) / DESIGN_POINT_STEP
+      if not numpy.isfinite(g).all() or not gradient.any():
+        break
+      if not iteration:
+        sign = g[0] < 0 and -1 or 1     # negative beta: the mean design fails
+      step = (gradient.dot(u) - g[0]) / gradient.dot(gradient) * gradient
+      converged = (abs(step - u).max() < DESIGN_POINT_TOLERANCE and
+                   abs(g[0]) < DESIGN_POINT_TOLERANCE)
+      u = step
+      if converged:
+        point, beta = u, sign * math.sqrt(u.dot(u))
+        break
+    design_points.append((name, point, beta))
+  return design_points, evaluations
+
+
+class ImportanceSampler(object):
+  """
+  Draws points in standard normal space from a mixture of the standard
+  normal density itself, with probability DEFENSIVE_FRACTION, and unit
+  normal densities centred on each design point, in proportion to their
+  FORM probabilities of failure.
+  """
+  def __init__(self, design_points, k):
+    """design_points - numpy arrays of k values, as from FindDesignPoints"""
+    self.centers = numpy.array([numpy.zeros(k)] + list(design_points)).T
+    if design_points:
+      form = numpy.array([NormalCDF(-math.sqrt(point.dot(point)))
+                          for point in design_points])
+      self.probabilities = numpy.hstack([
+        [DEFENSIVE_FRACTION], (1 - DEFENSIVE_FRACTION) * form / form.sum()])
+    else:
+      self.probabilities = numpy.ones(1)
+    self.offsets = 0.5 * (self.centers * self.centers).sum(axis=0)
+
+  def Sample(self, rng, n):
+    """Returns (points, as for StandardNormalColumns, weights), drawing n
+    points using rng.  Each weight is the ratio of the standard normal
+    density to the mixture's at the point."""
+    components = rng.choice(len(self.probabilities), n, p=self.probabilities)
+    u = rng.standard_normal((len(self.centers), n)) + self.centers[:, components]
+    # Each component's density relative to the standard normal density
+    with numpy.errstate(over='ignore'):
+      ratios = numpy.exp(self.centers.T.dot(u) - self.offsets[:, None])
+    return u, 1.0 / self.probabilities.dot(ratios)
+
+
+def Simulate(datadict, distributions, samples=DEFAULT_SAMPLES,
+             chunk_size=DEFAULT_CHUNK_SIZE, seed=None, use_design_fos=False,
+             analysis_classes=Wall.ALL_ANALYSES, method=MONTE_CARLO,
+             design_points=None):
+  """
+  Args:
+    datadict (dict) - the base design's input parameters
+    distributions (dict) - param name -> Distribution
+    samples (int) - total number of samples to analyze
+    chunk_size (int) - number of samples analyzed in each batch
+    seed (int) - random seed, for reproducible results
+    use_design_fos (bool) - count a mode as failing below its design FOS,
+      rather than below 1
+    analysis_classes - FailureAnalysis subclasses to run
+    method (str) - one of SAMPLING_METHODS
+    design_points (list) - for importance sampling, as from FindDesignPoints
+      (which is called if they aren't given)
+  Yields: the Tally (or, for importance sampling, WeightedTally) so far,
+    after each chunk of samples
+  """
+  if numpy is None:
+    raise Wall.Error('Reliability analysis requires numpy')
+  if method not in SAMPLING_METHODS:
+    raise Wall.Error('Sampling method must be one of %s' %
+                     ', '.join(SAMPLING_METHODS))
+  Wall.FastAnalyzer(analysis_classes).Analyze(datadict)     # checks units
+  for name, distribution in distributions.items():
+    if name not in datadict:
+      raise Wall.Error('Unknown parameter "%s"' % name)
+    distribution.Check(name, datadict[name])
+
+  rng = numpy.random.RandomState(seed)
+  if method == IMPORTANCE:
+    if design_points is None:
+      design_points, _ = FindDesignPoints(datadict, distributions,
+                                          use_design_fos, analysis_classes)
+    sampler = ImportanceSampler([point for _, point, _ in design_points
+                                 if point is not None], len(distributions))
+    tally = WeightedTally(use_design_fos)
+  else:
+    tally = Tally(use_design_fos)
+  while tally.samples < samples:
+    n = min(chunk_size, samples - tally.samples)
+    weights = None
+    if method == IMPORTANCE:
+      u, weights = sampler.Sample(rng, n)
+      columns = StandardNormalColumns(distributions, u)
+    elif method == LATIN_HYPERCUBE:
+      columns = dict([(name, distribution.Quantile(LatinHypercube(rng, n)))
+                      for name, distribution in sorted(distributions.items())])
+    else:
+      columns = dict([(name, distribution.Sample(rng, n))
+                      for name, distribution in sorted(distributions.items())])
+    params = batch.BatchParams.FromColumns(datadict, columns)
+    with numpy.errstate(invalid='ignore'):      # NaN FOS counts as failure
+      results = batch.Analyze(params, analysis_classes)
+    if weights is None:
+      tally.Add(results)
+    else:
+      tally.Add(results, weights)
+    yield tally
+
+
+def FormatEstimate(tally, name=Tally.SYSTEM, confidence=DEFAULT_CONFIDENCE):
+  return '%-36s %10d  %10.3g  [%.3g, %.3g]' % (
+    (name, tally.failures.get(name, 0)) + tally.Estimate(name, confidence))
+
+def FormatTally(tally, confidence=DEFAULT_CONFIDENCE):
+  lines = ['%-36s %10s  %10s  %g%% interval' % (
+    'failure mode', 'failures', 'P(failure)', 100 * confidence)]
+  for name in tally.modes + [Tally.SYSTEM]:
+    lines.append(FormatEstimate(tally, name, confidence))
+  lines.append('(%d samples)' % tally.samples)
+  return '\n'.join(lines)
+
+def FormatDesignPoints(datadict, distributions, design_points):
+  lines = ['%-36s %10s  %10s  design point' % ('failure mode', 'beta',
+                                               'FORM P')]
+  for name, point, beta in design_points:
+    if point is None:
+      lines.append('%-36s %10s  %10s  (not found)' % (name, '-', '-'))
+      continue
+    values = []
+    for u, (param, distribution) in zip(point, sorted(distributions.items())):
+      value = Value(datadict[param], distribution.FromStandardNormal(u))
+      if isinstance(value, (Degrees, Units)):
+        value = value.Render(as_latex=False)
+      values.append('%s = %s' % (param, value))
+    lines.append('%-36s %10.3f  %10.3g  %s' % (
+      name, beta, NormalCDF(-beta), ', '.join(values)))
+  return '\n'.join(lines)
+
+
+def Usage():
+  return __doc__
+
+
+def Main(argv):
+  try:
+    opts, args = getopt.getopt(argv[1:], '', ['samples=', 'chunk=', 'seed=',
+                                              'confidence=', 'design-fos',
+                                              'method=', 'help'])
+  except getopt.GetoptError, e:
+    print '%s\n%s' % (e, Usage())
+    return 1
+  if len(args) != 1 or ('--help', '') in opts:
+    print Usage()
+    return 1
+  opts = dict(opts)
+  try:
+    samples = int(opts.get('--samples', DEFAULT_SAMPLES))
+    chunk_size = int(opts.get('--chunk', DEFAULT_CHUNK_SIZE))
+    seed = opts.get('--seed') and int(opts['--seed'])
+    confidence = float(opts.get('--confidence', DEFAULT_CONFIDENCE))
+    method = opts.get('--method', MONTE_CARLO)
+    if samples <= 0 or chunk_size <= 0:
+      raise Wall.Error('--samples and --chunk must be positive')
+    ZScore(confidence)
+    if method not in SAMPLING_METHODS:
+      raise Wall.Error('--method must be one of %s' %
+                       ', '.join(SAMPLING_METHODS))
+  except (Wall.Error, ValueError), e:
+    print '%s\n%s' % (e, Usage())
+    return 1
+  use_design_fos = '--design-fos' in opts
+
+  context = Wall.SOURCE_CACHE.Load(args[0])
+  if not context.get('distributions'):
+    raise Wall.Error("'distributions' variable not defined in file %s" %
+                     args[0])
+  datadict, distributions = context['params'], context['distributions']
+  design_points = None
+  if method == IMPORTANCE:
+    design_points, evaluations = FindDesignPoints(datadict, distributions,
+                                                  use_design_fos)
+    print FormatDesignPoints(datadict, distributions, design_points)
+    print '(%d designs analyzed)' % evaluations
+    print
+  tally = None
+  for tally in Simulate(datadict, distributions, samples, chunk_size, seed,
+                        use_design_fos, method=method,
+                        design_points=design_points):
+    print '%10d samples: system P(failure) = %.3g  [%.3g, %.3g]' % (
+      (tally.samples,) + tally.Estimate(confidence=confidence))
+  print
+  print FormatTally(tally, confidence)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(Main(sys.argv))
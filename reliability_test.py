@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+import math, sys, unittest
+from cStringIO import StringIO
+import units, Wall
+from units import Degrees, Units
+from Wall_test import SampleParams
+
+if units.numpy is not None:
+  import numpy, reliability
+  from reliability import LogNormal, Normal, Triangular, Uniform
+
+
+@unittest.skipIf(units.numpy is None, 'numpy not installed')
+class ReliabilityTest(unittest.TestCase):
+  def Distributions(self):
+    return {
+      'phi_i' : Normal(Degrees(30), Degrees(4)),
+      'gamma_r' : Uniform(Units('110 lb/ft^3'), Units('130 lb/ft^3')),
+      'cohesion_f' : LogNormal(Units('50 lb/ft^2'), Units('15 lb/ft^2')),
+      'sigma_allowed' : Triangular(Units('80 kPa'), Units('120 kPa'),
+                                   Units('140 kPa')),
+      }
+
+  def testSample(self):
+    rng = numpy.random.RandomState(0)
+    samples = Normal(Units('120 lb/ft^3'), Units('5 lb/ft^3')).Sample(
+      rng, 100000)
+    canonical = units.Normalize(Units('120 lb/ft^3')).magnitude
+    self.assertAlmostEqual(samples.mean() / canonical, 1.0, 2)
+    samples = LogNormal(50.0, 15.0).Sample(rng, 100000)
+    self.assertAlmostEqual(samples.mean() / 50.0, 1.0, 2)
+    self.assertAlmostEqual(samples.std() / 15.0, 1.0, 1)
+    self.assertRaises(units.Error, Normal(Units('1 ft'), Units('1 ft')).Check,
+                      'gamma_r', Units('120 lb/ft^3'))
+    self.assertRaises(units.Error, Normal(30.0, 2.0).Check, 'phi_r',
+                      Degrees(30))
+
+  def testQuantile(self):
+    p = numpy.array([1e-9, 0.01, 0.3, 0.5, 0.9, 0.999])
+    u = reliability.NormalQuantile(p)
+    self.assertAlmostEqual(u[3], 0.0)
+    self.assertAlmostEqual(u[4], 1.2815516, 6)
+    for expected, actual in zip(p, reliability.NormalCDF(u)):
+      self.assertAlmostEqual(actual / expected, 1.0, 9)
+    rng = numpy.random.RandomState(0)
+    p = reliability.LatinHypercube(rng, 1000)
+    self.assertEqual(sorted((p * 1000).astype(int)), range(1000))
+    for distribution in self.Distributions().values():
+      samples = distribution.Sample(rng, 100000)
+      quantiles = distribution.Quantile(numpy.array([0.1, 0.5, 0.9]))
+      for q, fraction in zip(quantiles, (0.1, 0.5, 0.9)):
+        self.assertAlmostEqual((samples < q).mean(), fraction, 2)
+      self.assertAlmostEqual(distribution.FromStandardNormal(0.0),
+                             quantiles[1])
+
+  def testWilsonInterval(self):
+    self.assertAlmostEqual(reliability.WilsonInterval(0, 100)[1], 0.037, 3)
+    low, high = reliability.WilsonInterval(50, 100)
+    self.assertAlmostEqual(low + high, 1.0)
+    self.assertRaises(Wall.Error, reliability.WilsonInterval, 1, 10, 0.5)
+
+  def testMatchesScalarAnalyses(self):
+    base = SampleParams()
+    distributions = self.Distributions()
+    tallies = [(t.samples, dict(t.failures)) for t in reliability.Simulate(
+      base, distributions, samples=250, chunk_size=100, seed=3,
+      use_design_fos=True)]
+    self.assertEqual([samples for samples, _ in tallies], [100, 200, 250])
+
+    # Redraw the same samples, and analyze them one design at a time
+    rng = numpy.random.RandomState(3)
+    analyzer = Wall.FastAnalyzer()
+    failures = {}
+    for n in (100, 100, 50):
+      columns = [(name, distribution.Sample(rng, n))
+                 for name, distribution in sorted(distributions.items())]
+      for i in range(n):
+        design = dict(base)
+        for name, values in columns:
+          if isinstance(base[name], Degrees):
+            design[name] = Degrees(math.degrees(values[i]))
+          else:
+            design[name] = Units(units.Normalize(base[name]))
+            design[name].magnitude = values[i]
+        failed = False
+        for name, actual, desired in analyzer.Analyze(design):
+          if actual < desired:
+            failures[name] = failures.get(name, 0) + 1
+            failed = True
+        if failed:
+          failures['System'] = failures.get('System', 0) + 1
+    self.assertTrue(failures['System'] > 0)
+    self.assertEqual(dict([(name, count) for name, count
+                           in tallies[-1][1].items() if count]), failures)
+
+  def Estimate(self, samples, **kwargs):
+    for tally in reliability.Simulate(
+        SampleParams(), self.Distributions(), samples=samples,
+        chunk_size=samples, seed=1, **kwargs):
+      pass
+    return tally.Estimate()
+
+  def testVarianceReduction(self):
+    p, low, high = self.Estimate(100000)
+    self.assertTrue(0.001 < p < 0.1)
+    for method in ('latin-hypercube', 'importance'):
+      estimate = self.Estimate(10000, method=method)
+      self.assertTrue(estimate[1] < high and low < estimate[2],
+                      (method, estimate, (p, low, high)))
+    # Importance sampling is also more precise, with a tenth of the samples
+    self.assertTrue(estimate[2] - estimate[1] < high - low)
+
+  def testRareFailure(self):
+    # Far enough into the tail that 5000 plain Monte Carlo samples would
+    # find no failures at all
+    base = SampleParams()
+    distributions = {'phi_i' : Normal(Degrees(30), Degrees(3))}
+    [(name, point, beta)], evaluations = reliability.FindDesignPoints(
+      base, distributions, analysis_classes=[Wall.SlidingAnalysis])
+    self.assertTrue(4 < beta < 6, beta)
+    self.assertTrue(evaluations < 100)
+    design = dict(base)
+    design['phi_i'] = reliability.Value(
+      base['phi_i'], distributions['phi_i'].FromStandardNormal(point[0]))
+    [(_, actual, _)] = Wall.FastAnalyzer([Wall.SlidingAnalysis]).Analyze(design)
+    self.assertAlmostEqual(actual, 1.0, 3)
+
+    form = reliability.NormalCDF(-beta)
+    for tally in reliability.Simulate(
+        base, distributions, samples=5000, seed=1, use_design_fos=False,
+        analysis_classes=[Wall.SlidingAnalysis], method='importance'):
+      pass
+    p, low, high = tally.Estimate()
+    # One param, with a monotonic limit state, so FORM is nearly exact
+    self.assertTrue(low < form < high, (form, low, high))
+    self.assertTrue(high < 2 * low)
+
+  def testMainRejectsBadOptions(self):
+    for option in ('--samples=0', '--chunk=-5', '--confidence=0.5',
+                   '--method=nonesuch', '--samples=many'):
+      stdout, sys.stdout = sys.stdout, StringIO()
+      try:
+        status = reliability.Main(['reliability.py', option,
+                                   'sample-design/DesignParams-AllanBlock'])
+        output = sys.stdout.getvalue()
+      finally:
+        sys.stdout = stdout
+      self.assertEqual(status, 1)
+      self.assertTrue(reliability.Usage() in output, option)
+
+
+if __name__ == '__main__':
+  unittest.main()
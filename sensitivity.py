@@ -0,0 +1,145 @@
+#!/usr/bin/python
+
+"""
+Sensitivity analysis: how much each factor of safety changes with each input
+parameter, to show which inputs a design is most sensitive to.
+
+The derivatives are computed by forward-mode automatic differentiation, in a
+single analysis of the design: each chosen input is seeded with a units.Dual
+magnitude, and the derivatives are carried through the derived parameters
+and every failure analysis by the same Units arithmetic that computes the
+factors of safety.  Unlike finite differences, this takes no extra analyses
+per parameter, and the derivatives are exact, not approximations.
+
+For each failure mode, the parameters are listed in order of the size of
+their elasticity -- the percent change in the FOS per percent change in the
+parameter -- since the derivatives themselves are in different units.
+Parameters whose value is zero (e.g. a level backfill slope i) have no
+elasticity, so they are listed after the others, in order of the size of
+their derivatives.  Derivatives are per unit of the parameter as the design
+gives it (per degree, for angles).  Parameters the FOS doesn't depend on are
+left out.
+
+Usage: sensitivity.py design-params-file [name]...
+   or: Wall.py sensitivity design-params-file [name]...
+
+Each name is an input parameter to differentiate with respect to; by default,
+every parameter with units (including angles) except those in
+DISCRETE_PARAMS.  The wall height must be a whole number of courses of
+blocks, which their derivatives ignore, so if they are named, they are
+flagged in the table.
+"""
+
+import sys
+
+import units, Wall
+from units import Degrees, Units
+
+# Params that can only change in steps (the wall height must be a whole number
+# of courses of blocks), for which a derivative is only a rough guide.
+DISCRETE_PARAMS = ('H', 'block_height')
+
+
+def DefaultParams(datadict):
+  """Returns the names of the params in datadict that have units (Units or
+  Degrees values), other than DISCRETE_PARAMS, in sorted order."""
+  return sorted([name for name, value in datadict.items()
+                 if isinstance(value, Units) and name not in DISCRETE_PARAMS])
+
+def Magnitude(value):
+  """Returns a param's value as a number, in the units the design gives it
+  (degrees, for angles)."""
+  if isinstance(value, Units):
+    return value.magnitude
+  return float(value)
+
+
+def Sensitivities(datadict, names=None, analysis_classes=Wall.ALL_ANALYSES):
+  """
+  Args:
+    datadict (dict) - the design's input parameters
+    names (list) - params to differentiate with respect to (default:
+      DefaultParams)
+    analysis_classes - FailureAnalysis subclasses to run
+  Returns: list of (analysis name, actual FOS, desired FOS, dict mapping each
+    of names to the derivative of the actual FOS with respect to it), one per
+    analysis class
+  """
+  if names is None:
+    names = DefaultParams(datadict)
+  seeded = dict(datadict)
+  for name in names:
+    if name not in datadict:
+      raise Wall.Error('Unknown parameter "%s"' % name)
+    seeded[name] = units.Seed(datadict[name], name)
+  results = []
+  for analysis in Wall.AnalysisScheduler(analysis_classes).Run(
+      Wall.InputParams(seeded), latex=False):
+    fos, derivatives = units.Derivatives(analysis.params.actual_fos)
+    results.append((analysis.name, fos, analysis.desired_fos,
+                    dict([(name, derivatives.get(name, 0.0))
+                          for name in names])))
+  return results
+
+
+def Elasticity(datadict, name, fos, derivative):
+  """Returns the relative change in fos per relative change in the param, or
+  None if the param's value is zero."""
+  if not Magnitude(datadict[name]):
+    return None
+  return derivative * Magnitude(datadict[name]) / fos
+
+def PerUnit(value):
+  """Returns the units that a derivative with respect to value is per, e.g.
+  'lb / ft^3'."""
+  if isinstance(value, Degrees):
+    return 'deg'
+  if isinstance(value, Units):
+    return units.UnitSuffix(value.dim, as_latex=False).strip()
+  return ''
+
+def FormatSensitivities(datadict, results):
+  lines = []
+  flagged = False
+  for analysis_name, fos, desired, derivatives in results:
+    lines.append('%s: FOS %.3f (desired %.2f)' % (analysis_name, fos,
+                                                   desired))
+    rows = []
+    for name, derivative in derivatives.items():
+      if derivative:
+        elasticity = Elasticity(datadict, name, fos, derivative)
+        # params at zero go last, in order of their derivatives
+        rows.append((elasticity is None, -abs(elasticity or derivative),
+                     name, elasticity))
+    lines.append('  %-16s %16s  %-16s %10s' % ('param', 'dFOS/dparam', 'per',
+                                                'elasticity'))
+    for _, _, name, elasticity in sorted(rows):
+      label = name
+      if name in DISCRETE_PARAMS:
+        label, flagged = name + ' *', True
+      lines.append('  %-16s %16.4g  %-16s %10s' % (
+        label, derivatives[name], PerUnit(datadict[name]),
+        elasticity is None and '(at zero)' or '%.3f' % elasticity))
+    lines.append('')
+  if flagged:
+    lines.append('* ignores that the wall height must be a whole number of '
+                 'courses of blocks')
+  return '\n'.join(lines)
+
+
+def Usage():
+  return __doc__
+
+
+def Main(argv):
+  if len(argv) < 2 or argv[1] in ('-h', '--help'):
+    print Usage()
+    return 1
+  datadict = Wall.SOURCE_CACHE.Load(argv[1])['params']
+  print FormatSensitivities(datadict,
+                            Sensitivities(datadict, argv[2:] or None))
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(Main(sys.argv))
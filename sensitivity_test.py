@@ -0,0 +1,83 @@
+#!/usr/bin/python
+
+import unittest
+import sensitivity, units, Wall
+from units import Degrees, Units
+from Wall_test import SampleParams
+
+
+class SensitivityTest(unittest.TestCase):
+  def FiniteDifference(self, base, name, step):
+    """Returns the central difference estimate of each FOS's derivative."""
+    analyzer = Wall.FastAnalyzer()
+    fos = []
+    for change in (step, -step):
+      design = dict(base)
+      if isinstance(base[name], Degrees):
+        design[name] = Degrees(base[name].magnitude + change)
+      else:
+        design[name] = Units(base[name])
+        design[name].magnitude += change
+      fos.append([actual for _, actual, _ in analyzer.Analyze(design)])
+    return [(plus - minus) / (2 * step) for plus, minus in zip(*fos)]
+
+  def testMatchesFiniteDifferences(self):
+    base = SampleParams()
+    base['sigma_allowed'] = Units('120 kPa')
+    names = ['L_g', 'phi_i', 'phi_r', 'gamma_r', 'q', 'sigma_allowed',
+             'cohesion_f', 'LTADS']
+    results = sensitivity.Sensitivities(base, names)
+    self.assertEqual(len(results), len(Wall.ALL_ANALYSES))
+    for name in names:
+      step = 1e-4 * max(1.0, sensitivity.Magnitude(base[name]))
+      for (analysis, _, _, derivatives), estimate in zip(
+          results, self.FiniteDifference(base, name, step)):
+        self.assertAlmostEqual(derivatives[name], estimate, 6,
+                               (analysis, name, derivatives[name], estimate))
+    # sigma_allowed is only used by the bearing pressure analysis, in kPa
+    self.assertEqual([bool(r[3]['sigma_allowed']) for r in results],
+                     [False, False, True, False, False, False, False])
+    self.assertTrue(results[2][3]['sigma_allowed'] > 0.01)
+
+  def testFloatParams(self):
+    # The same derivatives come out of the plain-float path
+    base = SampleParams()
+    seeded = dict(base)
+    for name in sensitivity.DefaultParams(base):
+      seeded[name] = units.Seed(base[name], name)
+    results = sensitivity.Sensitivities(base)
+    for (_, fos, _, derivatives), analysis in zip(
+        results, Wall.ANALYSIS_SCHEDULER.Run(Wall.FloatParams(seeded),
+                                             latex=False)):
+      value, float_derivatives = units.Derivatives(analysis.params.actual_fos)
+      self.assertAlmostEqual(value, fos)
+      for name, derivative in float_derivatives.items():
+        self.assertAlmostEqual(derivative, derivatives[name])
+
+  def testFormat(self):
+    base = SampleParams()
+    text = sensitivity.FormatSensitivities(
+      base, sensitivity.Sensitivities(base, ['phi_i', 'B_b'],
+                                      [Wall.SlidingAnalysis]))
+    self.assertTrue(text.startswith('Sliding Analysis: FOS 2.464'))
+    self.assertTrue(' deg ' in text)
+    self.assertFalse('B_b' in text)       # sliding doesn't depend on it
+    self.assertRaises(Wall.Error, sensitivity.Sensitivities, base, ['nope'])
+
+  def testZeroAndDiscreteParams(self):
+    base = SampleParams()
+    defaults = sensitivity.DefaultParams(base)
+    self.assertTrue('i' in defaults and 'L_g' in defaults)
+    self.assertFalse('H' in defaults or 'block_height' in defaults)
+    text = sensitivity.FormatSensitivities(
+      base, sensitivity.Sensitivities(base, ['i', 'q', 'H'],
+                                      [Wall.SlidingAnalysis]))
+    rows = [line.split()[0] for line in text.split('\n')[2:5]]
+    self.assertEqual(rows, ['H', 'q', 'i'])    # i is zero, so last
+    self.assertTrue(text.split('\n')[4].endswith('(at zero)'))
+    self.assertTrue(' H * ' in text)
+    self.assertTrue(text.endswith('courses of blocks'))
+
+
+if __name__ == '__main__':
+  unittest.main()
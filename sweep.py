@@ -0,0 +1,219 @@
+#!/usr/bin/python
+
+"""
+Parameter sweeps: runs all the failure analyses on every combination of
+values along some axes (e.g. H, L_g, q, beta, phi_i, geogrid spacing) around
+a base design, spread over a pool of worker processes.
+
+Usage: sweep.py [--processes=N] [--chunksize=N] [--screen] design-params-file
+                axis...
+   or: Wall.py sweep [options] design-params-file axis...
+
+Each axis is one of
+   name=v1,v2,...           e.g. q=0,250,500
+   name=start:stop:step     e.g. L_g=4:8:0.5  (stop is included)
+giving values in the units the base design uses for that parameter (degrees
+for angles).  The axis "geogrid_spacing" sets geogrid_levels to every Nth
+course, starting from the base design's lowest geogrid level.
+
+With --screen, each combination is only checked for whether it passes, using
+a Wall.Screener, and the table shows the analysis that rejected it instead of
+every factor of safety.
+"""
+
+import getopt, multiprocessing, sys
+
+import units, Wall
+from units import Degrees, Units
+
+GEOGRID_SPACING = 'geogrid_spacing'
+
+
+def ParseAxis(spec):
+  """
+  Args: spec (str) - an axis definition, e.g. 'q=0,250,500' or 'L_g=4:8:0.5'
+  Returns: (param name, list of values)
+  """
+  if '=' not in spec:
+    raise Wall.Error('Bad axis "%s": expected name=values' % spec)
+  name, values = spec.split('=', 1)
+  if ':' in values:
+    start, stop, step = [float(v) for v in values.split(':')]
+    if step <= 0:
+      raise Wall.Error('Bad axis "%s": step must be positive' % spec)
+    n = int((stop - start) / step + 1e-9) + 1
+    values = [start + k * step for k in range(n)]
+  else:
+    values = [float(v) for v in values.split(',')]
+  if name == GEOGRID_SPACING and [v for v in values if v < 1 or v != int(v)]:
+    raise Wall.Error('Bad axis "%s": %s must be whole numbers of courses, at '
+                     'least 1' % (spec, GEOGRID_SPACING))
+  return name, values
+
+
+def AxisValue(base, value):
+  """Returns value as a parameter like base: a Units object in base's units,
+  a Degrees object, or a plain number."""
+  if isinstance(base, Degrees):
+    return Degrees(value, ndigits=base.ndigits)
+  if isinstance(base, Units):
+    result = Units(base)
+    result.magnitude = value
+    return result
+  return value
+
+
+def Design(datadict, names, combination):
+  """Returns a copy of the design datadict with the named params set to the
+  values in combination."""
+  design = dict(datadict)
+  for name, value in zip(names, combination):
+    if name == GEOGRID_SPACING:
+      continue
+    if name not in datadict:
+      raise Wall.Error('Unknown parameter "%s"' % name)
+    design[name] = AxisValue(datadict[name], value)
+  if GEOGRID_SPACING in names:
+    spacing = int(combination[list(names).index(GEOGRID_SPACING)])
+    n_courses = int(0.5 + float(design['H'] / design['block_height']))
+    design['geogrid_levels'] = range(min(datadict['geogrid_levels']),
+                                     n_courses, spacing)
+  return design
+
+
+def Combinations(axes):
+  """Returns every combination of the axes' values, as tuples, varying the
+  last axis fastest."""
+  combinations = [()]
+  for name, values in axes:
+    combinations = [c + (v,) for c in combinations for v in values]
+  return combinations
+
+
+# State of each worker process, set by _InitWorker.
+_worker = {}
+
+def _InitWorker(datadict, names, screen=False):
+  _worker['datadict'] = datadict
+  _worker['names'] = names
+  if screen:
+    _worker['analyze'] = Wall.Screener().Screen
+  else:
+    _worker['analyze'] = Wall.FastAnalyzer().Analyze
+
+def _AnalyzeCombination(combination):
+  try:
+    design = Design(_worker['datadict'], _worker['names'], combination)
+    return _worker['analyze'](design)
+  except (Wall.Error, units.Error), e:
+    return str(e).replace('\n', ' ')
+  except (ValueError, ArithmeticError), e:
+    # e.g. a backfill slope too steep for the Coulomb coefficient
+    return '%s: %s' % (e.__class__.__name__, e)
+
+
+def Sweep(datadict, axes, processes=None, chunksize=None, screen=False):
+  """
+  Args:
+    datadict (dict) - the base design's input parameters
+    axes (list) - (param name, list of values) pairs, as from ParseAxis
+    processes (int) - number of worker processes (default: one per CPU);
+      1 runs everything in this process
+    chunksize (int) - combinations sent to a worker at a time (default: about
+      four chunks per worker), to amortize the cost of pickling
+    screen (bool) - if true, only find out whether each combination passes
+  Returns: list of (combination, results) pairs, in the order of
+    Combinations(axes).  Results are as from FastAnalyzer.Analyze, or an error
+    message if the combination isn't a valid design.  If screen is true,
+    results are instead as from Screener.Screen: the name of the analysis
+    that rejected the combination, or None if it passes.
+  """
+  names = tuple([name for name, values in axes])
+  combinations = Combinations(axes)
+  if processes is None:
+    processes = multiprocessing.cpu_count()
+  if processes == 1:
+    _InitWorker(datadict, names, screen)
+    return zip(combinations, map(_AnalyzeCombination, combinations))
+
+  if chunksize is None:
+    chunksize = max(1, len(combinations) // (4 * processes))
+  pool = multiprocessing.Pool(processes, _InitWorker,
+                              (datadict, names, screen))
+  try:
+    results = pool.map(_AnalyzeCombination, combinations, chunksize)
+  finally:
+    pool.close()
+    pool.join()
+  return zip(combinations, results)
+
+
+def FormatTable(axes, rows, screen=False):
+  """Returns the results of Sweep as a text table, with one column per axis,
+  one per analysis (marked * if the FOS is below the design FOS), and an
+  overall PASS or FAIL.  If screen is true, the results are from a screening
+  Sweep, and each FAIL is followed by the analysis that rejected it."""
+  names = [name for name, values in axes]
+  if screen:
+    lines = [' '.join(['%10s' % name for name in names] + ['  result'])]
+    for combination, rejection in rows:
+      line = ['%10g' % value for value in combination]
+      line.append(rejection and '  FAIL (%s)' % rejection or '  PASS')
+      lines.append(' '.join(line))
+    return '\n'.join(lines)
+
+  modes = None
+  for combination, results in rows:
+    if not isinstance(results, str):
+      modes = [name.replace(' Analysis', '') for name, _, _ in results]
+      break
+  header = ['%10s' % name for name in names]
+  header += ['%16s' % mode[:16] for mode in modes or ()] + ['  result']
+  lines = [' '.join(header)]
+  for combination, results in rows:
+    line = ['%10g' % value for value in combination]
+    if isinstance(results, str):
+      line.append('  ERROR: %s' % results)
+    else:
+      failed = False
+      for name, actual, desired in results:
+        passed = actual >= desired
+        failed = failed or not passed
+        line.append('%15.2f%s' % (actual, passed and ' ' or '*'))
+      line.append(failed and '  FAIL' or '  PASS')
+    lines.append(' '.join(line))
+  return '\n'.join(lines)
+
+
+def Usage():
+  return __doc__
+
+
+def Main(argv):
+  try:
+    opts, args = getopt.getopt(argv[1:], '', ['processes=', 'chunksize=',
+                                              'screen', 'help'])
+  except getopt.GetoptError, e:
+    print '%s\n%s' % (e, Usage())
+    return 1
+  if len(args) < 2 or ('--help', '') in opts:
+    print Usage()
+    return 1
+  opts = dict(opts)
+  processes = opts.get('--processes') and int(opts['--processes'])
+  chunksize = opts.get('--chunksize') and int(opts['--chunksize'])
+
+  datadict = Wall.SOURCE_CACHE.Load(args[0])['params']
+  try:
+    axes = [ParseAxis(spec) for spec in args[1:]]
+  except (Wall.Error, ValueError), e:
+    print '%s\n%s' % (e, Usage())
+    return 1
+  screen = '--screen' in opts
+  rows = Sweep(datadict, axes, processes, chunksize, screen)
+  print FormatTable(axes, rows, screen)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(Main(sys.argv))
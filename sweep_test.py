@@ -0,0 +1,68 @@
+#!/usr/bin/python
+
+import unittest
+import sweep, Wall
+from Wall_test import SampleParams
+
+
+class SweepTest(unittest.TestCase):
+  def testParseAxis(self):
+    self.assertEqual(sweep.ParseAxis('q=0,250'), ('q', [0.0, 250.0]))
+    self.assertEqual(sweep.ParseAxis('L_g=4:6:0.5'),
+                     ('L_g', [4.0, 4.5, 5.0, 5.5, 6.0]))
+    self.assertRaises(Wall.Error, sweep.ParseAxis, 'L_g')
+    self.assertEqual(sweep.ParseAxis('geogrid_spacing=1:3:1'),
+                     ('geogrid_spacing', [1.0, 2.0, 3.0]))
+    for spec in ('geogrid_spacing=0', 'geogrid_spacing=-1,2',
+                 'geogrid_spacing=1.5'):
+      self.assertRaises(Wall.Error, sweep.ParseAxis, spec)
+
+  def testDesign(self):
+    base = SampleParams()
+    design = sweep.Design(base, ('beta', 'q', 'geogrid_spacing'),
+                          (80.0, 100.0, 3))
+    self.assertEqual(design['beta'].magnitude, 80.0)
+    self.assertEqual(design['q'].dim, base['q'].dim)
+    self.assertEqual(design['q'].magnitude, 100.0)
+    self.assertEqual(design['geogrid_levels'], [1, 4, 7, 10, 13])
+    self.assertEqual(base['q'].magnitude, 250.0)
+    self.assertRaises(Wall.Error, sweep.Design, base, ('nonesuch',), (1.0,))
+
+  def testSweep(self):
+    axes = [('L_g', [5.0, 6.0]), ('H', [9.525, 9.0])]
+    rows = sweep.Sweep(SampleParams(), axes, processes=1)
+    self.assertEqual([row[0] for row in rows],
+                     [(5.0, 9.525), (5.0, 9.0), (6.0, 9.525), (6.0, 9.0)])
+    expected = Wall.FastAnalyzer().Analyze(SampleParams())
+    self.assertEqual(rows[2][1], expected)
+    self.assertTrue('integer multiple' in rows[3][1])
+
+    self.assertEqual(sweep.Sweep(SampleParams(), axes, processes=2,
+                                 chunksize=1), rows)
+    table = sweep.FormatTable(axes, rows).split('\n')
+    self.assertEqual(len(table), 5)
+    self.assertTrue(table[3].endswith('PASS'))
+    self.assertTrue('ERROR' in table[4])
+
+  def testArithmeticErrorsArePerCombination(self):
+    rows = sweep.Sweep(SampleParams(), [('i', [0.0, 30.0])], processes=1)
+    self.assertEqual(rows[0][1], Wall.FastAnalyzer().Analyze(SampleParams()))
+    self.assertTrue(rows[1][1].startswith('ValueError: '))
+    self.assertTrue('ERROR: ValueError' in sweep.FormatTable(
+        [('i', [0.0, 30.0])], rows).split('\n')[2])
+
+  def testScreen(self):
+    axes = [('L_g', [4.0, 6.0]), ('H', [9.525, 9.0])]
+    rows = sweep.Sweep(SampleParams(), axes, processes=1, screen=True)
+    rejections = [row[1] for row in rows]
+    self.assertTrue(rejections[0] in ('Bearing Pressure Analysis',
+                                      'Pullout Of Soil Analysis'))
+    self.assertEqual(rejections[1:], ['Param sanity check', None,
+                                      'Param sanity check'])
+    table = sweep.FormatTable(axes, rows, screen=True).split('\n')
+    self.assertTrue(table[1].endswith('FAIL (%s)' % rejections[0]))
+    self.assertTrue(table[3].endswith('PASS'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,11 +1,419 @@
 #!/usr/bin/python
 
-import math, re
+import collections, math, re
+
+try:
+  import numpy
+except ImportError:
+  numpy = None    # UnitsArray and DegreesArray need numpy; Units doesn't
 
 class Error(Exception): pass
 
 
+class LRUCache(object):
+  """
+  Bounded least-recently-used cache with hit/miss counters.
+
+  The counters are public so that callers running large parameter sweeps can
+  see how well a given maxsize is working (see Stats()).
+  """
+  def __init__(self, maxsize=256):
+    self.maxsize = maxsize
+    self.hits = 0
+    self.misses = 0
+    self._data = collections.OrderedDict()
+
+  def __len__(self):
+    return len(self._data)
+
+  def __contains__(self, key):
+    return key in self._data
+
+  def Get(self, key, default=None):
+    """Return the value cached for key (counting a hit), or default (counting
+    a miss)."""
+    try:
+      value = self._data.pop(key)
+    except KeyError:
+      self.misses += 1
+      return default
+    self._data[key] = value   # re-insert as most recently used
+    self.hits += 1
+    return value
+
+  def Put(self, key, value):
+    """Cache value under key, evicting the least recently used entries if the
+    cache is full."""
+    self._data.pop(key, None)
+    self._data[key] = value
+    while len(self._data) > self.maxsize:
+      self._data.popitem(last=False)
+    return value
+
+  def Resize(self, maxsize):
+    self.maxsize = maxsize
+    while len(self._data) > self.maxsize:
+      self._data.popitem(last=False)
+
+  def Clear(self):
+    """Empty the cache and reset the hit/miss counters."""
+    self._data.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def Stats(self):
+    return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data),
+            'maxsize': self.maxsize}
+
+
+# Registry of base units.  A dimension is stored as a tuple of integer
+# exponents indexed by this table -- e.g. with BASE_UNITS == ['ft', 'lb'],
+# lb/ft^3 is (-3, 1) -- with trailing zeros dropped, so dimensionless is ().
+# Dimension tuples are interned, so equal dimensions are normally the very same
+# object and comparing them is an identity check.
+BASE_UNITS = []
+_BASE_UNIT_INDEX = {}
+_DIMENSIONS = {}    # interned dimension tuples
+_PRODUCTS = {}      # (dim1, dim2) -> dimension of a product
+_POWERS = {}        # (dim, n) -> dimension of dim**n
+
+def RegisterBaseUnit(name):
+  """
+  Args: name (str) - a base unit name, e.g. 'ft'
+  Returns: the unit's index into BASE_UNITS (registering it if it is new)
+  """
+  try:
+    return _BASE_UNIT_INDEX[name]
+  except KeyError:
+    BASE_UNITS.append(name)
+    _BASE_UNIT_INDEX[name] = len(BASE_UNITS) - 1
+    return _BASE_UNIT_INDEX[name]
+
+def _Intern(exponents):
+  exponents = list(exponents)
+  while exponents and exponents[-1] == 0:
+    exponents.pop()
+  dim = tuple(exponents)
+  return _DIMENSIONS.setdefault(dim, dim)
+
+def MakeDimension(exponents_by_unit):
+  """
+  Args: exponents_by_unit (dict) - unit names to exponents, e.g. {'ft': -2}
+  Returns: the interned dimension tuple for those units
+  """
+  exponents = []
+  for unit, exponent in exponents_by_unit.items():
+    index = RegisterBaseUnit(unit)
+    if index >= len(exponents):
+      exponents.extend([0] * (index + 1 - len(exponents)))
+    exponents[index] += exponent
+  return _Intern(exponents)
+
+def DimensionAsDict(dim):
+  """
+  Args: dim (tuple) - a dimension tuple
+  Returns: dict mapping unit names to (nonzero) exponents, e.g. {'ft': -2}
+  """
+  return dict([(BASE_UNITS[i], exponent) for i, exponent in enumerate(dim)
+               if exponent])
+
+def MultiplyDimensions(dim1, dim2):
+  """Returns the dimension of the product of quantities of dim1 and dim2."""
+  try:
+    return _PRODUCTS[dim1, dim2]
+  except KeyError:
+    pass
+  if len(dim1) < len(dim2):
+    dim1, dim2 = dim2, dim1
+  product = _Intern([exponent + (i < len(dim2) and dim2[i] or 0)
+                     for i, exponent in enumerate(dim1)])
+  _PRODUCTS[dim1, dim2] = _PRODUCTS[dim2, dim1] = product
+  return product
+
+def PowerOfDimension(dim, n):
+  """Returns the dimension of a quantity of dimension dim raised to power n."""
+  try:
+    return _POWERS[dim, n]
+  except KeyError:
+    result = _POWERS[dim, n] = _Intern([exponent * n for exponent in dim])
+    return result
+
+DIMENSIONLESS = _Intern(())
+RegisterBaseUnit('ft')
+RegisterBaseUnit('lb')
+
+
+# (radians, sin, cos, tan) of angles already seen, keyed by the angle in
+# degrees.  See Degrees.sin() etc.
+TRIG_CACHE = LRUCache(maxsize=1024)
+
+# Unit suffixes (e.g. r'\, \mbox{lb} / \mbox{ft}') already formatted, keyed by
+# (dimension, as_latex, unit_order).  See UnitSuffix().
+SUFFIX_CACHE = LRUCache(maxsize=512)
+_SORT_RANKS = {}
+
+# Unit strings (e.g. 'lb / ft^3') already parsed into dimension tuples.  Each
+# distinct string is parsed once; Units construction looks it up here.
+PARSE_CACHE = LRUCache(maxsize=512)
+
+_MAGNITUDE_RE = re.compile(r'[-.0-9]+')
+_WHITESPACE_RE = re.compile(r'\s')
+_OPERATOR_RE = re.compile(r'[/*]')
+
+
+def _SortKeyFunction(unit_order):
+  """Returns a sort key for unit names: listed units sort in the order listed,
+  unlisted units sort last (alphabetically)."""
+  if unit_order is None:
+    return None
+  ranks = _SORT_RANKS.get(unit_order)
+  if ranks is None:
+    ranks = _SORT_RANKS[unit_order] = dict(
+      [(unit, i) for i, unit in reversed(list(enumerate(unit_order)))])
+  unlisted = len(unit_order)
+  return lambda unit: (ranks.get(unit, unlisted), unit)
+
+def UnitSuffix(dim, as_latex=True, unit_order=None):
+  """
+  Args:
+    dim (tuple) - a dimension tuple
+    as_latex (bool) - LaTeX markup if true, else plain text
+    unit_order (list or tuple) - unit names in the order they should be shown
+  Returns: the text that follows the magnitude when displaying a quantity of
+    dimension dim, e.g. ' lb / ft^2'.  Results are cached in SUFFIX_CACHE.
+  """
+  if unit_order is not None:
+    unit_order = tuple(unit_order)
+  key = (dim, as_latex, unit_order)
+  suffix = SUFFIX_CACHE.Get(key)
+  if suffix is not None:
+    return suffix
+
+  numerator_elts, denominator_elts = [], []
+  for element, exponent in DimensionAsDict(dim).items():
+    if exponent > 0:
+      elts = numerator_elts
+    else:
+      elts = denominator_elts
+      exponent = -exponent
+    if exponent != 1:
+      if as_latex:
+        elts.append((element, r'\mbox{%s} \ensuremath{{\!}^%d}' %
+                     (element, exponent)))
+      else:
+        elts.append((element, '%s^%d' % (element, exponent)))
+    elif as_latex:
+      elts.append((element, r'\mbox{%s}' % element))
+    else:
+      elts.append((element, element))
+  # sort numerator_elts and denominator_elts by unit_order
+  sort_key = _SortKeyFunction(unit_order)
+  numerator_elts.sort(key=sort_key and (lambda elt: sort_key(elt[0])))
+  denominator_elts.sort(key=sort_key and (lambda elt: sort_key(elt[0])))
+
+  if as_latex:
+    separator = r'\,'
+  else:
+    separator = ''
+  if denominator_elts:
+    suffix = '%s %s / %s' % (separator,
+      ' * '.join([data for sortkey, data in numerator_elts]),
+      ' / '.join([data for sortkey, data in denominator_elts]))
+  else:
+    suffix = '%s %s' % (separator,
+      ' * '.join([data for sortkey, data in numerator_elts]))
+  return SUFFIX_CACHE.Put(key, suffix)
+
+
+def _Combine(a, x, b, y):
+  """Returns the derivatives of a*f + b*g, given those of f and g (x and y,
+  dicts mapping param names to derivatives)."""
+  result = dict([(name, a * d) for name, d in x.iteritems()])
+  for name, d in y.iteritems():
+    result[name] = result.get(name, 0.0) + b * d
+  return result
+
+def _Scale(a, x):
+  return dict([(name, a * d) for name, d in x.iteritems()])
+
+
+class Dual(object):
+  """
+  A number that carries its derivatives with respect to some input params,
+  for forward-mode automatic differentiation: value, and derivatives, a dict
+  mapping each param name to the derivative of value with respect to it.
+  Arithmetic, sin/cos/tan/exp below, and ** propagate the derivatives by the
+  chain rule; comparisons, float() and formatting use the value alone.
+
+  A Dual can be the magnitude of a Units or Degrees object (see Seed), or
+  take the place of a float in FloatParams, so the same formulas compute
+  derivatives along with values.  (Duals are not cached, e.g. in TRIG_CACHE,
+  since equal values may have different derivatives.)
+  """
+  __slots__ = ('value', 'derivatives')
+  __hash__ = None
+
+  def __init__(self, value, derivatives=None):
+    self.value = float(value)
+    self.derivatives = derivatives or {}
+
+  def __add__(self, other):
+    if isinstance(other, Dual):
+      return Dual(self.value + other.value,
+                  _Combine(1.0, self.derivatives, 1.0, other.derivatives))
+    if isinstance(other, (int, long, float)):
+      return Dual(self.value + other, self.derivatives)
+    return NotImplemented
+
+  __radd__ = __add__
+
+  def __neg__(self):
+    return Dual(-self.value, _Scale(-1.0, self.derivatives))
+
+  def __pos__(self):
+    return self
+
+  def __sub__(self, other):
+    if isinstance(other, Dual):
+      return Dual(self.value - other.value,
+                  _Combine(1.0, self.derivatives, -1.0, other.derivatives))
+    if isinstance(other, (int, long, float)):
+      return Dual(self.value - other, self.derivatives)
+    return NotImplemented
+
+  def __rsub__(self, other):
+    if isinstance(other, (int, long, float)):
+      return Dual(other - self.value, _Scale(-1.0, self.derivatives))
+    return NotImplemented
+
+  def __mul__(self, other):
+    if isinstance(other, Dual):
+      return Dual(self.value * other.value,
+                  _Combine(other.value, self.derivatives,
+                           self.value, other.derivatives))
+    if isinstance(other, (int, long, float)):
+      return Dual(self.value * other, _Scale(other, self.derivatives))
+    return NotImplemented
+
+  __rmul__ = __mul__
+
+  def __div__(self, other):
+    if isinstance(other, Dual):
+      quotient = self.value / other.value
+      return Dual(quotient, _Combine(1.0 / other.value, self.derivatives,
+                                     -quotient / other.value,
+                                     other.derivatives))
+    if isinstance(other, (int, long, float)):
+      return Dual(self.value / other, _Scale(1.0 / other, self.derivatives))
+    return NotImplemented
+
+  def __rdiv__(self, other):
+    if isinstance(other, (int, long, float)):
+      quotient = other / self.value
+      return Dual(quotient, _Scale(-quotient / self.value, self.derivatives))
+    return NotImplemented
+
+  __truediv__ = __div__
+  __rtruediv__ = __rdiv__
+
+  def __pow__(self, other):
+    if not isinstance(other, (int, long, float)):
+      return NotImplemented
+    value = self.value ** other
+    if not other:
+      return Dual(value)
+    return Dual(value, _Scale(other * self.value ** (other - 1),
+                              self.derivatives))
+
+  def __abs__(self):
+    if self.value < 0:
+      return -self
+    return self
+
+  def _Value(self, other):
+    if isinstance(other, Dual):
+      return other.value
+    return other
+
+  def __lt__(self, other):
+    return self.value < self._Value(other)
+  def __le__(self, other):
+    return self.value <= self._Value(other)
+  def __gt__(self, other):
+    return self.value > self._Value(other)
+  def __ge__(self, other):
+    return self.value >= self._Value(other)
+  def __eq__(self, other):
+    return self.value == self._Value(other)
+  def __ne__(self, other):
+    return self.value != self._Value(other)
+
+  def __nonzero__(self):
+    return self.value != 0
+
+  def __float__(self):
+    return self.value
+
+  def __int__(self):
+    return int(self.value)
+
+  def Apply(self, value, derivative):
+    """Returns f(self), given value = f(self.value) and derivative =
+    f'(self.value)."""
+    return Dual(value, _Scale(derivative, self.derivatives))
+
+  def sin(self):
+    return self.Apply(math.sin(self.value), math.cos(self.value))
+
+  def cos(self):
+    return self.Apply(math.cos(self.value), -math.sin(self.value))
+
+  def tan(self):
+    tangent = math.tan(self.value)
+    return self.Apply(tangent, 1.0 + tangent * tangent)
+
+  def exp(self):
+    value = math.exp(self.value)
+    return self.Apply(value, value)
+
+  def __str__(self):
+    return str(self.value)
+
+  def __repr__(self):
+    return 'Dual(%r, %r)' % (self.value, self.derivatives)
+
+
+def Seed(value, name):
+  """
+  Args:
+    value - a param's value: a Units or Degrees object, or a number
+    name (str) - the param's name
+  Returns: a copy of value whose magnitude is a Dual, with derivative 1 with
+    respect to name -- i.e. derivatives are per unit of value as given (per
+    degree, for Degrees)
+  """
+  if isinstance(value, Degrees):
+    return Degrees(Dual(value.magnitude, {name: 1.0}), ndigits=value.ndigits)
+  if isinstance(value, Units):
+    result = value._Copy()
+    result.magnitude = Dual(value.magnitude, {name: 1.0})
+    return result
+  return Dual(value, {name: 1.0})
+
+def Derivatives(value):
+  """Returns (value, dict mapping param names to derivatives) for value, a
+  Dual, a Units object with a Dual magnitude, or a number (which has no
+  derivatives)."""
+  if isinstance(value, Units):
+    value = value.magnitude
+  if isinstance(value, Dual):
+    return value.value, value.derivatives
+  return float(value), {}
+
+
 class Units(object):
+  __slots__ = ('magnitude', 'dim', 'ndigits', 'as_latex', 'unit_order', '_str')
+
   def __init__(self, data, unit_order=None, as_latex=True, **kwargs):
     """
     Input:
@@ -21,47 +429,84 @@ class Units(object):
     self.as_latex = as_latex
     self.ndigits = ndigits
     self.unit_order = unit_order
-    if unit_order is None:
-      self.order_func = None
-    else:
-      # listed units sort in the order listed, unlisted units sort last
-      self.order_func = lambda a: (
-        a[0] in self.unit_order and (self.unit_order.index(a[0]), a[0]) or
-        (len(self.unit_order), a[0]) )
-      
     if isinstance(data, Units):
       if 'ndigits' in kwargs:
         self.ndigits = kwargs['ndigits']
       else:
         self.ndigits = data.ndigits
-      self.u = data.u.copy()
+      self.dim = data.dim
       self.magnitude = data.magnitude
       self.unit_order = data.unit_order
-      self.order_func = data.order_func
       self.as_latex = data.as_latex
+    elif type(data) in (int, float):
+      # dimensionless number; nothing to parse
+      self.magnitude = float(data)
+      self.dim = DIMENSIONLESS
+    elif isinstance(data, Dual):
+      self.magnitude = data
+      self.dim = DIMENSIONLESS
     else:
       data = str(data)
-      m = re.match('[-.0-9]+', data)
+      m = _MAGNITUDE_RE.match(data)
       self.magnitude = float(m.group(0))
-      data = re.sub('\s', '', data[len(m.group(0)):])
-      if not data:
-        # dimensionless unit
-        self.u = {}
-        return
-      
-      terms = re.split(r'[/*]', data)
-      operators = re.findall(r'[/*]', data)
-      u = self.RootUnitAndExponent(terms[0])
-      for i in range(len(operators)):
-        term, op = terms[i+1], operators[i]
-        thisunit = self.RootUnitAndExponent(term)
-        if op == '/':
-          for element in thisunit:
-            thisunit[element] = -1 * thisunit[element]
+      self.dim = self.ParseDimension(data[len(m.group(0)):])
+
+  @property
+  def u(self):
+    """dict mapping unit names to exponents, e.g. {'lb': 1, 'ft': -2}"""
+    return DimensionAsDict(self.dim)
+
+  # Dimension tuples depend on the order units were registered in, which can
+  # differ between processes, so they are pickled as dicts of unit names.
+  def __getstate__(self):
+    return (self.magnitude, DimensionAsDict(self.dim), self.ndigits,
+            self.as_latex, self.unit_order)
+
+  def __setstate__(self, state):
+    self.magnitude, dim, self.ndigits, self.as_latex, self.unit_order = state
+    self.dim = MakeDimension(dim)
+
+  def ParseDimension(self, signature):
+    """
+    Input: signature (str) = the unit portion of a units string, e.g. ' lb/ft^3'
+    Output: the interned dimension tuple for that signature.  Each distinct
+      signature is parsed once and then served from PARSE_CACHE.
+    """
+    dim = PARSE_CACHE.Get(signature)
+    if dim is not None:
+      return dim
+
+    data = _WHITESPACE_RE.sub('', signature)
+    if not data:
+      # dimensionless unit
+      return PARSE_CACHE.Put(signature, DIMENSIONLESS)
+
+    terms = _OPERATOR_RE.split(data)
+    operators = _OPERATOR_RE.findall(data)
+    u = self.RootUnitAndExponent(terms[0])
+    for i in range(len(operators)):
+      term, op = terms[i+1], operators[i]
+      thisunit = self.RootUnitAndExponent(term)
+      if op == '/':
         for element in thisunit:
-          u.setdefault(element, 0)
-          u[element] += thisunit[element]
-      self.u = u
+          thisunit[element] = -1 * thisunit[element]
+      for element in thisunit:
+        u.setdefault(element, 0)
+        u[element] += thisunit[element]
+    return PARSE_CACHE.Put(signature, MakeDimension(u))
+
+  def to(self, unit):
+    """
+    Input: unit (str or dimension tuple) = units to convert to, e.g. 'lb/ft^3'
+    Output: a new Units object equal to this one, expressed in those units.
+      (See CONVERSIONS for the conversion factors.)
+    """
+    if not isinstance(unit, tuple):
+      unit = self.ParseDimension(unit)
+    result = self._Copy()
+    result.magnitude *= ConversionFactor(self.dim, unit)
+    result.dim = unit
+    return result
 
   def RootUnitAndExponent(self, s):
     """
@@ -76,226 +521,728 @@ class Units(object):
     return {unit: exponent}
 
   def __float__(self):
-    if self.u == {}:
-      return self.magnitude
+    if not self.dim:
+      return float(self.magnitude)
     raise Error("Can't evaluate dimensioned unit (%s) as a dimensionless float"
                 % self)
   
   def __trunc__(self):
-    if self.u == {}:
+    if not self.dim:
       return int(self.magnitude)
     raise Error("Can't evaluate dimensioned unit (%s) as a dimensionless int"
                 % self)
   
   def __abs__(self):
-    if self.u == {}:
+    if not self.dim:
       return abs(self.magnitude)
     raise Error("Can't take absolute value of dimensioned unit (%s)" % self)
   
-  def __add__(self, other):
-    if type(other) in (int, float) and self.u != {}:
-      raise Error("Can't add raw numbers to dimensioned units (%s)" % self)
-    result = self.__class__(self)
-    if type(other) in (int, float):
-      result.magnitude = self.magnitude + other
+  def _Copy(self):
+    """Returns a copy of self, skipping the argument handling in __init__."""
+    result = self.__class__.__new__(self.__class__)
+    result.magnitude = self.magnitude
+    result.dim = self.dim
+    result.ndigits = self.ndigits
+    result.as_latex = self.as_latex
+    result.unit_order = self.unit_order
+    return result
+
+  # In-place operators.  These modify the Units object on the left, so use
+  # them only on objects you own (e.g. a running total), never on a shared
+  # value such as an input parameter.  The ordinary operators are implemented
+  # as one copy plus the in-place operation.
+
+  def __iadd__(self, other):
+    if type(other) in (int, float, Dual):
+      if self.dim:
+        raise Error("Can't add raw numbers to dimensioned units (%s)" % self)
+      self.magnitude += other
+    elif isinstance(other, UnitsArray):
+      return NotImplemented
     else:
-      if self.u != other.u:
+      if self.dim is not other.dim and self.dim != other.dim:
         raise Error("Can't add units of different types (%s + %s)" %
                     (self, other))
-      result.magnitude = self.magnitude + other.magnitude
-    return result
+      self.magnitude += other.magnitude
+    return self
+
+  def __isub__(self, other):
+    if type(other) in (int, float, Dual):
+      if self.dim:
+        raise Error("Can't subtract raw numbers from dimensioned units (%s)" %
+                    self)
+      self.magnitude -= other
+    elif isinstance(other, UnitsArray):
+      return NotImplemented
+    else:
+      if self.dim is not other.dim and self.dim != other.dim:
+        raise Error("Can't subtract units of different types (%s - %s)" %
+                    (self, other))
+      self.magnitude -= other.magnitude
+    return self
+
+  def __imul__(self, other):
+    if isinstance(other, Units):
+      self.ndigits = max(self.ndigits, other.ndigits)
+      self.magnitude *= other.magnitude
+      self.dim = MultiplyDimensions(self.dim, other.dim)
+    elif isinstance(other, UnitsArray):
+      return NotImplemented
+    else:
+      self.magnitude *= other
+    return self
+
+  def __idiv__(self, other):
+    if isinstance(other, Units):
+      self.ndigits = max(self.ndigits, other.ndigits)
+      self.magnitude /= other.magnitude
+      self.dim = MultiplyDimensions(self.dim, PowerOfDimension(other.dim, -1))
+    elif isinstance(other, UnitsArray):
+      return NotImplemented
+    else:
+      # Units-object / 2.0
+      self.magnitude /= other
+    return self
+
+  def __ipow__(self, other):
+    if type(other) is not int:
+      raise Error("Can't raise units to non-integer power (%s)" % other)
+    self.magnitude **= other
+    self.dim = PowerOfDimension(self.dim, other)
+    return self
+
+  def __add__(self, other):
+    if isinstance(other, UnitsArray):
+      return NotImplemented
+    return self._Copy().__iadd__(other)
 
   def __radd__(self, other):
     return self + other
 
   def __neg__(self):
-    result = self.__class__(self)
+    result = self._Copy()
     result.magnitude = -result.magnitude
     return result
   
   def __sub__(self, other):
-    return self + (-other)
+    if isinstance(other, UnitsArray):
+      return NotImplemented
+    return self._Copy().__isub__(other)
     
   def __rsub__(self, other):
-    return -self + other
+    result = -self
+    result += other
+    return result
     
   def __rmul__(self, other):
     return self * other
 
   def __mul__(self, other):
-    order = self.unit_order
-    ndigits = self.ndigits
-    if order is None and isinstance(other, Units):
-      order = other.unit_order
-    result = self.__class__(self, unit_order=order)
-    if isinstance(other, Units):
-      result.ndigits = max(result.ndigits, other.ndigits)
-      result.magnitude = self.magnitude * other.magnitude
-      for element in other.u:
-        result.u.setdefault(element, 0)
-        result.u[element] += other.u[element]
-        if result.u[element] == 0:
-          del result.u[element]
-    else:
-      result.magnitude = self.magnitude * other
-    return result
+    if isinstance(other, UnitsArray):
+      return NotImplemented
+    return self._Copy().__imul__(other)
 
   def __pow__(self, other):
-    if type(other) is not int:
-      raise Error("Can't raise units to non-integer power (%s)" % other)
-    result = self.__class__(self)
-    result.magnitude = self.magnitude ** other
-    for unit in result.u:
-      result.u[unit] *= other
-    return result
+    return self._Copy().__ipow__(other)
     
   def __div__(self, other):
-    if type(other) in (int, float):
-      # Units-object / 2.0
-      result = self.__class__(self)
-      result.magnitude = self.magnitude / other
-      return result
-
-    # Both self and other are Units-objects
-    order = self.unit_order
-    ndigits = self.ndigits
-    if order is None:
-      order = other.unit_order
-    result = self.__class__(self,  unit_order=order)
-    result.ndigits = max(result.ndigits, other.ndigits)
-    result.magnitude = self.magnitude / other.magnitude
-    for element in other.u:
-      result.u.setdefault(element, 0)
-      result.u[element] -= other.u[element]
-      if result.u[element] == 0:
-        del result.u[element]
-    return result
+    if isinstance(other, UnitsArray):
+      return NotImplemented
+    return self._Copy().__idiv__(other)
 
   def __rdiv__(self, other):
-    if type(other) in (int, float):
+    if type(other) in (int, float, Dual):
       # 1.0 / Units-object
-      result = self.__class__(self)
-      result.magnitude = float(other) / self.magnitude
-      for unit, exponent in result.u.items():
-        result.u[unit] = -exponent
+      result = self._Copy()
+      result.magnitude = 1.0 * other / self.magnitude
+      result.dim = PowerOfDimension(self.dim, -1)
       return result
 
   def __gt__(self, other):
-    if len(self.u) == 0:
+    if isinstance(other, UnitsArray):
+      return NotImplemented
+    if not self.dim:
       return self.magnitude > other
     if not isinstance(other, Units):
       raise Error("Can't compare dimensioned units (%s) with dimensionless "
                   "number (%s)" % (self, other))
-    if self.u != other.u:
+    if self.dim is not other.dim and self.dim != other.dim:
       raise Error("Can't compare units of different dimensions (%s vs. %s)" %
                   (self, other))
     return self.magnitude > other.magnitude
 
   def __ge__(self, other):
-    if len(self.u) == 0:
+    if isinstance(other, UnitsArray):
+      return NotImplemented
+    if not self.dim:
       return self.magnitude >= other
     if not isinstance(other, Units):
       raise Error("Can't compare dimensioned units (%s) with dimensionless "
                   "number (%s)" % (self, other))
-    if self.u != other.u:
+    if self.dim is not other.dim and self.dim != other.dim:
       raise Error("Can't compare units of different dimensions (%s vs. %s)" %
                   (self, other))
     return self.magnitude >= other.magnitude
 
   def __lt__(self, other):
+    if isinstance(other, UnitsArray):
+      return NotImplemented
     return not (self >= other)
   def __le__(self, other):
+    if isinstance(other, UnitsArray):
+      return NotImplemented
     return not (self > other)
 
   def __str__(self):
-    pos, neg = {}, {}
-    for k in self.u:
-      if self.u[k] > 0:
-        pos[k] = self.u[k]
-      elif self.u[k] < 0:
-        neg[k] = -1 * self.u[k]
-      else:
-        pass
-
-    numerator_elts, denominator_elts = [], []
-    for element in pos:
-      exponent = ''
-      if pos[element] != 1:
-        exponent = '^%d' % pos[element]
-      if self.as_latex:
-        if exponent:
-          numerator_elts.append((element, r'\mbox{%s} \ensuremath{{\!}%s}' %
-                                 (element, exponent)))
-        else:
-          numerator_elts.append((element, r'\mbox{%s}' % element))
-      else:
-        numerator_elts.append((element, '%s%s' % (element, exponent)))
-    for element in neg:
-      exponent = ''
-      if neg[element] != 1:
-        exponent = '^%d' % neg[element]
-      if self.as_latex:
-        if exponent:
-          denominator_elts.append((element, r'\mbox{%s} \ensuremath{{\!}%s}' %
-                                   (element, exponent)))
-        else:
-          denominator_elts.append((element, r'\mbox{%s}' % element))
-      else:
-        denominator_elts.append((element, '%s%s' % (element, exponent)))
-    # sort numerator_elts and denominator_elts by self.unit_order
-    numerator_elts.sort(key=self.order_func)
-    denominator_elts.sort(key=self.order_func)
-
-    mag_str = ('%.' + str(self.ndigits) + 'f') % self.magnitude
-    if self.as_latex:
-      separator = r'\,'
-    else:
-      separator = ''
-    if denominator_elts:
-      return '%s%s %s / %s' % (mag_str, separator,
-        ' * '.join([data for sortkey, data in numerator_elts]),
-        ' / '.join([data for sortkey, data in denominator_elts]))
-    else:
-      return '%s%s %s' % (mag_str, separator,
-        ' * '.join([data for sortkey, data in numerator_elts]))
+    return self.Render()
+
+  def Render(self, as_latex=None):
+    """
+    Returns the quantity as a string, e.g. '1.50 lb / ft^2'.
+      as_latex: True for LaTeX markup, False for plain text (default: this
+        object's as_latex setting)
+    The result is cached on the object until its value or format changes.
+    """
+    if as_latex is None:
+      as_latex = self.as_latex
+    key = (self.magnitude, self.ndigits, as_latex, self.dim, self.unit_order)
+    try:
+      cached_key, text = self._str
+      if cached_key == key:
+        return text
+    except AttributeError:
+      pass
+    text = ('%.*f' % (self.ndigits, self.magnitude) +
+            UnitSuffix(self.dim, as_latex, self.unit_order))
+    self._str = (key, text)
+    return text
 
 class Degrees(Units):
+  __slots__ = ('_trig',)
+
   def __init__(self, deg, ndigits=1, **kwargs):
-    self.u = {}
+    self.dim = DIMENSIONLESS
     self.unit_order = None
-    self.order_func = None
+    self.as_latex = True
     if isinstance(deg, Degrees):
-      self.degrees = deg.degrees
+      self.magnitude = deg.magnitude
       self.ndigits = deg.ndigits
-    elif type(deg) in (int, float):
-      self.degrees = deg
+    elif type(deg) in (int, float, Dual):
+      self.magnitude = deg
       self.ndigits = ndigits
     else:
       raise Error("Can't initialize degrees with type %s" %
                   deg.__class__.__name__)
-    self.magnitude = self.degrees
+
+  @property
+  def degrees(self):
+    return self.magnitude
 
   def __float__(self):
-    return self.radians()
+    return float(self.radians())
+
+  def _Trig(self):
+    """Returns (radians, sin, cos, tan) for this angle.  These are memoized on
+    the object, and across objects in TRIG_CACHE (unless the magnitude is a
+    Dual)."""
+    if type(self.magnitude) is Dual:
+      radians = math.pi / 180.0 * self.magnitude
+      return radians, radians.sin(), radians.cos(), radians.tan()
+    try:
+      magnitude, trig = self._trig
+      if magnitude == self.magnitude:
+        return trig
+    except AttributeError:
+      pass
+    trig = TRIG_CACHE.Get(self.magnitude)
+    if trig is None:
+      radians = math.pi * self.magnitude / 180.0
+      trig = TRIG_CACHE.Put(self.magnitude, (radians, math.sin(radians),
+                                             math.cos(radians),
+                                             math.tan(radians)))
+    self._trig = (self.magnitude, trig)
+    return trig
 
   def radians(self):
-    return math.pi * self.magnitude / 180.0
+    return self._Trig()[0]
 
-  def __str__(self):
+  def sin(self):
+    return self._Trig()[1]
+
+  def cos(self):
+    return self._Trig()[2]
+
+  def tan(self):
+    return self._Trig()[3]
+
+  def Render(self, as_latex=None):
+    if as_latex is None:
+      as_latex = self.as_latex
     if abs(int(self.magnitude) - self.magnitude) < .0001:
-      return r'\ensuremath{%d ^{\circ}}' % self.magnitude
-    return ((r'\ensuremath{%.' + str(self.ndigits) + 'f ^{\circ}}') %
-            self.magnitude)
+      number = '%d' % self.magnitude
+    else:
+      number = '%.*f' % (self.ndigits, self.magnitude)
+    if as_latex:
+      return r'\ensuremath{%s ^{\circ}}' % number
+    return '%s deg' % number
 
-  def __add__(self, other):
-    value = self.magnitude
-    if type(other) is float:
-      value += 180.0 / math.pi * other
+  def __iadd__(self, other):
+    if type(other) in (float, Dual):
+      self.magnitude += 180.0 / math.pi * other
     elif isinstance(other, Degrees):
-      value += other.magnitude
+      self.magnitude += other.magnitude
     else:
       raise Error("Can't add '%s' to 'Degrees'" % other.__class__.__name__)
-    return Degrees(value)
+    return self
+
+  def __isub__(self, other):
+    return self.__iadd__(-other)
+
+  def __add__(self, other):
+    if isinstance(other, UnitsArray):
+      return other + self
+    if numpy is not None and isinstance(other, numpy.ndarray):
+      return self.radians() + other     # an array of radians, like other
+    return Degrees(self.magnitude).__iadd__(other)
+
+  def __sub__(self, other):
+    return self + (-other)
 
   def __neg__(self):
     return Degrees(-1.0 * self.magnitude)
+
+
+class UnitsArray(object):
+  """
+  A NumPy array of magnitudes sharing a single dimension, for running the same
+  formula over a whole batch of designs at once.  Arithmetic and comparisons
+  follow the rules of Units (and raise the same Error on dimension mismatches),
+  applied elementwise.
+  """
+  __slots__ = ('magnitude', 'dim', 'ndigits', 'as_latex', 'unit_order')
+  __array_ufunc__ = None    # make numpy defer to our reflected operators
+
+  def __init__(self, data, unit=None, ndigits=None, as_latex=None,
+               unit_order=None):
+    """
+    Input:
+      data (UnitsArray, sequence of Units objects, or array of numbers)
+        (UnitsArray) data to copy
+        (sequence of Units) values to collect; all must have one dimension
+        (numbers) magnitudes, in the units given by +unit+
+      unit (str or dimension tuple): units of numeric data, e.g. 'lb/ft^3'
+        (default: dimensionless)
+      ndigits (int): number of significant digits for display
+    """
+    if numpy is None:
+      raise Error("UnitsArray requires numpy")
+    self.unit_order = unit_order
+    if isinstance(data, UnitsArray):
+      self.magnitude = data.magnitude.copy()
+      self.dim = data.dim
+      self.ndigits = data.ndigits
+      self.as_latex = data.as_latex
+      self.unit_order = data.unit_order
+    elif len(data) and isinstance(data[0], Units):
+      dims = set([element.dim for element in data])
+      if len(dims) != 1:
+        raise Error("Can't make a UnitsArray from units of different "
+                    "dimensions (%s)" % ', '.join([str(e) for e in data]))
+      self.magnitude = numpy.array([e.magnitude for e in data], dtype=float)
+      self.dim = dims.pop()
+      self.ndigits = max([e.ndigits for e in data])
+      self.as_latex = data[0].as_latex
+      if unit_order is None:
+        self.unit_order = data[0].unit_order
+    else:
+      self.magnitude = numpy.array(data, dtype=float)
+      if unit is None:
+        self.dim = DIMENSIONLESS
+      elif isinstance(unit, tuple):
+        self.dim = unit
+      else:
+        self.dim = Units('1 %s' % unit).dim
+      self.ndigits = 3
+      self.as_latex = True
+    if ndigits is not None:
+      self.ndigits = ndigits
+    if as_latex is not None:
+      self.as_latex = as_latex
+
+  # pickled like Units objects (see Units.__getstate__)
+  __getstate__ = Units.__getstate__.im_func
+  __setstate__ = Units.__setstate__.im_func
+
+  def _New(self, magnitude, dim, ndigits=None):
+    result = self.__class__.__new__(self.__class__)
+    result.magnitude = magnitude
+    result.dim = dim
+    result.ndigits = self.ndigits if ndigits is None else ndigits
+    result.as_latex = self.as_latex
+    result.unit_order = self.unit_order
+    return result
+
+  def _Operand(self, other, action):
+    """Returns (magnitude, dim, ndigits) of other, which may be a UnitsArray, a
+    Units object, a number or a numpy array (the last two are dimensionless).
+    """
+    if isinstance(other, (UnitsArray, Units)):
+      return other.magnitude, other.dim, other.ndigits
+    if isinstance(other, (int, long, float, numpy.number, numpy.ndarray)):
+      return other, DIMENSIONLESS, self.ndigits
+    raise Error("Can't %s '%s' and '%s'" % (action, self.__class__.__name__,
+                                            other.__class__.__name__))
+
+  def _SameDimension(self, other, action):
+    magnitude, dim, ndigits = self._Operand(other, action)
+    if self.dim is not dim and self.dim != dim:
+      if dim is DIMENSIONLESS and not isinstance(other, Units):
+        raise Error("Can't %s raw numbers and dimensioned units (%s)" %
+                    (action, DimensionAsDict(self.dim)))
+      raise Error("Can't %s units of different types (%s, %s)" %
+                  (action, DimensionAsDict(self.dim), DimensionAsDict(dim)))
+    return magnitude, max(self.ndigits, ndigits)
+
+  def __len__(self):
+    return len(self.magnitude)
+
+  def __getitem__(self, index):
+    magnitude = self.magnitude[index]
+    if isinstance(magnitude, numpy.ndarray):
+      return self._New(magnitude, self.dim)
+    return self.Element(float(magnitude))
+
+  def __iter__(self):
+    for magnitude in self.magnitude:
+      yield self.Element(float(magnitude))
+
+  def Element(self, magnitude):
+    """Returns a scalar Units object with this array's dimension."""
+    result = Units(magnitude, unit_order=self.unit_order,
+                   as_latex=self.as_latex, ndigits=self.ndigits)
+    result.dim = self.dim
+    return result
+
+  def __add__(self, other):
+    magnitude, ndigits = self._SameDimension(other, 'add')
+    return self._New(self.magnitude + magnitude, self.dim, ndigits)
+
+  def __radd__(self, other):
+    return self + other
+
+  def __neg__(self):
+    return self._New(-self.magnitude, self.dim)
+
+  def __sub__(self, other):
+    magnitude, ndigits = self._SameDimension(other, 'subtract')
+    return self._New(self.magnitude - magnitude, self.dim, ndigits)
+
+  def __rsub__(self, other):
+    return -self + other
+
+  def __mul__(self, other):
+    magnitude, dim, ndigits = self._Operand(other, 'multiply')
+    return self._New(self.magnitude * magnitude,
+                     MultiplyDimensions(self.dim, dim), max(self.ndigits, ndigits))
+
+  def __rmul__(self, other):
+    return self * other
+
+  def __div__(self, other):
+    magnitude, dim, ndigits = self._Operand(other, 'divide')
+    return self._New(self.magnitude / magnitude,
+                     MultiplyDimensions(self.dim, PowerOfDimension(dim, -1)),
+                     max(self.ndigits, ndigits))
+
+  def __rdiv__(self, other):
+    magnitude, dim, ndigits = self._Operand(other, 'divide')
+    return self._New(magnitude / self.magnitude,
+                     MultiplyDimensions(dim, PowerOfDimension(self.dim, -1)),
+                     max(self.ndigits, ndigits))
+
+  def __pow__(self, other):
+    if not isinstance(other, (int, long, numpy.integer)):
+      raise Error("Can't raise units to non-integer power (%s)" % other)
+    return self._New(self.magnitude ** other,
+                     PowerOfDimension(self.dim, int(other)))
+
+  def __abs__(self):
+    if self.dim:
+      raise Error("Can't take absolute value of dimensioned units (%s)" %
+                  DimensionAsDict(self.dim))
+    return numpy.abs(self.magnitude)
+
+  def __gt__(self, other):
+    return self.magnitude > self._SameDimension(other, 'compare')[0]
+  def __ge__(self, other):
+    return self.magnitude >= self._SameDimension(other, 'compare')[0]
+  def __lt__(self, other):
+    return self.magnitude < self._SameDimension(other, 'compare')[0]
+  def __le__(self, other):
+    return self.magnitude <= self._SameDimension(other, 'compare')[0]
+
+  def to(self, unit):
+    """Returns this array converted to unit (see Units.to)."""
+    if not isinstance(unit, tuple):
+      unit = Units('1 %s' % unit).dim
+    return self._New(self.magnitude * ConversionFactor(self.dim, unit), unit)
+
+  def min(self):
+    return self.Element(float(self.magnitude.min()))
+
+  def max(self):
+    return self.Element(float(self.magnitude.max()))
+
+  def __str__(self):
+    return '[%s]' % ', '.join([str(element) for element in self])
+
+  def __repr__(self):
+    return '%s(%r, %r)' % (self.__class__.__name__, list(self.magnitude),
+                           DimensionAsDict(self.dim))
+
+
+class DegreesArray(UnitsArray):
+  """A NumPy array of angles, in degrees; the array counterpart of Degrees."""
+  __slots__ = ()
+
+  def __init__(self, data, ndigits=1):
+    if numpy is None:
+      raise Error("DegreesArray requires numpy")
+    if isinstance(data, UnitsArray):
+      self.magnitude = data.magnitude.copy()
+    else:
+      self.magnitude = numpy.array(
+        [isinstance(e, Degrees) and e.magnitude or e for e in data],
+        dtype=float)
+    self.dim = DIMENSIONLESS
+    self.ndigits = ndigits
+    self.as_latex = True
+    self.unit_order = None
+
+  def Element(self, magnitude):
+    return Degrees(magnitude, ndigits=self.ndigits)
+
+  def radians(self):
+    return numpy.radians(self.magnitude)
+
+  def sin(self):
+    return numpy.sin(self.radians())
+
+  def cos(self):
+    return numpy.cos(self.radians())
+
+  def tan(self):
+    return numpy.tan(self.radians())
+
+  def __add__(self, other):
+    # like Degrees: floats (and float arrays) are taken to be in radians
+    if isinstance(other, (Degrees, DegreesArray)):
+      return self._New(self.magnitude + other.magnitude, DIMENSIONLESS)
+    if isinstance(other, (float, numpy.ndarray)):
+      return self._New(self.magnitude + numpy.degrees(other), DIMENSIONLESS)
+    raise Error("Can't add '%s' to 'DegreesArray'" % other.__class__.__name__)
+
+  def __sub__(self, other):
+    return self + (-other)
+
+
+def Minimum(a, b):
+  """Elementwise minimum of two quantities, either of which may be an array;
+  both must have the same dimension."""
+  if isinstance(a, UnitsArray):
+    magnitude, ndigits = a._SameDimension(b, 'compare')
+    return a._New(numpy.minimum(a.magnitude, magnitude), a.dim, ndigits)
+  if isinstance(b, UnitsArray):
+    return Minimum(b, a)
+  if numpy is not None and (isinstance(a, numpy.ndarray) or
+                            isinstance(b, numpy.ndarray)):
+    return numpy.minimum(a, b)
+  return min(a, b)
+
+def Maximum(a, b):
+  """Elementwise maximum of two quantities, either of which may be an array;
+  both must have the same dimension."""
+  if isinstance(a, UnitsArray):
+    magnitude, ndigits = a._SameDimension(b, 'compare')
+    return a._New(numpy.maximum(a.magnitude, magnitude), a.dim, ndigits)
+  if isinstance(b, UnitsArray):
+    return Maximum(b, a)
+  if numpy is not None and (isinstance(a, numpy.ndarray) or
+                            isinstance(b, numpy.ndarray)):
+    return numpy.maximum(a, b)
+  return max(a, b)
+
+def Sum(terms):
+  """
+  Returns the sum of terms (Units objects of one dimension, numbers or arrays).
+  For Units, the first term is copied once and the rest are added to the copy
+  in place, rather than allocating a new object for every "+".
+  """
+  terms = iter(terms)
+  total = next(terms)
+  if isinstance(total, Units):
+    total = total._Copy()
+    for term in terms:
+      total += term
+  else:
+    for term in terms:
+      total = total + term
+  return total
+
+
+def sin(angle):
+  """Sine of an angle: a Degrees or DegreesArray object, or radians (a number,
+  Dual or numpy array)."""
+  if type(angle) is float:
+    return math.sin(angle)
+  if isinstance(angle, (Degrees, DegreesArray)):
+    return angle.sin()
+  if numpy is not None and isinstance(angle, numpy.ndarray):
+    return numpy.sin(angle)
+  if isinstance(angle, Dual):
+    return angle.sin()
+  return math.sin(angle)
+
+def cos(angle):
+  """Cosine of an angle; see sin()."""
+  if type(angle) is float:
+    return math.cos(angle)
+  if isinstance(angle, (Degrees, DegreesArray)):
+    return angle.cos()
+  if numpy is not None and isinstance(angle, numpy.ndarray):
+    return numpy.cos(angle)
+  if isinstance(angle, Dual):
+    return angle.cos()
+  return math.cos(angle)
+
+def tan(angle):
+  """Tangent of an angle; see sin()."""
+  if type(angle) is float:
+    return math.tan(angle)
+  if isinstance(angle, (Degrees, DegreesArray)):
+    return angle.tan()
+  if numpy is not None and isinstance(angle, numpy.ndarray):
+    return numpy.tan(angle)
+  if isinstance(angle, Dual):
+    return angle.tan()
+  return math.tan(angle)
+
+def exp(x):
+  """e ** x, for a number, Dual or numpy array."""
+  if numpy is not None and isinstance(x, numpy.ndarray):
+    return numpy.exp(x)
+  if isinstance(x, Dual):
+    return x.exp()
+  return math.exp(x)
+
+
+# Unit conversions, as (name, factor, units) meaning 1 name = factor units.
+# Units that aren't listed here (ft, lb, sec, ...) are canonical: they are
+# what Normalize() converts to, and what the formulas in Wall.py assume.  "lb"
+# is pound-force throughout.  Add more conversions with RegisterConversion().
+CONVERSIONS = [
+  ('in', 1.0 / 12, 'ft'),
+  ('yd', 3.0, 'ft'),
+  ('mi', 5280.0, 'ft'),
+  ('m', 1.0 / 0.3048, 'ft'),
+  ('mm', 0.001, 'm'),
+  ('cm', 0.01, 'm'),
+  ('km', 1000.0, 'm'),
+  ('kip', 1000.0, 'lb'),
+  ('N', 1.0 / 4.4482216152605, 'lb'),
+  ('kN', 1000.0, 'N'),
+  ('Pa', 1.0, 'N/m^2'),
+  ('kPa', 1000.0, 'Pa'),
+  ('MPa', 1000000.0, 'Pa'),
+  ('psf', 1.0, 'lb/ft^2'),
+  ('psi', 1.0, 'lb/in^2'),
+  ('pcf', 1.0, 'lb/ft^3'),
+  ('min', 60.0, 'sec'),
+  ('h', 3600.0, 'sec'),
+  ]
+
+_CANONICAL_UNITS = {}     # unit name -> (factor, canonical dimension)
+_CANONICAL_FORMS = {}     # dimension -> (factor, canonical dimension)
+_CONVERSION_FACTORS = {}  # (from dimension, to dimension) -> factor
+
+def RegisterConversion(name, factor, units):
+  """
+  Args:
+    name (str) - unit name, e.g. 'kN'
+    factor (float), units (str) - 1 name is equal to factor units
+  """
+  unit_factor, canonical = CanonicalForm(Units('1 %s' % units).dim)
+  _CANONICAL_UNITS[name] = (factor * unit_factor, canonical)
+  RegisterBaseUnit(name)
+  _CANONICAL_FORMS.clear()
+  _CONVERSION_FACTORS.clear()
+
+def CanonicalForm(dim):
+  """
+  Args: dim (tuple) - a dimension tuple
+  Returns: (factor, canonical dimension): a quantity of dimension dim is equal
+    to factor times its magnitude in the canonical dimension
+  """
+  try:
+    return _CANONICAL_FORMS[dim]
+  except KeyError:
+    pass
+  factor, canonical = 1.0, DIMENSIONLESS
+  for i, exponent in enumerate(dim):
+    if not exponent:
+      continue
+    unit = BASE_UNITS[i]
+    if unit in _CANONICAL_UNITS:
+      unit_factor, unit_dim = _CANONICAL_UNITS[unit]
+    else:
+      unit_factor, unit_dim = 1.0, MakeDimension({unit: 1})
+    factor *= unit_factor ** exponent
+    canonical = MultiplyDimensions(canonical,
+                                   PowerOfDimension(unit_dim, exponent))
+  _CANONICAL_FORMS[dim] = (factor, canonical)
+  return factor, canonical
+
+def ConversionFactor(from_dim, to_dim):
+  """Returns the factor converting magnitudes in dimension from_dim to
+  magnitudes in to_dim.  Raises Error if they measure different things."""
+  try:
+    return _CONVERSION_FACTORS[from_dim, to_dim]
+  except KeyError:
+    pass
+  from_factor, from_canonical = CanonicalForm(from_dim)
+  to_factor, to_canonical = CanonicalForm(to_dim)
+  if from_canonical != to_canonical:
+    raise Error("Can't convert %s to %s" % (
+      UnitSuffix(from_dim, False).strip(), UnitSuffix(to_dim, False).strip()))
+  factor = _CONVERSION_FACTORS[from_dim, to_dim] = from_factor / to_factor
+  return factor
+
+def Normalize(value):
+  """Returns value (a Units object or UnitsArray) converted to canonical
+  units.  Values already in canonical units, and anything else (Degrees,
+  numbers, ...), are returned unchanged."""
+  if isinstance(value, Degrees) or not isinstance(value, (Units, UnitsArray)):
+    return value
+  factor, canonical = CanonicalForm(value.dim)
+  if canonical is value.dim:
+    return value
+  if isinstance(value, UnitsArray):
+    return value._New(value.magnitude * factor, canonical)
+  result = value._Copy()
+  result.magnitude *= factor
+  result.dim = canonical
+  return result
+
+def NormalizeParams(params):
+  """
+  Args: params (dict) - parameter values, e.g. an InputParams datadict.  The
+    values may be UnitsArrays holding a whole batch of designs.
+  Returns: a copy of params with every value converted to canonical units.
+    Conversion factors are computed once per dimension, and each UnitsArray
+    is converted in a single numpy operation.
+  """
+  return dict([(name, Normalize(value)) for name, value in params.items()])
+
+for name, factor, units in CONVERSIONS:
+  RegisterConversion(name, factor, units)
+del name, factor, units
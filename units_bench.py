@@ -0,0 +1,95 @@
+#!/usr/bin/python
+
+"""
+Microbenchmark for Units arithmetic.  For a few typical expressions, compares
+ordinary operators against the in-place operators and units.Sum: the number of
+Units objects allocated per evaluation, and the time per evaluation.
+
+Usage: units_bench.py [repetitions]
+"""
+
+import sys, timeit
+
+import units
+from units import Units
+
+
+class AllocationCounter(object):
+  """Context manager counting the Units (and Degrees) objects created."""
+  def __enter__(self):
+    self.count = 0
+    def CountingNew(cls, *args, **kwargs):
+      self.count += 1
+      return object.__new__(cls)
+    units.Units.__new__ = staticmethod(CountingNew)
+    return self
+
+  def __exit__(self, *exc_info):
+    del units.Units.__new__
+
+
+W_f, W_s = Units('1185 lb/ft'), Units('6330 lb/ft')
+F_av, F_qv = Units('313 lb/ft'), Units('211 lb/ft')
+X_batt, L_t = Units('2.02 ft'), Units('6.13 ft')
+block_depth = Units('0.97 ft')
+
+def MomentsWithOperators():
+  # OverturningAnalysis's sumM_r, as written before units.Sum
+  return (W_f * 0.5 * (block_depth + X_batt)
+          + W_s * (0.5 * (L_t - block_depth) + block_depth + 0.5 * X_batt)
+          + F_av * (L_t + X_batt/3.0)
+          + F_qv * (L_t + 0.5 * X_batt))
+
+def MomentsWithSum():
+  return units.Sum([W_f * 0.5 * (block_depth + X_batt),
+                    W_s * units.Sum([0.5 * (L_t - block_depth),
+                                     block_depth, 0.5 * X_batt]),
+                    F_av * (L_t + X_batt/3.0),
+                    F_qv * (L_t + 0.5 * X_batt)])
+
+TERMS = [W_f, W_s, F_av, F_qv] * 5
+
+def TotalWithOperators():
+  total = TERMS[0]
+  for term in TERMS[1:]:
+    total = total + term
+  return total
+
+def TotalWithSum():
+  return units.Sum(TERMS)
+
+def DifferenceWithNegation():
+  # how Units.__sub__ used to work
+  return W_s + (-W_f)
+
+def DifferenceWithSubtraction():
+  return W_s - W_f
+
+CASES = [
+  ('sumM_r', MomentsWithOperators, MomentsWithSum),
+  ('sum of %d terms' % len(TERMS), TotalWithOperators, TotalWithSum),
+  ('difference', DifferenceWithNegation, DifferenceWithSubtraction),
+  ]
+
+
+def Main(argv):
+  repetitions = len(argv) > 1 and int(argv[1]) or 20000
+  print '%-18s %22s %22s' % ('', 'allocations', 'usec per evaluation')
+  print '%-18s %10s %11s %10s %11s' % ('expression', 'before', 'after',
+                                       'before', 'after')
+  for name, before, after in CASES:
+    if abs(before().magnitude - after().magnitude) > 1e-9:
+      raise units.Error('%s: results differ' % name)
+    allocations, usecs = [], []
+    for func in (before, after):
+      with AllocationCounter() as counter:
+        func()
+      allocations.append(counter.count)
+      seconds = min(timeit.repeat(func, number=repetitions, repeat=3))
+      usecs.append(1e6 * seconds / repetitions)
+    print '%-18s %10d %11d %10.2f %11.2f' % (
+      (name,) + tuple(allocations) + tuple(usecs))
+
+
+if __name__ == '__main__':
+  Main(sys.argv)
@@ -1,7 +1,8 @@
 #!/usr/bin/python
 
-import unittest
-from units import Units
+import math, pickle, unittest
+import units
+from units import Degrees, Units
 
 class UnitsTest(unittest.TestCase):
   def testInstantiation(self):
@@ -55,6 +56,207 @@ class UnitsTest(unittest.TestCase):
     u1 = Units('0.9144 m / yd', as_latex=False)
     u2 = 1.0 / u1
     self.assertEqual(str(u2), '1.094 yd / m')
+
+  def testParseCache(self):
+    units.PARSE_CACHE.Clear()
+    u1 = Units('130 lb / ft^3')
+    u2 = Units('125 lb / ft^3')
+    self.assertTrue(u1.dim is u2.dim)
+    self.assertEqual(units.PARSE_CACHE.Stats()['misses'], 1)
+    self.assertEqual(units.PARSE_CACHE.Stats()['hits'], 1)
+
+    units.PARSE_CACHE.Resize(1)
+    Units('1 ft')
+    self.assertEqual(len(units.PARSE_CACHE), 1)
+    units.PARSE_CACHE.Resize(512)
+
+  def testDimensions(self):
+    u1 = Units('130 lb / ft^3')
+    u2 = Units('2 ft') * Units('3 lb/ft^4')
+    self.assertTrue(u1.dim is u2.dim)
+    self.assertEqual(u1.u, {'lb': 1, 'ft': -3})
+    self.assertEqual((u1 / u2).dim, units.DIMENSIONLESS)
+    self.assertEqual((u1 ** 2).u, {'lb': 2, 'ft': -6})
+    self.assertRaises(units.Error, lambda: u1 + Units('1 lb'))
+    self.assertRaises(AttributeError, setattr, u1, 'color', 'blue')
+    self.assertEqual((units.Degrees(30.0) * 0.5 * 2).magnitude, 30.0)
+
+  def testInPlaceArithmetic(self):
+    total = Units('2 lb/ft', as_latex=False)
+    alias = total
+    total += Units('3 lb/ft')
+    total -= Units('1 lb/ft')
+    total *= Units('2 ft')
+    total /= 4
+    self.assertTrue(total is alias)
+    self.assertEqual(str(total), '2.000 lb')
+    self.assertRaises(units.Error, total.__iadd__, Units('1 ft'))
+
+    # ordinary operators still leave their operands alone
+    a, b = Units('5 ft'), Units('2 ft')
+    self.assertEqual((a - b).magnitude, 3.0)
+    self.assertEqual((10 - Units('4')).magnitude, 6.0)
+    self.assertEqual(a.magnitude, 5.0)
+
+    angle = Degrees(30.0)
+    angle += Degrees(15.0)
+    angle -= math.pi / 4     # floats added to Degrees are in radians
+    self.assertAlmostEqual(angle.magnitude, 0.0)
+
+  def testSum(self):
+    terms = [Units('%d lb*ft' % n) for n in range(1, 5)]
+    total = units.Sum(terms)
+    self.assertEqual(total.magnitude, 10.0)
+    self.assertEqual(terms[0].magnitude, 1.0)
+    self.assertEqual(units.Sum([1.0, 2.0]), 3.0)
+    self.assertRaises(units.Error, units.Sum, [Units('1 ft'), Units('1 lb')])
+
+  def testRendering(self):
+    u = Units('1.5 lb/ft^2', ('ft', 'lb'), ndigits=2)
+    self.assertEqual(str(u),
+                     r'1.50\, \mbox{lb} / \mbox{ft} \ensuremath{{\!}^2}')
+    self.assertEqual(u.Render(as_latex=False), '1.50 lb / ft^2')
+    self.assertEqual(Units('2 ft*lb', ('lb', 'ft'), as_latex=False).Render(),
+                     '2.000 lb * ft')
+    self.assertEqual(Degrees(30).Render(as_latex=False), '30 deg')
+    self.assertEqual(str(Degrees(22.5)), r'\ensuremath{22.5 ^{\circ}}')
+
+    # the cached string follows changes to the value
+    u *= 2
+    self.assertEqual(u.Render(as_latex=False), '3.00 lb / ft^2')
+    u.ndigits = 1
+    self.assertEqual(u.Render(as_latex=False), '3.0 lb / ft^2')
+
+  def testConversions(self):
+    gamma = Units('18 kN/m^3').to('lb/ft^3')
+    self.assertAlmostEqual(gamma.magnitude, 114.5858, 4)
+    self.assertEqual(gamma.dim, Units('1 lb/ft^3').dim)
+    self.assertAlmostEqual(Units('1 kPa').to('lb/ft^2').magnitude, 20.8854, 4)
+    self.assertAlmostEqual(Units('6 in').to('m').magnitude, 0.1524)
+    self.assertRaises(units.Error, Units('1 m').to, 'lb')
+
+    L = Units('3 m')
+    self.assertAlmostEqual(units.Normalize(L).magnitude, 9.8425, 4)
+    self.assertEqual(L.magnitude, 3.0)
+    H = Units('9 ft')
+    self.assertTrue(units.Normalize(H) is H)
+    params = units.NormalizeParams({'H': H, 'L': L, 'beta': Degrees(78)})
+    self.assertTrue(params['H'] is H)
+    self.assertEqual(str(params['L']), str(Units('9.843 ft')))
+    self.assertEqual(params['beta'].magnitude, 78)
+
+  @unittest.skipIf(units.numpy is None, 'numpy not installed')
+  def testUnitsArrayConversions(self):
+    q = units.UnitsArray([10.0, 20.0], 'kPa')
+    q = units.NormalizeParams({'q': q})['q']
+    self.assertEqual(q.dim, Units('1 lb/ft^2').dim)
+    self.assertAlmostEqual(q.magnitude[1], 417.7087, 4)
+    self.assertAlmostEqual(q.to('kPa').magnitude[0], 10.0)
+
+  def testPickle(self):
+    u = Units('2.5 lb/ft^3', ndigits=1)
+    for protocol in (0, pickle.HIGHEST_PROTOCOL):
+      copy = pickle.loads(pickle.dumps(u, protocol))
+      self.assertEqual(str(copy), str(u))
+      self.assertTrue(copy.dim is u.dim)
+      self.assertEqual(pickle.loads(pickle.dumps(Degrees(30), protocol)).sin(),
+                       Degrees(30).sin())
+    # dimensions are saved by unit name, not by their index in BASE_UNITS
+    self.assertTrue('lb' in pickle.dumps(u))
+
+  def testTrigCache(self):
+    units.TRIG_CACHE.Clear()
+    beta = Degrees(78.0)
+    self.assertEqual(beta.tan(), math.tan(math.radians(78.0)))
+    self.assertEqual(units.sin(beta), math.sin(math.radians(78.0)))
+    self.assertEqual(units.cos(Degrees(78.0)), math.cos(math.radians(78.0)))
+    self.assertEqual(units.TRIG_CACHE.Stats()['misses'], 1)
+    self.assertEqual(units.TRIG_CACHE.Stats()['hits'], 1)   # new object
+    self.assertEqual(units.sin(0.5), math.sin(0.5))
+
+    # the memoized values follow in-place changes to the angle
+    beta += Degrees(12.0)
+    self.assertAlmostEqual(beta.sin(), 1.0)
+    self.assertAlmostEqual(float(beta), math.pi / 2)
+
+  def testDual(self):
+    x = units.Dual(2.0, {'x': 1.0})
+    y = units.Dual(3.0, {'y': 1.0})
+    z = (x * y - 1) / x + x ** 2 + 1.0 / y
+    self.assertAlmostEqual(z.value, 2.5 + 4.0 + 1.0 / 3)
+    self.assertAlmostEqual(z.derivatives['x'], 0.25 + 4.0)   # 1/x^2 + 2x
+    self.assertAlmostEqual(z.derivatives['y'], 1.0 - 1.0 / 9)
+    self.assertAlmostEqual(units.tan(x).derivatives['x'],
+                           1.0 / math.cos(2.0) ** 2)
+    self.assertAlmostEqual(units.exp(x).derivatives['x'], math.exp(2.0))
+    self.assertTrue(x < y and x == 2.0 and max(x, y) is y)
+    self.assertEqual('%.2f' % x, '2.00')
+
+  def testDualUnits(self):
+    units.TRIG_CACHE.Clear()
+    gamma = units.Seed(Units('120 lb/ft^3'), 'gamma')
+    H = units.Seed(Units('9 ft'), 'H')
+    F = 0.5 * gamma * H ** 2
+    self.assertEqual(F.dim, Units('1 lb/ft').dim)
+    self.assertEqual(units.Derivatives(F), (4860.0, {'gamma': 40.5,
+                                                     'H': 1080.0}))
+    self.assertEqual(units.Derivatives(units.Normalize(
+      units.Seed(Units('2 m'), 'L'))), (2 / 0.3048, {'L': 1 / 0.3048}))
+
+    # derivatives of angles are per degree
+    beta = units.Seed(Degrees(78.0), 'beta')
+    value, derivatives = units.Derivatives(units.sin(Degrees(90) - beta / 2))
+    self.assertAlmostEqual(value, math.cos(math.radians(39.0)))
+    self.assertAlmostEqual(derivatives['beta'],
+                           -0.5 * math.sin(math.radians(39.0)) * math.pi / 180)
+    self.assertEqual(units.TRIG_CACHE.Stats()['misses'], 0)
+    self.assertEqual(str(beta), r'\ensuremath{78 ^{\circ}}')
+
+  @unittest.skipIf(units.numpy is None, 'numpy not installed')
+  def testUnitsArray(self):
+    H = units.UnitsArray([Units('9 ft'), Units('12 ft')])
+    gamma = units.UnitsArray([120, 125], 'lb/ft^3')
+    F = 0.5 * gamma * H ** 2
+    self.assertEqual(F.dim, Units('1 lb/ft').dim)
+    self.assertEqual(list(F.magnitude), [4860.0, 9000.0])
+    self.assertEqual(str(F[1]), '9000.000\\, \\mbox{lb} / \\mbox{ft}')
+
+    # mixing with scalar Units, in either order
+    self.assertEqual(list((H - Units('1 ft')).magnitude), [8.0, 11.0])
+    self.assertEqual(list((Units('1 ft') + H).magnitude), [10.0, 13.0])
+    self.assertEqual(list(H > Units('10 ft')), [False, True])
+    self.assertEqual(list(Units('10 ft') < H), [False, True])
+    self.assertEqual(str(H.max()), str(Units('12.000 ft')))
+    self.assertEqual(list(units.Maximum(H, Units('10 ft')).magnitude),
+                     [10.0, 12.0])
+    self.assertEqual(units.Minimum(2.0, 3.0), 2.0)
+
+    self.assertRaises(units.Error, lambda: H + gamma)
+    self.assertRaises(units.Error, lambda: H + 1.0)
+    self.assertRaises(units.Error, lambda: H > 10.0)
+    self.assertRaises(units.Error, lambda: Units('1 lb') + H)
+    self.assertRaises(units.Error, units.UnitsArray,
+                      [Units('1 ft'), Units('1 lb')])
+
+    # numpy scalars and longs are numbers too, e.g. reductions of the arrays
+    for scale in (units.numpy.float64(2), units.numpy.int64(2), 2L,
+                  H.magnitude.max() / 6):
+      self.assertEqual(list((H * scale).magnitude), [18.0, 24.0])
+      self.assertEqual(list((scale * H).magnitude), [18.0, 24.0])
+      self.assertEqual(list((H / scale).magnitude), [4.5, 6.0])
+    self.assertEqual((H ** units.numpy.int64(2)).dim, (H * H).dim)
+    self.assertRaises(units.Error, lambda: H + units.numpy.float64(1))
+
+  @unittest.skipIf(units.numpy is None, 'numpy not installed')
+  def testDegreesArray(self):
+    beta = units.DegreesArray([78.0, 90.0])
+    self.assertAlmostEqual(beta.tan()[0], math.tan(Degrees(78.0)))
+    self.assertAlmostEqual(units.cos(beta)[1], 0.0)
+    self.assertAlmostEqual(units.sin(beta.radians())[1], 1.0)
+    self.assertAlmostEqual((Degrees(90) - beta).sin()[1], 0.0)
+    self.assertAlmostEqual((0.5 * beta)[1].magnitude, 45.0)
+    self.assertTrue(isinstance(beta + Degrees(1), units.DegreesArray))
+    self.assertEqual(list((beta + math.pi).magnitude), [258.0, 270.0])
     
     
 if __name__ == '__main__':